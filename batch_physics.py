@@ -0,0 +1,452 @@
+"""NumPy physics kernel that advances many independent players and levels in one call.
+
+The rules mirror Player.update, Platform.update, MovingPlatform.update and
+DisappearingPlatform.update so a batch row behaves like one Simulation.
+"""
+import numpy as np
+
+from platformer_game import (FRAME_MS, GRAVITY, JUMP_STRENGTH, PLATFORM_FADE_TIME, PLAYER_SPEED, SCREEN_HEIGHT,
+                             SCREEN_WIDTH, SPIKE_DAMAGE_COOLDOWN, DrawingSystem, Player, path_phases, path_positions,
+                             path_x, rect_coords)
+
+# Platform kinds, in the order Simulation.all_platforms() lists them
+STATIC = 0
+DRAWN = 1
+MOVING = 2
+DISAPPEARING = 3
+
+_probe = Player(0, 0)
+PLAYER_WIDTH = _probe.width
+PLAYER_HEIGHT = _probe.height
+del _probe
+
+
+def _overlaps(x, y, left, top, right, bottom, width=PLAYER_WIDTH, height=PLAYER_HEIGHT):
+    """Vectorized pygame.Rect.colliderect of player rects against broadcastable edge arrays"""
+    return (x < right) & (left < x + width) & (y < bottom) & (top < y + height)
+
+
+def _sweep_interval(position, size, velocity, low, high):
+    """Vectorized sweep_interval: fractions of a move during which [position, position + size) overlaps [low, high)"""
+    moving = velocity != 0
+    step = np.where(moving, velocity, 1.0)
+    near = np.where(velocity > 0, low - position - size, high - position) / step
+    far = np.where(velocity > 0, high - position, low - position - size) / step
+    inside = (position < high) & (position + size > low)
+    entry = np.where(moving, near, np.where(inside, -np.inf, np.inf))
+    exit = np.where(moving, far, np.where(inside, np.inf, -np.inf))
+    return entry, exit
+
+
+def _time_of_impact(x, y, dx, dy, left, top, right, bottom):
+    """Vectorized Player.time_of_impact, inf where there is no hit, plus whether the hit is on the y axis"""
+    x_entry, x_exit = _sweep_interval(x, PLAYER_WIDTH, dx, left, right)
+    y_entry, y_exit = _sweep_interval(y, PLAYER_HEIGHT, dy, top, bottom)
+    entry = np.maximum(x_entry, y_entry)
+    vertical = y_entry >= x_entry
+    # Platforms are only solid from above
+    hit = (entry >= 0) & (entry < 1) & (entry < np.minimum(x_exit, y_exit)) & (~vertical | (dy > 0))
+    return np.where(hit, entry, np.inf), vertical
+
+
+def _first_per_row(rows, values):
+    """Index of the smallest value in each run of equal rows, earliest index on ties"""
+    order = np.lexsort((values, rows))
+    ordered_rows = rows[order]
+    return order[np.r_[True, ordered_rows[1:] != ordered_rows[:-1]]]
+
+
+def _rect_array(groups):
+    """Pad per-level lists of objects with a rect into (N, K) left/top/right/bottom and valid arrays"""
+    width = max((len(group) for group in groups), default=0)
+    edges = np.zeros((4, len(groups), width), dtype=np.int32)
+    valid = np.zeros((len(groups), width), dtype=bool)
+    for i, group in enumerate(groups):
+        for j, entity in enumerate(group):
+            rect = entity.rect
+            edges[:, i, j] = rect.left, rect.top, rect.right, rect.bottom
+            valid[i, j] = True
+    return edges, valid
+
+
+class LevelBatch:
+    """Padded platform, spike, collectible and goal arrays for N levels, one row per level
+
+    Platform columns are laid out as static, drawn, moving and disappearing platforms, matching
+    the collision order of Simulation.all_platforms(). Padding columns are never active. Timers
+    and motion parameters live in compact per-kind blocks next to the shared edge arrays.
+    """
+    def __init__(self, levels, drawn_slots=None):
+        count = len(levels)
+        static = [level[0] for level in levels]
+        moving = [level[1] for level in levels]
+        disappearing = [level[4] for level in levels]
+        self.max_platforms = np.array([level[6] for level in levels], dtype=np.int64)
+        if drawn_slots is None:
+            drawn_slots = int(self.max_platforms.max()) if count else 0
+
+        sizes = [max((len(group) for group in kind), default=0) for kind in (static, moving, disappearing)]
+        self.static_slice = slice(0, sizes[0])
+        self.drawn_slice = slice(sizes[0], sizes[0] + drawn_slots)
+        self.moving_slice = slice(self.drawn_slice.stop, self.drawn_slice.stop + sizes[1])
+        self.disappearing_slice = slice(self.moving_slice.stop, self.moving_slice.stop + sizes[2])
+        columns = self.disappearing_slice.stop
+
+        shape = (count, columns)
+        self.left = np.zeros(shape, dtype=np.int32)
+        self.top = np.zeros(shape, dtype=np.int32)
+        self.right = np.zeros(shape, dtype=np.int32)
+        self.bottom = np.zeros(shape, dtype=np.int32)
+        self.active = np.zeros(shape, dtype=bool)
+        self.kind = np.zeros(columns, dtype=np.int8)
+        self.kind[self.drawn_slice] = DRAWN
+        self.kind[self.moving_slice] = MOVING
+        self.kind[self.disappearing_slice] = DISAPPEARING
+
+        # Drawn platform timers, with the earliest fade so most frames can skip the check
+        self.creation_time = np.zeros((count, drawn_slots))
+        self.next_fade = float('inf')
+
+        # Moving platform motion, only for rows that have any
+        self.moving_rows = np.array([i for i in range(count) if moving[i]], dtype=np.intp)
+        moving_shape = (len(self.moving_rows), sizes[1])
+        self.moving_valid = np.zeros(moving_shape, dtype=bool)
+        self.start_x = np.zeros(moving_shape)
+        self.end_x = np.zeros(moving_shape)
+        self.speed = np.zeros(moving_shape)
+        self.origin = np.zeros(moving_shape)  # Level-clock time each was at start_x heading right
+        self.epoch = np.zeros((len(self.moving_rows), 1))  # Simulation time each level's clock started at
+
+        # Disappearing platform timers, only for rows that have any
+        self.disappearing_rows = np.array([i for i in range(count) if disappearing[i]], dtype=np.intp)
+        disappearing_shape = (len(self.disappearing_rows), sizes[2])
+        self.disappearing_valid = np.zeros(disappearing_shape, dtype=bool)
+        self.triggered = np.zeros(disappearing_shape, dtype=bool)
+        self.trigger_time = np.zeros(disappearing_shape)
+        self.trigger_delay = np.zeros(disappearing_shape)
+        self.disappear_time = np.zeros(disappearing_shape)
+
+        for i in range(count):
+            for column, platform in enumerate(static[i], self.static_slice.start):
+                self._set_rect(i, column, platform.rect)
+        for block, i in enumerate(self.moving_rows):
+            for j, platform in enumerate(moving[i]):
+                self._set_rect(i, self.moving_slice.start + j, platform.rect)
+                self.active[i, self.moving_slice.start + j] = platform.active
+                self.moving_valid[block, j] = True
+                self.start_x[block, j] = platform.start_x
+                self.end_x[block, j] = platform.end_x
+                self.speed[block, j] = platform.speed
+                self.origin[block, j] = platform.origin
+                self.epoch[block] = platform.store.epoch
+        for block, i in enumerate(self.disappearing_rows):
+            for j, platform in enumerate(disappearing[i]):
+                self._set_rect(i, self.disappearing_slice.start + j, platform.rect)
+                self.active[i, self.disappearing_slice.start + j] = platform.active
+                self.disappearing_valid[block, j] = True
+                self.triggered[block, j] = platform.triggered
+                self.trigger_time[block, j] = platform.trigger_time
+                self.trigger_delay[block, j] = platform.trigger_delay
+                self.disappear_time[block, j] = platform.disappear_time
+
+        # Map a level row to its position in the disappearing block, for triggering
+        self.disappearing_block = np.full(count, -1, dtype=np.intp)
+        self.disappearing_block[self.disappearing_rows] = np.arange(len(self.disappearing_rows))
+
+        self.spikes, self.spike_valid = _rect_array([level[2] for level in levels])
+        self.collectibles, collectible_valid = _rect_array([level[3] for level in levels])
+        # Padding counts as collected so it can never be picked up
+        self.collected = ~collectible_valid
+        for i, level in enumerate(levels):
+            for j, collectible in enumerate(level[3]):
+                self.collected[i, j] = collectible.collected
+        self.goals, self.goal_valid = _rect_array([level[5] for level in levels])
+
+        self.drawing_system = DrawingSystem()
+
+    @classmethod
+    def from_worlds(cls, worlds, drawn_slots=None):
+        """Build a batch from the current levels of Simulation objects"""
+        levels = [(w.platforms, w.moving_platforms, w.spikes, w.collectibles, w.disappearing_platforms, w.goals,
+                   w.max_platforms) for w in worlds]
+        batch = cls(levels, drawn_slots)
+        for i, world in enumerate(worlds):
+            for platform in world.drawn_platforms:
+                batch._add_drawn(i, platform.rect, platform.creation_time)
+        return batch
+
+    def __len__(self):
+        return self.left.shape[0]
+
+    def _set_rect(self, row, column, rect):
+        self.left[row, column] = rect.left
+        self.top[row, column] = rect.top
+        self.right[row, column] = rect.right
+        self.bottom[row, column] = rect.bottom
+        self.active[row, column] = True
+
+    def _add_drawn(self, row, rect, creation_time):
+        drawn = self.drawn_slice
+        live = np.flatnonzero(self.active[row, drawn])
+        if len(live) >= min(self.max_platforms[row], drawn.stop - drawn.start):
+            return False
+
+        # Pack live platforms to the front so collision order stays creation order
+        edges = (self.left, self.top, self.right, self.bottom)
+        targets = np.arange(len(live))
+        for edge in edges:
+            edge[row, drawn.start + targets] = edge[row, drawn.start + live]
+        self.creation_time[row, targets] = self.creation_time[row, live]
+        self.active[row, drawn] = False
+        self.active[row, drawn.start + targets] = True
+
+        self._set_rect(row, drawn.start + len(live), rect)
+        self.creation_time[row, len(live)] = creation_time
+        self.next_fade = min(self.next_fade, creation_time + PLATFORM_FADE_TIME)
+        return True
+
+    def draw_platform(self, row, start_pos, end_pos, current_time):
+        """Draw a platform for one level, following DrawingSystem rules and the platform budget"""
+        platform = self.drawing_system.make_platform(start_pos, end_pos, current_time)
+        return platform is not None and self._add_drawn(row, platform.rect, current_time)
+
+    def update(self, current_time):
+        """Advance drawn fade, moving platforms and disappearing platforms to current_time"""
+        # Drawn platforms fade out
+        if current_time > self.next_fade:
+            drawn = self.active[:, self.drawn_slice]
+            drawn &= current_time - self.creation_time <= PLATFORM_FADE_TIME
+            self.active[:, self.drawn_slice] = drawn
+            self.next_fade = self.creation_time[drawn].min() + PLATFORM_FADE_TIME if drawn.any() else float('inf')
+
+        # Moving platforms take their place on the triangle wave between their bounds
+        if len(self.moving_rows):
+            rows, moving = self.moving_rows[:, None], self.moving_slice
+            left = self.left[self.moving_rows, moving]
+            width = self.right[self.moving_rows, moving] - left
+            phase, span = path_phases(self.start_x, self.end_x, self.speed, self.origin, current_time - self.epoch)
+            valid = self.moving_valid & (span > 0)
+            x = rect_coords(path_x(self.start_x, phase, span))
+            x = np.where(valid, x, left).astype(np.int32)
+            self.left[rows, np.arange(moving.start, moving.stop)] = x
+            self.right[rows, np.arange(moving.start, moving.stop)] = x + width
+
+        # Disappearing platforms vanish after their delay and come back later
+        if len(self.disappearing_rows):
+            rows, columns = self.disappearing_rows[:, None], np.arange(self.disappearing_slice.start, self.disappearing_slice.stop)
+            triggered = self.triggered & self.disappearing_valid
+            since = current_time - self.trigger_time
+            back = self.trigger_delay + self.disappear_time
+            hidden = (since > self.trigger_delay) & (since < back)
+            self.active[rows, columns] = np.where(triggered, ~hidden, self.active[rows, columns])
+            self.triggered &= ~(triggered & (since >= back))
+
+    def trigger(self, rows, columns, current_time):
+        """Start the disappear timer of touched disappearing platforms, given contact pairs"""
+        touched = self.kind[columns] == DISAPPEARING
+        if not touched.any():
+            return
+        block = self.disappearing_block[rows[touched]]
+        column = columns[touched] - self.disappearing_slice.start
+        start = ~self.triggered[block, column]
+        self.trigger_time[block[start], column[start]] = current_time
+        self.triggered[block, column] = True
+
+    def carry(self, rows, columns, current_time, dt):
+        """Vectorized MovingPlatform.travel at the given contact pairs"""
+        block = np.searchsorted(self.moving_rows, rows)
+        column = columns - self.moving_slice.start
+        path = (self.start_x[block, column], self.end_x[block, column], self.speed[block, column],
+                self.origin[block, column])
+        level_time = current_time - self.epoch[block, 0]
+        return path_positions(*path, level_time) - path_positions(*path, level_time - dt)
+
+    def goal_reached(self, players):
+        """Rows whose player overlaps a goal"""
+        if self.goals.shape[2] == 0:
+            return np.zeros(len(self), dtype=bool)
+        x = np.trunc(players.x).astype(np.int32)[:, None]
+        y = np.trunc(players.y).astype(np.int32)[:, None]
+        return (self.goal_valid & _overlaps(x, y, *self.goals)).any(axis=1)
+
+
+class PlayerBatch:
+    """Position, velocity and contact state for N players as parallel arrays"""
+    def __init__(self, count, screen_height=SCREEN_HEIGHT):
+        self.x = np.full(count, 50.0)
+        self.y = np.full(count, float(screen_height - 200))
+        self.vel_x = np.zeros(count)
+        self.vel_y = np.zeros(count)
+        self.on_ground = np.zeros(count, dtype=bool)
+        self.facing_right = np.ones(count, dtype=bool)
+        self.score = np.zeros(count, dtype=np.int64)
+        self.last_spike_damage = np.full(count, float(-SPIKE_DAMAGE_COOLDOWN))
+
+    @classmethod
+    def from_players(cls, players):
+        batch = cls(len(players))
+        for i, player in enumerate(players):
+            batch.x[i] = player.x
+            batch.y[i] = player.y
+            batch.vel_x[i] = player.vel_x
+            batch.vel_y[i] = player.vel_y
+            batch.on_ground[i] = player.on_ground
+            batch.facing_right[i] = player.facing_right
+            batch.score[i] = player.score
+            batch.last_spike_damage[i] = player.last_spike_damage
+        return batch
+
+    def __len__(self):
+        return len(self.x)
+
+    def reset_position(self, mask, screen_height=SCREEN_HEIGHT):
+        self.x[mask] = 50
+        self.y[mask] = screen_height - 200
+        self.vel_x[mask] = 0
+        self.vel_y[mask] = 0
+
+
+def step_players(players, levels, left, right, jump, current_time,
+                 screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT, frames=1):
+    """Advance every player one tick of frames FRAME_MS frames against its level, matching Player.update
+
+    left, right and jump are boolean arrays of length N. Returns the (N, platforms) contact mask.
+    """
+    # Handle input
+    vel_x = np.where(right, float(PLAYER_SPEED), np.where(left, float(-PLAYER_SPEED), 0.0))
+    players.facing_right = np.where(right, True, np.where(left, False, players.facing_right))
+    vel_y = np.where(jump & players.on_ground, float(JUMP_STRENGTH), players.vel_y) + GRAVITY * frames
+    dx, dy = vel_x * frames, vel_y * frames
+
+    # Candidate pairs are active platforms near the box swept by this tick's move, padded by a
+    # pixel so rounding never drops a platform the exact sweep would hit
+    x0, y0 = players.x, players.y
+    on_ground = np.zeros(len(players), dtype=bool)
+    landed = np.full(len(players), -1)
+    sweep_x, sweep_y = np.minimum(x0, x0 + dx) - 1, np.minimum(y0, y0 + dy) - 1
+    sweep_w, sweep_h = PLAYER_WIDTH + np.abs(dx) + 2, PLAYER_HEIGHT + np.abs(dy) + 2
+    candidates = levels.active & _overlaps(sweep_x[:, None], sweep_y[:, None],
+                                           levels.left, levels.top, levels.right, levels.bottom,
+                                           sweep_w[:, None], sweep_h[:, None])
+    contacts = np.zeros_like(candidates)
+    rows, columns = np.divmod(np.flatnonzero(candidates), candidates.shape[1])
+
+    x, y = x0.copy(), y0.copy()
+    if len(rows):
+        left_edge, top_edge = levels.left[rows, columns], levels.top[rows, columns]
+        right_edge, bottom_edge = levels.right[rows, columns], levels.bottom[rows, columns]
+
+        # Platforms the player already overlaps are passed through, as when jumping up through one
+        embedded = _overlaps(x0[rows], y0[rows], left_edge, top_edge, right_edge, bottom_edge)
+
+        # Each hit stops motion along one axis, so two passes resolve any move
+        for _ in range(2):
+            t, vertical = _time_of_impact(x[rows], y[rows], dx[rows], dy[rows],
+                                          left_edge, top_edge, right_edge, bottom_edge)
+            t[embedded] = np.inf
+            first = _first_per_row(rows, t)
+            first = first[np.isfinite(t[first])]
+            if not len(first):
+                break
+            r, c, t_hit = rows[first], columns[first], t[first]
+            contacts[r, c] = True
+            levels.trigger(r, c, current_time)
+
+            # Landing on top of platform, sliding on with the rest of the horizontal move
+            land = vertical[first]
+            lr, lt = r[land], t_hit[land]
+            x[lr] += dx[lr] * lt
+            y[lr] = top_edge[first[land]] - PLAYER_HEIGHT
+            vel_y[lr] = 0.0
+            on_ground[lr] = True
+            landed[lr] = c[land]
+            dx[lr] = dx[lr] * (1 - lt)
+            dy[lr] = 0.0
+
+            # Hitting platform from the side, falling or rising on with the rest of the vertical move
+            sr, st = r[~land], t_hit[~land]
+            x[sr] = np.where(dx[sr] > 0, left_edge[first[~land]] - PLAYER_WIDTH, right_edge[first[~land]])
+            y[sr] += dy[sr] * st
+            dy[sr] = dy[sr] * (1 - st)
+            dx[sr] = 0.0
+        x += dx
+        y += dy
+
+        # Platforms passed through are landed on once the player is falling with their head above the top;
+        # pass k handles every player's k-th such platform, in platform order
+        inside = np.flatnonzero(embedded)
+        if len(inside):
+            inside_rows = rows[inside]
+            starts = np.flatnonzero(np.r_[True, inside_rows[1:] != inside_rows[:-1]])
+            rank = np.arange(len(inside)) - np.repeat(starts, np.diff(np.r_[starts, len(inside)]))
+            for k in range(rank.max() + 1):
+                pair = inside[rank == k]
+                r, c = rows[pair], columns[pair]
+                over = _overlaps(x[r], y[r], left_edge[pair], top_edge[pair], right_edge[pair], bottom_edge[pair])
+                contacts[r[over], c[over]] = True
+                levels.trigger(r[over], c[over], current_time)
+                land = over & (vel_y[r] > 0) & (y[r] < top_edge[pair])
+                y[r[land]] = top_edge[pair[land]] - PLAYER_HEIGHT
+                vel_y[r[land]] = 0.0
+                on_ground[r[land]] = True
+                landed[r[land]] = c[land]
+    else:
+        x += dx
+        y += dy
+
+    # Spikes and collectibles are hit anywhere along the path actually travelled
+    rect_x = np.trunc(np.minimum(x0, x)).astype(np.int32)[:, None]
+    rect_y = np.trunc(np.minimum(y0, y)).astype(np.int32)[:, None]
+    rect_w = np.trunc(PLAYER_WIDTH + np.abs(x - x0)).astype(np.int32)[:, None]
+    rect_h = np.trunc(PLAYER_HEIGHT + np.abs(y - y0)).astype(np.int32)[:, None]
+
+    # Move with moving platforms
+    ride = np.flatnonzero(landed >= 0)
+    ride = ride[levels.kind[landed[ride]] == MOVING]
+    if len(ride):
+        x[ride] += levels.carry(ride, landed[ride], current_time, frames * FRAME_MS)
+
+    players.x, players.y = x, y
+    players.vel_x, players.vel_y = vel_x, vel_y
+    players.on_ground = on_ground
+
+    # Check spike collisions
+    if levels.spikes.shape[2]:
+        hit = (levels.spike_valid & _overlaps(rect_x, rect_y, *levels.spikes, rect_w, rect_h)).any(axis=1)
+        hurt = hit & (current_time - players.last_spike_damage > SPIKE_DAMAGE_COOLDOWN)
+        players.last_spike_damage[hurt] = current_time
+        players.reset_position(hurt, screen_height)
+
+    # Check collectible collisions
+    if levels.collectibles.shape[2]:
+        grabbed = ~levels.collected & _overlaps(rect_x, rect_y, *levels.collectibles, rect_w, rect_h)
+        levels.collected |= grabbed
+        players.score += 10 * grabbed.sum(axis=1)
+
+    # Keep player on screen
+    np.clip(players.x, 0, screen_width - PLAYER_WIDTH, out=players.x)
+
+    # Reset if player falls off screen
+    players.reset_position(players.y > screen_height, screen_height)
+    return contacts
+
+
+class BatchSimulation:
+    """N headless worlds stepped together, the batched counterpart of Simulation.step"""
+    def __init__(self, levels, drawn_slots=None, screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT):
+        self.levels = levels if isinstance(levels, LevelBatch) else LevelBatch(levels, drawn_slots)
+        self.players = PlayerBatch(len(self.levels), screen_height)
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.time = 0.0
+        self.frame_time = FRAME_MS
+
+    def step(self, left, right, jump, dt=None):
+        """Advance all worlds dt milliseconds, one frame_time by default, returns the rows whose player reached the goal"""
+        if dt is None:
+            dt = self.frame_time
+        self.time += dt
+        self.levels.update(self.time)
+        step_players(self.players, self.levels, left, right, jump, self.time, self.screen_width, self.screen_height,
+                     dt / FRAME_MS)
+        return self.levels.goal_reached(self.players)
@@ -0,0 +1,395 @@
+"""Benchmarks for the simulation, level generation and rendering hot paths.
+
+Run `python benchmarks.py run --output baseline.json` on the base branch, then
+`python benchmarks.py run --compare baseline.json` on a change to flag any benchmark that got
+slower than the threshold. Everything renders through SDL's dummy video driver, so timings cover
+the drawing work itself and not a real display's presentation.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from functools import partial
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from platformer_game import (CHUNK_WIDTH, Collectible, DisappearingPlatform, DrawingSystem, Game, Goal,
+                             InputState, LevelGenerator, MovingPlatform, Platform, Player, SCREEN_HEIGHT, SCREEN_WIDTH,
+                             Simulation, Spike)
+from spectator import StreamEncoder, scene
+
+FORMAT_VERSION = 1
+ENTITY_COUNTS = [10, 100, 1000]
+RESOLUTIONS = [(800, 600), (1200, 800), (1920, 1080)]
+MARATHON_LENGTHS = [10, 1000]  # Marathon level lengths in chunks; frame cost should not depend on them
+DEFAULT_THRESHOLD = 0.15  # Fractional slowdown of the median that counts as a regression
+CONTROL_PATTERN = [InputState(right=True), InputState(right=True, jump=True), InputState(),
+                   InputState(left=True), InputState(left=True, jump=True)]
+
+
+def measure(setup, min_time, repeat):
+    """Median and fastest seconds per call, over rounds of at least min_time each
+
+    setup() returns the function to time and a function to run untimed before every call, or
+    None. Every round gets a fresh setup so each one times the same sequence of calls.
+    """
+    def timed_round(loops):
+        fn, prepare = setup()
+        if prepare is None:
+            start = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            return time.perf_counter() - start
+        elapsed = 0.0
+        for _ in range(loops):
+            prepare()
+            start = time.perf_counter()
+            fn()
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    # Calibration rounds double as warm-up and are not reported
+    loops = 1
+    while True:
+        elapsed = timed_round(loops)
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    rounds = [timed_round(loops) / loops for _ in range(repeat)]
+    return statistics.median(rounds), min(rounds), loops
+
+
+def populate(world, count, seed=0):
+    """Scatter count extra entities of every kind over the world's screen"""
+    rng = random.Random(seed)
+    width, height = world.screen_width, world.screen_height
+    for i in range(count):
+        x = rng.randrange(0, width - 120)
+        y = rng.randrange(60, height - 60)
+        kind = i % 6
+        if kind == 0:
+            world.platforms.append(Platform(x, y, rng.randrange(60, 160), 20))
+        elif kind == 1:
+            world.moving_platforms.append(MovingPlatform(x, y, 100, 20, x, x + rng.randrange(50, 200), 2))
+        elif kind == 2:
+            world.drawn_platforms.append(Platform(x, y, rng.randrange(40, 200), 15, temporary=True,
+                                                  creation_time=world.time - rng.randrange(0, 4900)))
+        elif kind == 3:
+            platform = DisappearingPlatform(x, y, 100, 20)
+            platform.trigger(world.time - rng.randrange(0, 2000))
+            world.disappearing_platforms.append(platform)
+        elif kind == 4:
+            world.collectibles.append(Collectible(x, y))
+        else:
+            world.spikes.append(Spike(x, y, 30 + 10 * rng.randrange(0, 6), 20))
+    world.build_broadphase()
+    world.level_serial += 1
+
+
+def seeds_by_level_type(levels, per_case, search=2000):
+    """Session seeds whose level N is of each level type, per_case of them for each pair"""
+    found = {}
+    for seed in range(search):
+        generator = LevelGenerator(seed)
+        for level_num in levels:
+            generator.generate_level(level_num)
+            seeds = found.setdefault((generator.last_level_type, level_num), [])
+            if len(seeds) < per_case:
+                seeds.append(seed)
+        if len(found) == 3 + 8 * (len(levels) - 3) and all(len(s) == per_case for s in found.values()):
+            break
+    return found
+
+
+def frozen_step(world, controls):
+    """Step the player a whole frame, then put the clock back so no platform expires between rounds"""
+    world.step(controls)
+    world.time -= world.frame_time
+
+
+def player_update_cases():
+    for count in ENTITY_COUNTS:
+        def setup(count=count):
+            world = Simulation(seed=1)
+            populate(world, count)
+            player = world.player
+            controls = itertools.cycle(CONTROL_PATTERN)
+
+            def tick():
+                world.time += world.frame_time
+                player.update(world.platform_grid, world.screen_width, world.screen_height, world.spike_grid,
+                              world.collectible_grid, world.disappearing_platforms, controls=next(controls),
+                              current_time=world.time)
+            return tick, None
+        yield f"player.update[entities={count}]", setup
+
+
+def simulation_step_cases():
+    for count in ENTITY_COUNTS:
+        def setup(count=count):
+            world = Simulation(seed=1)
+            populate(world, count)
+            controls = itertools.cycle(CONTROL_PATTERN)
+            return lambda: frozen_step(world, next(controls)), None
+        yield f"simulation.step[entities={count}]", setup
+
+
+def snapshot_cases():
+    for count in ENTITY_COUNTS:
+        def setup(count=count):
+            world = Simulation(seed=1)
+            populate(world, count)
+            return world.snapshot, None
+        yield f"simulation.snapshot[entities={count}]", setup
+
+        def setup(count=count):
+            world = Simulation(seed=1)
+            populate(world, count)
+            snapshot = world.snapshot()
+            return partial(world.restore, snapshot), None
+        yield f"simulation.restore[entities={count}]", setup
+
+
+def spectator_cases():
+    for count in ENTITY_COUNTS:
+        def setup(count=count):
+            world = Simulation(seed=1)
+            populate(world, count)
+            encoder = StreamEncoder()
+            world_scene = scene(world)
+            controls = itertools.cycle(CONTROL_PATTERN)
+
+            def tick():
+                # Everything a spectated tick adds: the snapshot, then encoding it once for every client
+                frozen_step(world, next(controls))
+                snapshot = world.snapshot()
+                encoder.encode(snapshot.layout, snapshot.state, world_scene)
+            return tick, None
+        yield f"spectator.encode[entities={count}]", setup
+
+
+def generate_level_cases():
+    levels = range(1, 11)
+    for (level_type, level_num), seeds in sorted(seeds_by_level_type(levels, per_case=8).items(),
+                                                 key=lambda item: (item[0][1], item[0][0])):
+        def setup(level_num=level_num, seeds=seeds):
+            generators = itertools.cycle([LevelGenerator(seed) for seed in seeds])
+            return lambda: next(generators).generate_level(level_num), None
+        name = level_type.lower().replace(' ', '_')
+        yield f"generate_level[difficulty={level_num},type={name}]", setup
+
+
+def entity_draws(screen):
+    """One draw call per entity kind and visual state, all onto screen"""
+    now = 10000
+    fading = Platform(100, 100, 150, 15, temporary=True, creation_time=now - 4500)
+    flashing = DisappearingPlatform(100, 100, 100, 20)
+    flashing.trigger(now - 1000)
+    drawing = DrawingSystem()
+    drawing.start_drawing((100, 300))
+    drawing.update_drawing((400, 320))
+    player = Player(300, 400)
+    player.is_walking = True
+    return {
+        'Platform': partial(Platform(100, 100, 150, 20).draw, screen, now),
+        'Platform.fading': partial(fading.draw, screen, now),
+        'MovingPlatform': partial(MovingPlatform(100, 100, 100, 20, 100, 300).draw, screen, now),
+        'DisappearingPlatform.flashing': partial(flashing.draw, screen, now),
+        'Spike': partial(Spike(100, 100, 60, 20).draw, screen),
+        'Collectible': partial(Collectible(100, 100).draw, screen),
+        'Goal': partial(Goal(100, 100).draw, screen),
+        'Player': partial(player.draw, screen),
+        'DrawingSystem.preview': partial(drawing.draw_preview, screen),
+    }
+
+
+def entity_draw_cases(make_game):
+    for name in entity_draws(None):
+        def setup(name=name):
+            return entity_draws(make_game(SCREEN_WIDTH, SCREEN_HEIGHT).screen)[name], None
+        yield f"entity.draw[{name}]", setup
+
+
+def resize(game, width, height):
+    """Switch the game to a windowed resolution, keeping the world in sync like toggle_fullscreen"""
+    game.screen_width, game.screen_height = width, height
+    game.screen = pygame.display.set_mode((width, height))
+    game.world.screen_width, game.world.screen_height = width, height
+    game.static_layer = None
+    game.chunk_layers_serial = None
+    if game.renderer is not None:
+        game.renderer.invalidate()
+
+
+class GameFactory:
+    """Fresh games per benchmark, so no case inherits another's level, player or surface pool"""
+    def __init__(self):
+        self.games = []
+
+    def __call__(self, width, height, dirty_rects=False, marathon_chunks=0):
+        Platform.surface_pool.clear()
+        game = Game(dirty_rects=dirty_rects, seed=1, marathon_chunks=marathon_chunks)
+        resize(game, width, height)
+        self.games.append(game)
+        return game
+
+    def close(self):
+        for game in self.games:
+            if game.world.prefetcher is not None:
+                game.world.prefetcher.close()
+        self.games.clear()
+
+
+def game_draw_cases(make_game):
+    for (width, height), count, mode in itertools.product(RESOLUTIONS, ENTITY_COUNTS, ('full', 'dirty')):
+        def setup(width=width, height=height, count=count, mode=mode):
+            game = make_game(width, height, dirty_rects=mode == 'dirty')
+            populate(game.world, count)
+            game.draw()  # Bake the static layer and push the first full frame untimed
+            controls = itertools.cycle(CONTROL_PATTERN)
+            # Untimed steps between frames move the player and animations without expiring drawn or
+            # disappearing platforms
+            return game.draw, lambda: frozen_step(game.world, next(controls))
+        yield f"game.draw[{width}x{height},entities={count},{mode}]", setup
+
+
+def marathon_cases(make_game):
+    for chunks in MARATHON_LENGTHS:
+        def setup(chunks=chunks):
+            game = make_game(SCREEN_WIDTH, SCREEN_HEIGHT, marathon_chunks=chunks)
+            world = game.world
+            player = world.player
+            game.draw()
+
+            def fly():
+                # Carry the player right above the level so chunks stream in and out and the
+                # camera scrolls every frame, starting over untimed near the end
+                if player.x > world.level_width() - 2 * CHUNK_WIDTH:
+                    world.load_level(world.current_level)
+                    game.draw()
+                player.x += 6
+                player.y = 150
+                player.vel_y = 0
+
+            def frame():
+                world.step(InputState())
+                game.draw()
+            return frame, fly
+        yield f"marathon.frame[chunks={chunks}]", setup
+
+
+def draw_ui_cases(make_game):
+    for width, height in RESOLUTIONS:
+        def setup(width=width, height=height):
+            return make_game(width, height).draw_ui, None
+        yield f"draw_ui[{width}x{height}]", setup
+
+
+def run_benchmarks(name_filter, min_time, repeat, log):
+    make_game = GameFactory()
+    cases = itertools.chain(player_update_cases(), simulation_step_cases(), snapshot_cases(), spectator_cases(),
+                            generate_level_cases(), entity_draw_cases(make_game), game_draw_cases(make_game),
+                            marathon_cases(make_game), draw_ui_cases(make_game))
+    results = {}
+    try:
+        for name, setup in cases:
+            if name_filter and name_filter not in name:
+                continue
+            median, fastest, loops = measure(setup, min_time, repeat)
+            results[name] = {'median_us': median * 1e6, 'min_us': fastest * 1e6, 'loops': loops}
+            log(f"{name:<64}{median * 1e6:>12.1f} us")
+            make_game.close()
+    finally:
+        make_game.close()
+    return results
+
+
+def machine_info():
+    return {'python': platform.python_version(), 'pygame': pygame.version.ver, 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count(),
+            'video_driver': pygame.display.get_driver()}
+
+
+def compare(baseline, current, threshold):
+    """Rows of (name, baseline median, current median, ratio, flag) for benchmarks in both runs"""
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            rows.append((name, None, result['median_us'], None, 'new'))
+            continue
+        ratio = result['median_us'] / before['median_us']
+        flag = 'SLOWER' if ratio > 1 + threshold else 'faster' if ratio < 1 - threshold else ''
+        rows.append((name, before['median_us'], result['median_us'], ratio, flag))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"{'benchmark':<64}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, before, after, ratio, flag in rows:
+        if ratio is None:
+            print(f"{name:<64}{'-':>12}{after:>10.1f}us{'':>9}  {flag}")
+        else:
+            print(f"{name:<64}{before:>10.1f}us{after:>10.1f}us{(ratio - 1) * 100:>+8.1f}%  {flag}")
+    regressions = sum(1 for row in rows if row[4] == 'SLOWER')
+    print(f"{regressions} of {len(rows)} benchmarks more than {threshold:.0%} slower", file=sys.stderr)
+    return regressions
+
+
+def load_results(path):
+    with open(path) as file:
+        data = json.load(file)
+    if data.get('format') != FORMAT_VERSION:
+        raise SystemExit(f"{path}: unsupported benchmark file format {data.get('format')}")
+    return data
+
+
+def run(args):
+    results = run_benchmarks(args.filter, args.min_time, args.repeat, lambda line: print(line, file=sys.stderr))
+    data = {'format': FORMAT_VERSION, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'machine': machine_info(),
+            'settings': {'min_time': args.min_time, 'repeat': args.repeat}, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(data, file, indent=1, sort_keys=True)
+    if args.compare:
+        return 1 if print_comparison(compare(load_results(args.compare), data, args.threshold), args.threshold) else 0
+    return 0
+
+
+def run_compare(args):
+    rows = compare(load_results(args.baseline), load_results(args.current), args.threshold)
+    return 1 if print_comparison(rows, args.threshold) else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulation, generation and rendering benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="Run the benchmarks")
+    run_parser.add_argument('--output', help="Write results as JSON, e.g. to use as a baseline")
+    run_parser.add_argument('--compare', metavar='BASELINE', help="Compare against a baseline file when done")
+    run_parser.add_argument('--filter', help="Only run benchmarks whose name contains this text")
+    run_parser.add_argument('--min-time', type=float, default=0.05, help="Seconds per timing round")
+    run_parser.add_argument('--repeat', type=int, default=5, help="Timing rounds per benchmark")
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    compare_parser = commands.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        return run(args)
+    if args.command == 'compare':
+        return run_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
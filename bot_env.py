@@ -0,0 +1,335 @@
+"""Gym-style environments for playtesting bots, and a pool that steps many of them on every core.
+
+PlatformerEnv wraps a headless Simulation with no window or keyboard: reset(seed) starts an
+episode on a seeded level and step(action) holds one action for FRAME_SKIP ticks, returning
+(observation, reward, terminated, truncated, info) like Gymnasium. An episode ends when the
+player reaches the goal or after max_ticks.
+
+EnvPool splits a batch of environments over worker processes. Actions, observations, rewards and
+episode flags live in shared-memory arrays that the workers read and write in place, so a step
+sends each worker one byte and nothing is pickled. Measure throughput with
+`python bot_env.py bench --envs 64 --workers 1,2,4,8`.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+
+from platformer_game import (ACTIVE, COLLECTED, COLLECTIBLE, FPS, JUMP_STRENGTH, PLAYER_SPEED, SCREEN_HEIGHT,
+                             SCREEN_WIDTH, InputState, Simulation)
+
+# An action is ACTION_SIZE integers: move (-1 left, 0, 1 right), jump (0 or 1), draw (0 or 1) and
+# the world coordinates a drawn platform is dragged between
+ACTION_FIELDS = ('move', 'jump', 'draw', 'start_x', 'start_y', 'end_x', 'end_y')
+ACTION_SIZE = len(ACTION_FIELDS)
+
+# An observation is PLAYER_FEATURES floats about the player and goal, then ENTITY_FEATURES for
+# each of the OBSERVED_ENTITIES nearest live entities, nearest first and zero past the last
+PLAYER_FEATURES = 9  # x, y, velocity x, y, on ground, platforms left, goal offset x, y, episode time left
+ENTITY_FEATURES = 4 + COLLECTIBLE + 1  # Offset x, y from the player, width, height, then the kind one-hot
+OBSERVED_ENTITIES = 16
+OBSERVATION_SIZE = PLAYER_FEATURES + OBSERVED_ENTITIES * ENTITY_FEATURES
+PIXEL_SCALE = 1 / 100  # Pixels to observation units, keeping features within about +-10
+
+FRAME_SKIP = 4  # Ticks each action is held for
+MAX_EPISODE_TICKS = 60 * FPS  # A minute of play before an episode is cut short
+GOAL_REWARD = 10.0  # For reaching the goal, which ends the episode
+PROGRESS_REWARD = 0.01  # Per pixel closer to the goal, or to the far end of a marathon level before its goal streams in
+SCORE_REWARD = 0.1  # Per point scored, 1 per collectible
+RESET_PENALTY = 1.0  # For hitting spikes or falling, which send the player back to the checkpoint
+DRAW_COST = 0.1  # Per platform drawn, so the budget is not spent for nothing
+
+# Commands EnvPool sends its workers
+RESET = b'r'
+STEP = b's'
+CLOSE = b'c'
+
+
+class PlatformerEnv:
+    """One headless game for a bot: Gymnasium-style reset() and step() over a Simulation"""
+    def __init__(self, levels=range(1, 11), max_ticks=MAX_EPISODE_TICKS, frame_skip=FRAME_SKIP, marathon_chunks=0,
+                 seed=None):
+        self.levels = list(levels)
+        self.max_ticks = max_ticks
+        self.frame_skip = frame_skip
+        self.marathon_chunks = marathon_chunks
+        self.rng = random.Random(seed)
+        self.world = None
+        self.ticks = 0
+        self.score = 0
+        self.distance = 0.0
+        self.observation_buffer = None  # Observations are written here instead of into fresh arrays when set
+        self.controls = {(move, jump): InputState(left=move < 0, right=move > 0, jump=bool(jump))
+                         for move in (-1, 0, 1) for jump in (0, 1)}
+
+    def reset(self, seed=None, level=None):
+        """Start an episode on a level picked by the environment's random generator, reseeded by seed"""
+        if seed is not None:
+            self.rng.seed(seed)
+        session_seed = self.rng.getrandbits(32)
+        if level is None:
+            level = self.rng.choice(self.levels)
+        # Bots never rewind, so skip the snapshot history
+        self.world = Simulation(seed=session_seed, start_level=level, marathon_chunks=self.marathon_chunks, history=0)
+        self.ticks = 0
+        self.score = 0
+        self.distance = self.goal_distance()
+        return self.observe(self.observation_buffer), self.info()
+
+    def step(self, action):
+        """Apply one action for frame_skip ticks, returning (observation, reward, terminated, truncated, info)"""
+        move, jump, draw, start_x, start_y, end_x, end_y = action
+        world = self.world
+        player = world.player
+        reward = 0.0
+        if draw and world.draw_platform((int(start_x), int(start_y)), (int(end_x), int(end_y))) is not None:
+            reward -= DRAW_COST
+
+        controls = self.controls[(max(-1, min(1, int(move))), 1 if jump else 0)]
+        terminated = False
+        respawns = player.respawns
+        for _ in range(self.frame_skip):
+            self.ticks += 1
+            if world.step(controls):
+                terminated = True
+                break
+        reward -= (player.respawns - respawns) * RESET_PENALTY  # Sent back to the checkpoint
+
+        reward += (player.score - self.score) * SCORE_REWARD
+        self.score = player.score
+        if terminated:
+            # The world has moved on to the next level, so there is no distance left to reward
+            reward += GOAL_REWARD
+        else:
+            distance = self.goal_distance()
+            reward += (self.distance - distance) * PROGRESS_REWARD
+            self.distance = distance
+        truncated = not terminated and self.ticks >= self.max_ticks
+        return self.observe(self.observation_buffer), reward, terminated, truncated, self.info()
+
+    def info(self):
+        world = self.world
+        return {'level': world.current_level, 'level_type': world.current_level_type, 'score': world.player.score,
+                'ticks': self.ticks}
+
+    def goal_point(self):
+        """Centre of the goal, or the far end of a marathon level whose goal has not streamed in yet"""
+        world = self.world
+        if world.goals:
+            return world.goals[0].rect.center
+        return world.level_width(), world.player.y
+
+    def goal_distance(self):
+        player = self.world.player
+        goal_x, goal_y = self.goal_point()
+        return float(np.hypot(goal_x - (player.x + player.width / 2), goal_y - (player.y + player.height / 2)))
+
+    def observe(self, out=None):
+        """The observation vector for the current tick, written into out if given"""
+        if out is None:
+            out = np.empty(OBSERVATION_SIZE, np.float32)
+        world = self.world
+        player = world.player
+        store = world.store
+        center_x = player.x + player.width / 2
+        center_y = player.y + player.height / 2
+        goal_x, goal_y = self.goal_point()
+        out[:PLAYER_FEATURES] = (player.x * PIXEL_SCALE, player.y * PIXEL_SCALE, player.vel_x / PLAYER_SPEED,
+                                 player.vel_y / -JUMP_STRENGTH, player.on_ground,
+                                 world.max_platforms - len(world.drawn_platforms), (goal_x - center_x) * PIXEL_SCALE,
+                                 (goal_y - center_y) * PIXEL_SCALE, 1 - self.ticks / self.max_ticks)
+
+        entities = out[PLAYER_FEATURES:].reshape(OBSERVED_ENTITIES, ENTITY_FEATURES)
+        entities.fill(0)
+        count = len(store)
+        if count:
+            # Copies of the store's columns; views would stop the arrays from growing
+            x, y, width, height = (np.array(column, np.float32) for column in (store.x, store.y, store.w, store.h))
+            flags = np.array(store.flags, np.uint8)
+            offset_x = x + width / 2 - center_x
+            offset_y = y + height / 2 - center_y
+            distance = offset_x * offset_x + offset_y * offset_y
+            distance[(flags & (ACTIVE | COLLECTED)) != ACTIVE] = np.inf
+            nearest = np.argsort(distance)[:OBSERVED_ENTITIES] if count > OBSERVED_ENTITIES else np.argsort(distance)
+            nearest = nearest[np.isfinite(distance[nearest])]
+            shown = len(nearest)
+            entities[:shown, 0] = offset_x[nearest] * PIXEL_SCALE
+            entities[:shown, 1] = offset_y[nearest] * PIXEL_SCALE
+            entities[:shown, 2] = width[nearest] * PIXEL_SCALE
+            entities[:shown, 3] = height[nearest] * PIXEL_SCALE
+            entities[np.arange(shown), 4 + np.array(store.kind, np.intp)[nearest]] = 1
+        return out
+
+
+def shared_arrays(buffers, num_envs):
+    """NumPy views of EnvPool's shared buffers: actions, observations, rewards, terminated, truncated, seeds"""
+    actions, observations, rewards, terminated, truncated, seeds = buffers
+    return (np.frombuffer(actions, np.int32).reshape(num_envs, ACTION_SIZE),
+            np.frombuffer(observations, np.float32).reshape(num_envs, OBSERVATION_SIZE),
+            np.frombuffer(rewards, np.float32), np.frombuffer(terminated, np.bool_), np.frombuffer(truncated, np.bool_),
+            np.frombuffer(seeds, np.int64))
+
+
+def run_worker(connection, buffers, num_envs, start, stop, seed, env_options):
+    """Worker process entry point: step environments start to stop on command, in place in the shared arrays"""
+    actions, observations, rewards, terminated, truncated, seeds = shared_arrays(buffers, num_envs)
+    envs = []
+    for index in range(start, stop):
+        env = PlatformerEnv(seed=seed + index, **env_options)
+        env.observation_buffer = observations[index]
+        envs.append(env)
+    while True:
+        try:
+            command = connection.recv_bytes()
+        except EOFError:
+            break
+        if command == CLOSE:
+            break
+        if command == RESET:
+            for index, env in enumerate(envs, start):
+                env.reset(None if seeds[index] < 0 else int(seeds[index]))
+                rewards[index] = 0
+                terminated[index] = truncated[index] = False
+        elif command == STEP:
+            for index, env in enumerate(envs, start):
+                _, reward, done, cut, _ = env.step(actions[index])
+                rewards[index] = reward
+                terminated[index] = done
+                truncated[index] = cut
+                if done or cut:
+                    # Start the next episode straight away; the flags say this one ended
+                    env.reset()
+        connection.send_bytes(b'')
+    connection.close()
+
+
+class EnvPool:
+    """num_envs PlatformerEnvs stepped together by worker processes over shared-memory arrays
+
+    step() and reset() return the shared arrays themselves, which the next call overwrites. An
+    environment whose episode ended is reset in the same step, so the observation it returns is
+    the first of its next episode.
+    """
+    def __init__(self, num_envs, workers=None, seed=0, **env_options):
+        workers = max(1, min(workers or os.cpu_count(), num_envs))
+        self.num_envs = num_envs
+        self.seed = seed
+        buffers = (multiprocessing.RawArray('i', num_envs * ACTION_SIZE),
+                   multiprocessing.RawArray('f', num_envs * OBSERVATION_SIZE),
+                   multiprocessing.RawArray('f', num_envs), multiprocessing.RawArray('b', num_envs),
+                   multiprocessing.RawArray('b', num_envs), multiprocessing.RawArray('q', num_envs))
+        (self.actions, self.observations, self.rewards, self.terminated, self.truncated,
+         self.seeds) = shared_arrays(buffers, num_envs)
+
+        # Contiguous runs of environments, as even as they divide
+        self.connections = []
+        self.processes = []
+        for worker in range(workers):
+            start = num_envs * worker // workers
+            stop = num_envs * (worker + 1) // workers
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_worker, daemon=True,
+                                              args=(child, buffers, num_envs, start, stop, seed, env_options))
+            process.start()
+            child.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def __len__(self):
+        return self.num_envs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def command(self, command):
+        """Send every worker a command and wait for all of them to finish it"""
+        for connection in self.connections:
+            connection.send_bytes(command)
+        for connection in self.connections:
+            connection.recv_bytes()
+
+    def reset(self, seed=None):
+        """Start a new episode in every environment, environment i seeded with seed + i if a seed is given"""
+        self.seeds[:] = -1 if seed is None else seed + np.arange(self.num_envs)
+        self.command(RESET)
+        return self.observations
+
+    def step(self, actions):
+        """Apply a (num_envs, ACTION_SIZE) array of actions, returning observations, rewards, terminated and truncated"""
+        self.actions[:] = actions
+        self.command(STEP)
+        return self.observations, self.rewards, self.terminated, self.truncated
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send_bytes(CLOSE)
+            except OSError:
+                pass  # Already gone
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+
+def random_actions(rng, num_envs, draw_rate=0.01):
+    """A batch of random actions: mostly moving and jumping, now and then drawing a platform"""
+    actions = np.zeros((num_envs, ACTION_SIZE), np.int32)
+    actions[:, 0] = rng.integers(-1, 2, num_envs)
+    actions[:, 1] = rng.random(num_envs) < 0.3
+    actions[:, 2] = rng.random(num_envs) < draw_rate
+    actions[:, 3] = actions[:, 5] = rng.integers(0, SCREEN_WIDTH - 100, num_envs)
+    actions[:, 5] += rng.integers(50, 200, num_envs)
+    actions[:, 4] = actions[:, 6] = rng.integers(SCREEN_HEIGHT // 3, SCREEN_HEIGHT - 40, num_envs)
+    return actions
+
+
+def run_bench(args):
+    rng = np.random.default_rng(args.seed)
+    batches = [random_actions(rng, args.envs) for _ in range(64)]
+    baseline = None
+    for workers in (int(count) for count in args.workers.split(',')):
+        with EnvPool(args.envs, workers, seed=args.seed, frame_skip=args.frame_skip) as pool:
+            pool.reset()
+            episodes = 0
+            start = time.perf_counter()
+            for step in range(args.steps):
+                _, _, terminated, truncated = pool.step(batches[step % len(batches)])
+                episodes += int(np.count_nonzero(terminated | truncated))
+            elapsed = time.perf_counter() - start
+        rate = args.envs * args.steps / elapsed
+        if baseline is None:
+            baseline = rate / workers
+        print(f"{workers:>3} workers: {rate:>9.0f} env steps/s, {rate * args.frame_skip:>9.0f} ticks/s, "
+              f"{episodes} episodes ended, {rate / baseline:.2f}x one worker's rate")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bot environment tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    bench = commands.add_parser('bench', help="Measure EnvPool throughput with random actions")
+    bench.add_argument('--envs', type=int, default=64, help="Environments stepped together")
+    bench.add_argument('--workers', default=str(os.cpu_count()), help="Worker counts to try, e.g. 1,2,4,8")
+    bench.add_argument('--steps', type=int, default=500, help="Pool steps per worker count")
+    bench.add_argument('--frame-skip', type=int, default=FRAME_SKIP)
+    bench.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        return run_bench(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Input recording and max-speed headless replay of play sessions.
+
+Record with `python platformer_game.py --record session.dpr`, then check that a recording
+still plays out the same with `python input_replay.py check session.dpr`.
+
+A recording holds the session seed, one key bitmask byte per simulation tick, the discrete
+actions taken between ticks (drawn platforms, clears, restarts, screen size changes) and the
+state the session ended in. Replaying feeds the same inputs to a Simulation without a window
+and compares the end state.
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+from array import array
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from level_verifier import pool_imap
+from platformer_game import InputState, Simulation
+
+MAGIC = b'DPIR'
+VERSION = 4  # Bumped whenever a simulation change makes older recordings replay differently
+
+HEADER = struct.Struct('<4sHxxQIHHII')  # magic, version, session seed, start level, screen size, ticks, events
+END_STATE = struct.Struct('<Iqddd')  # level, score, simulated time, player x, player y
+EVENT = struct.Struct('<IB3x4i')  # tick, kind, four arguments
+
+# Key bits per tick
+LEFT = 1
+RIGHT = 2
+JUMP = 4
+REWIND = 8
+ALL_KEYS = LEFT | RIGHT | JUMP | REWIND
+
+# Actions taken between ticks
+DRAW = 1  # start x, start y, end x, end y
+CLEAR = 2
+RESTART = 3
+RESIZE = 4  # screen width, screen height
+EVENT_KINDS = (DRAW, CLEAR, RESTART, RESIZE)
+
+
+def controls_mask(controls):
+    return ((LEFT if controls.left else 0) | (RIGHT if controls.right else 0) | (JUMP if controls.jump else 0)
+            | (REWIND if controls.rewind else 0))
+
+
+def mask_controls(mask):
+    return InputState(bool(mask & LEFT), bool(mask & RIGHT), bool(mask & JUMP), bool(mask & REWIND))
+
+
+def end_state(world):
+    """What a replay has to reproduce: level, score, simulated time and player position"""
+    return (world.current_level, world.player.score, world.time, world.player.x, world.player.y)
+
+
+class InputRecording:
+    """A recorded session: seed, per-tick key masks, actions and the state it ended in"""
+    def __init__(self, seed, start_level, screen_width, screen_height):
+        self.seed = seed
+        self.start_level = start_level
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.keys = array('B')
+        self.events = []  # (tick, kind, a, b, c, d) in the order they happened
+        self.end_state = None
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.seed, self.start_level, self.screen_width,
+                                   self.screen_height, len(self.keys), len(self.events)))
+            file.write(END_STATE.pack(*self.end_state))
+            self.keys.tofile(file)
+            file.write(b''.join(EVENT.pack(*event) for event in self.events))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < HEADER.size + END_STATE.size or data[:4] != MAGIC:
+            raise ValueError(f"{path}: not an input recording")
+        magic, version, seed, start_level, width, height, ticks, event_count = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported recording version {version}")
+        recording = cls(seed, start_level, width, height)
+        position = HEADER.size
+        recording.end_state = END_STATE.unpack_from(data, position)
+        position += END_STATE.size
+        recording.keys.frombytes(data[position:position + ticks])
+        position += ticks
+        recording.events = list(EVENT.iter_unpack(data[position:position + event_count * EVENT.size]))
+        if len(recording.keys) != ticks or len(recording.events) != event_count:
+            raise ValueError(f"{path}: truncated recording")
+        if any(mask & ~ALL_KEYS for mask in recording.keys):
+            raise ValueError(f"{path}: unknown key bits in recording")
+        if any(event[1] not in EVENT_KINDS for event in recording.events):
+            raise ValueError(f"{path}: unknown event kind in recording")
+        return recording
+
+
+class InputRecorder:
+    """Hooks called by Game to capture a session as it is played"""
+    def __init__(self, path, world):
+        self.path = path
+        self.recording = InputRecording(world.level_generator.session_seed, world.current_level,
+                                        world.screen_width, world.screen_height)
+
+    def tick(self, controls):
+        self.recording.keys.append(controls_mask(controls))
+
+    def event(self, kind, a=0, b=0, c=0, d=0):
+        self.recording.events.append((len(self.recording.keys), kind, a, b, c, d))
+
+    def draw(self, start_pos, end_pos):
+        self.event(DRAW, *start_pos, *end_pos)
+
+    def clear(self):
+        self.event(CLEAR)
+
+    def restart(self):
+        self.event(RESTART)
+
+    def resize(self, width, height):
+        self.event(RESIZE, width, height)
+
+    def finish(self, world):
+        self.recording.end_state = end_state(world)
+        self.recording.save(self.path)
+
+
+def apply_event(world, kind, a, b, c, d):
+    if kind == DRAW:
+        world.draw_platform((a, b), (c, d))
+    elif kind == CLEAR:
+        world.clear_drawn_platforms()
+    elif kind == RESTART:
+        world.restart_level()
+    elif kind == RESIZE:
+        world.screen_width, world.screen_height = a, b
+
+
+def replay(recording, on_tick=None):
+    """Play a recording back headless as fast as possible, returning the end state; on_tick sees the world after each tick"""
+    world = Simulation(recording.screen_width, recording.screen_height, seed=recording.seed,
+                       start_level=recording.start_level)
+    events = recording.events
+    next_event = 0
+    controls = [mask_controls(mask) for mask in range(ALL_KEYS + 1)]
+    for tick, mask in enumerate(recording.keys):
+        while next_event < len(events) and events[next_event][0] == tick:
+            apply_event(world, *events[next_event][1:])
+            next_event += 1
+        world.step(controls[mask])
+        if on_tick is not None:
+            on_tick(world)
+    for event in events[next_event:]:
+        apply_event(world, *event[1:])
+    return end_state(world)
+
+
+def check_file(path):
+    """Worker entry point: replay one recording and compare its end state"""
+    start = time.perf_counter()
+    try:
+        recording = InputRecording.load(path)
+        state = replay(recording)
+    except Exception as error:
+        # Report anything a bad or unexpected file raises as a failure rather than losing the worker
+        return {'path': path, 'ok': False, 'error': f"{type(error).__name__}: {error}"}
+    return {'path': path, 'ok': state == tuple(recording.end_state), 'ticks': len(recording.keys),
+            'expected': list(recording.end_state), 'actual': list(state),
+            'replay_ms': (time.perf_counter() - start) * 1000}
+
+
+def run_check(args):
+    start = time.perf_counter()
+    failures = 0
+    for result in pool_imap(check_file, args.paths, args.workers):
+        if result['ok']:
+            if args.verbose:
+                print(f"ok        {result['path']}  {result['ticks']} ticks in {result['replay_ms']:.1f} ms")
+        else:
+            failures += 1
+            detail = result.get('error') or f"expected {result['expected']}, got {result['actual']}"
+            print(f"MISMATCH  {result['path']}  {detail}")
+    elapsed = time.perf_counter() - start
+    print(f"{len(args.paths)} sessions, {failures} mismatched, {len(args.paths) / elapsed * 60:.0f} sessions/min",
+          file=sys.stderr)
+    return 1 if failures else 0
+
+
+def run_info(args):
+    recording = InputRecording.load(args.path)
+    level, score, sim_time, x, y = recording.end_state
+    print(f"{args.path}: seed {recording.seed}, level {recording.start_level} -> {level}, "
+          f"{len(recording.keys)} ticks ({sim_time / 1000:.1f}s), {len(recording.events)} actions, "
+          f"score {score}, player at ({x:.1f}, {y:.1f})")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Input recording tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    check = commands.add_parser('check', help="Replay recordings headless and compare their end states")
+    check.add_argument('paths', nargs='+')
+    check.add_argument('--workers', type=int, default=os.cpu_count())
+    check.add_argument('--verbose', action='store_true', help="Also list recordings that matched")
+    info = commands.add_parser('info', help="Describe a recording")
+    info.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'check':
+        return run_check(args)
+    if args.command == 'info':
+        return run_info(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
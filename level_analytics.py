@@ -0,0 +1,277 @@
+"""Streaming geometric analytics over generated levels, for tuning the difficulty curve.
+
+Run `python level_analytics.py analyze --count 1000000 --levels 1-10` to measure seeded levels on
+every core. Levels are generated and measured inside the workers and only fixed-size histograms
+per level type and difficulty come back, so memory use does not grow with the number of seeds.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from level_verifier import parse_level_range, pool_imap
+from platformer_game import SCREEN_HEIGHT, SCREEN_WIDTH, LevelGenerator
+
+# Histogram range and bin width per metric; values outside the range land in under/overflow bins
+METRICS = {
+    'gap_width': (0, 600, 20),  # Horizontal gap between neighbouring platforms, per gap
+    'height_delta': (-500, 500, 25),  # Rise from one platform to the next one to the right, per pair
+    'platforms': (0, 60, 1),  # Solid platforms, per level
+    'platform_overlaps': (0, 20, 1),  # Pairs of platforms that intersect, per level
+    'entity_overlaps': (0, 20, 1),  # Spikes, collectibles or goals intersecting a platform or each other, per level
+    'off_screen': (0, 20, 1),  # Entities not fully inside the screen, per level
+    'collectible_clearance': (0, 400, 10),  # Distance to the nearest platform or spike, per collectible
+    'goal_clearance': (0, 400, 10),  # Distance to the nearest platform or spike, per level
+    'collectible_goal_distance': (0, 1200, 30),  # Distance from each collectible to the goal
+}
+SUPPORT_DEPTH = 40  # A platform this close under an item is what it rests on, not an obstacle
+
+
+class Histogram:
+    """Fixed-bin histogram with exact count, mean, variance and extremes"""
+    def __init__(self, low, high, width):
+        self.low = low
+        self.high = high
+        self.width = width
+        self.counts = [0] * ((high - low) // width + 2)  # Underflow, bins, overflow
+        self.n = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        if value < self.low:
+            index = 0
+        elif value >= self.high:
+            index = len(self.counts) - 1
+        else:
+            index = 1 + int((value - self.low) // self.width)
+        self.counts[index] += 1
+        self.n += 1
+        self.total += value
+        self.total_sq += value * value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.n += other.n
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.n if self.n else 0.0
+
+    def stddev(self):
+        if not self.n:
+            return 0.0
+        mean = self.mean()
+        return math.sqrt(max(0.0, self.total_sq / self.n - mean * mean))
+
+    def quantile(self, q):
+        """Upper edge of the bin holding the q-th quantile, clamped to the observed range"""
+        if not self.n:
+            return 0.0
+        target = q * self.n
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                edge = self.low + i * self.width
+                return min(max(edge, self.min), self.max)
+        return self.max
+
+    def fraction_above(self, value):
+        """Share of samples at or above value, which should sit on a bin edge"""
+        if not self.n:
+            return 0.0
+        first = 1 + int((value - self.low) // self.width)
+        return sum(self.counts[max(0, first):]) / self.n
+
+    def to_dict(self):
+        return {'low': self.low, 'high': self.high, 'width': self.width, 'counts': self.counts, 'n': self.n,
+                'mean': self.mean(), 'stddev': self.stddev(),
+                'min': self.min if self.n else None, 'max': self.max if self.n else None}
+
+
+def rect_distance(a, b):
+    """Shortest distance between two rects, 0 when they touch or overlap"""
+    dx = max(b.left - a.right, a.left - b.right, 0)
+    dy = max(b.top - a.bottom, a.top - b.bottom, 0)
+    return math.hypot(dx, dy)
+
+
+def clearance(item, obstacles):
+    """Distance from an item to the nearest obstacle other than a platform it rests on"""
+    nearest = math.inf
+    for rect in obstacles:
+        resting = (0 <= rect.top - item.bottom <= SUPPORT_DEPTH and rect.left < item.right and rect.right > item.left)
+        if not resting:
+            nearest = min(nearest, rect_distance(item, rect))
+    return nearest
+
+
+def level_metrics(level):
+    """Geometric measurements of one generate_level tuple, as metric name -> list of values"""
+    platforms, moving_platforms, spikes, collectibles, disappearing_platforms, goals, _ = level
+    solids = [p.rect for p in platforms + disappearing_platforms] + [p.rect for p in moving_platforms]
+    spike_rects = [s.rect for s in spikes]
+    collectible_rects = [c.rect for c in collectibles]
+    goal_rects = [g.rect for g in goals]
+
+    # Gaps and climbs between neighbours, with moving platforms spanning their whole travel
+    spans = [p.rect for p in platforms + disappearing_platforms]
+    spans += [pygame.Rect(p.start_x, p.rect.y, p.end_x + p.rect.width - p.start_x, p.rect.height) for p in moving_platforms]
+    spans.sort(key=lambda rect: rect.left)
+    gaps = []
+    reach = spans[0].right if spans else 0
+    for rect in spans[1:]:
+        if rect.left > reach:
+            gaps.append(rect.left - reach)
+        reach = max(reach, rect.right)
+    height_deltas = [a.top - b.top for a, b in zip(spans, spans[1:])]
+
+    platform_overlaps = sum(1 for i, a in enumerate(solids) for b in solids[i + 1:] if a.colliderect(b))
+    items = spike_rects + collectible_rects + goal_rects
+    entity_overlaps = sum(1 for item in items if item.collidelist(solids) != -1)
+    entity_overlaps += sum(1 for i, a in enumerate(items) for b in items[i + 1:] if a.colliderect(b))
+    screen = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+    off_screen = sum(1 for rect in solids + items if not screen.contains(rect))
+
+    obstacles = solids + spike_rects
+    return {
+        'gap_width': gaps,
+        'height_delta': height_deltas,
+        'platforms': [len(solids)],
+        'platform_overlaps': [platform_overlaps],
+        'entity_overlaps': [entity_overlaps],
+        'off_screen': [off_screen],
+        'collectible_clearance': [d for d in (clearance(rect, obstacles) for rect in collectible_rects) if d < math.inf],
+        'goal_clearance': [d for d in (clearance(rect, obstacles) for rect in goal_rects) if d < math.inf],
+        'collectible_goal_distance': [rect_distance(rect, goal) for rect in collectible_rects for goal in goal_rects],
+    }
+
+
+class LevelAnalytics:
+    """Histograms of every metric per (level type, difficulty), mergeable across workers"""
+    def __init__(self):
+        self.levels = 0
+        self.groups = {}  # (level type, difficulty) -> {'levels': n, metric: Histogram}
+
+    def group(self, level_type, difficulty):
+        key = (level_type, difficulty)
+        group = self.groups.get(key)
+        if group is None:
+            group = {'levels': 0}
+            for name, (low, high, width) in METRICS.items():
+                group[name] = Histogram(low, high, width)
+            self.groups[key] = group
+        return group
+
+    def add(self, level_type, difficulty, metrics):
+        group = self.group(level_type, difficulty)
+        group['levels'] += 1
+        self.levels += 1
+        for name, values in metrics.items():
+            histogram = group[name]
+            for value in values:
+                histogram.add(value)
+
+    def merge(self, other):
+        self.levels += other.levels
+        for (level_type, difficulty), other_group in other.groups.items():
+            group = self.group(level_type, difficulty)
+            group['levels'] += other_group['levels']
+            for name in METRICS:
+                group[name].merge(other_group[name])
+
+    def format(self):
+        lines = [f"{'Level type':<24}{'diff':>5}{'levels':>10}{'gap mean':>9}{'gap p95':>8}{'gap max':>8}"
+                 f"{'climb p95':>10}{'overlap%':>9}{'entity%':>8}{'offscr%':>8}{'goal clr':>9}{'gem clr':>8}"]
+        for level_type, difficulty in sorted(self.groups):
+            group = self.groups[(level_type, difficulty)]
+            gaps = group['gap_width']
+            lines.append(f"{level_type:<24}{difficulty:>5}{group['levels']:>10}{gaps.mean():>9.1f}"
+                         f"{gaps.quantile(0.95):>8.0f}{gaps.max if gaps.n else 0:>8.0f}"
+                         f"{group['height_delta'].quantile(0.95):>10.0f}"
+                         f"{group['platform_overlaps'].fraction_above(1) * 100:>9.1f}"
+                         f"{group['entity_overlaps'].fraction_above(1) * 100:>8.1f}"
+                         f"{group['off_screen'].fraction_above(1) * 100:>8.1f}"
+                         f"{group['goal_clearance'].mean():>9.1f}{group['collectible_clearance'].mean():>8.1f}")
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {'levels': self.levels, 'metrics': {name: list(spec) for name, spec in METRICS.items()},
+                'groups': [{'type': level_type, 'difficulty': difficulty, 'levels': group['levels'],
+                            **{name: group[name].to_dict() for name in METRICS}}
+                           for (level_type, difficulty), group in sorted(self.groups.items())]}
+
+
+def analyze_block(task):
+    """Worker entry point: generate and measure levels for a block of seeds, returning only histograms"""
+    start_seed, count, level_nums = task
+    analytics = LevelAnalytics()
+    for seed in range(start_seed, start_seed + count):
+        generator = LevelGenerator(seed)
+        for level_num in level_nums:
+            level = generator.generate_level(level_num)
+            analytics.add(generator.last_level_type, min(level_num, 10), level_metrics(level))
+    return analytics
+
+
+def run_analyze(args):
+    level_nums = parse_level_range(args.levels)
+    tasks = ((seed, min(args.block_size, args.start_seed + args.count - seed), level_nums)
+             for seed in range(args.start_seed, args.start_seed + args.count, args.block_size))
+    analytics = LevelAnalytics()
+    start = time.perf_counter()
+    last_report = start
+
+    for block in pool_imap(analyze_block, tasks, args.workers):
+        analytics.merge(block)
+        now = time.perf_counter()
+        if args.progress and now - last_report >= args.progress:
+            last_report = now
+            print(f"{analytics.levels} levels, {analytics.levels / (now - start):.0f} levels/s", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(analytics.format())
+    print(f"{analytics.levels} levels in {elapsed:.1f}s ({analytics.levels / elapsed:.0f} levels/s)", file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(analytics.to_dict(), file)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Level analytics tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    analyze = commands.add_parser('analyze', help="Measure seeded levels across a process pool")
+    analyze.add_argument('--start-seed', type=int, default=0)
+    analyze.add_argument('--count', type=int, default=10000, help="Number of seeds to analyze")
+    analyze.add_argument('--levels', default='1-10', help="Level number or range, e.g. 4 or 1-10")
+    analyze.add_argument('--workers', type=int, default=os.cpu_count())
+    analyze.add_argument('--block-size', type=int, default=256, help="Seeds per worker task")
+    analyze.add_argument('--json', help="Also write the full histograms to this file")
+    analyze.add_argument('--progress', type=float, default=10.0, help="Seconds between progress lines, 0 for none")
+    args = parser.parse_args(argv)
+
+    if args.command == 'analyze':
+        return run_analyze(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
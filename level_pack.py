@@ -0,0 +1,205 @@
+"""Compact binary level packs with an offset index and memory-mapped loading.
+
+Run `python level_pack.py export levels.dlp --count 10000 --levels 1-10` to write a pack and
+`python platformer_game.py --pack levels.dlp` to play it.
+
+Layout, all little-endian:
+    file header    magic, version, level count, offset of the index
+    levels         per level a header (seed, level number, drawable platforms, type, entity
+                   counts) followed by fixed-size records for each entity kind in turn
+    index          one u64 file offset per level, so level K is found without reading the others
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from level_verifier import parse_level_range, pool_imap
+from platformer_game import (Collectible, DisappearingPlatform, EntityStore, Goal, LevelGenerator, MovingPlatform, Platform,
+                             Spike)
+
+MAGIC = b'DPLP'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sHxxIQ')  # magic, version, level count, index offset
+LEVEL_HEADER = struct.Struct('<QIHBx6H')  # seed, level number, max platforms, type, entity counts
+INDEX_ENTRY = struct.Struct('<Q')
+
+# One record format per entity kind, in the order generate_level returns them
+PLATFORM = struct.Struct('<4h')  # x, y, width, height
+MOVING_PLATFORM = struct.Struct('<6hd')  # x, y, width, height, start x, end x, speed
+SPIKE = struct.Struct('<4h')  # x, y, width, height
+COLLECTIBLE = struct.Struct('<2h')  # x, y
+DISAPPEARING_PLATFORM = struct.Struct('<4h2H')  # x, y, width, height, trigger delay, disappear time
+GOAL = struct.Struct('<2h')  # x, y
+
+_types = LevelGenerator(0)
+LEVEL_TYPE_NAMES = [_types.level_type_names[key] for key in _types.level_types]
+del _types
+
+
+def encode_level(level, level_type, seed, level_num):
+    """Pack one generate_level result into its binary record"""
+    platforms, moving_platforms, spikes, collectibles, disappearing_platforms, goals, max_platforms = level
+    counts = [len(group) for group in (platforms, moving_platforms, spikes, collectibles, disappearing_platforms, goals)]
+    parts = [LEVEL_HEADER.pack(seed, level_num, max_platforms, LEVEL_TYPE_NAMES.index(level_type), *counts)]
+    parts.extend(PLATFORM.pack(*p.rect) for p in platforms)
+    parts.extend(MOVING_PLATFORM.pack(*p.rect, p.start_x, p.end_x, p.speed) for p in moving_platforms)
+    parts.extend(SPIKE.pack(*s.rect) for s in spikes)
+    parts.extend(COLLECTIBLE.pack(c.rect.x, c.rect.y) for c in collectibles)
+    parts.extend(DISAPPEARING_PLATFORM.pack(*p.rect, p.trigger_delay, p.disappear_time) for p in disappearing_platforms)
+    parts.extend(GOAL.pack(g.x, g.y) for g in goals)
+    return b''.join(parts)
+
+
+class LevelPackWriter:
+    """Streams encoded levels to a pack file and writes the index on close"""
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.offsets = array('Q')
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, 0))
+
+    def add(self, record):
+        self.offsets.append(self.file.tell())
+        self.file.write(record)
+
+    def close(self):
+        index_offset = self.file.tell()
+        if sys.byteorder != 'little':
+            self.offsets.byteswap()
+        self.offsets.tofile(self.file)
+        self.file.seek(0)
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, len(self.offsets), index_offset))
+        self.file.close()
+
+
+class LevelPack:
+    """Memory-mapped pack reader; levels are decoded on demand straight from the mapping
+
+    Also usable as a Simulation level generator: level N plays pack entry N - 1, wrapping
+    around at the end of the pack.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < FILE_HEADER.size:
+            raise ValueError(f"{path}: too short to be a level pack")
+        magic, version, self.count, self.index_offset = FILE_HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a level pack")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported level pack version {version}")
+        if self.index_offset + self.count * INDEX_ENTRY.size > len(self.data):
+            raise ValueError(f"{path}: truncated level pack")
+        self.last_level_type = LEVEL_TYPE_NAMES[0]
+
+    def __len__(self):
+        return self.count
+
+    def __str__(self):
+        return f"pack {os.path.basename(self.path)}"
+
+    def header(self, k):
+        """File offset and (seed, level number, max platforms, type, counts...) of entry k"""
+        if not 0 <= k < self.count:
+            raise IndexError(f"level {k} out of range for a pack of {self.count}")
+        offset, = INDEX_ENTRY.unpack_from(self.data, self.index_offset + k * INDEX_ENTRY.size)
+        return offset, LEVEL_HEADER.unpack_from(self.data, offset)
+
+    def level(self, k):
+        """Entry k as a generate_level tuple plus its type name, seed and level number"""
+        offset, (seed, level_num, max_platforms, type_index, *counts) = self.header(k)
+        position = offset + LEVEL_HEADER.size
+        groups = []
+        for record, count in zip((PLATFORM, MOVING_PLATFORM, SPIKE, COLLECTIBLE, DISAPPEARING_PLATFORM, GOAL), counts):
+            end = position + record.size * count
+            groups.append(list(record.iter_unpack(self.data[position:end])))
+            position = end
+        platforms, moving, spikes, collectibles, disappearing, goals = groups
+
+        store = EntityStore()
+        level = ([Platform(*fields, store=store) for fields in platforms],
+                 [MovingPlatform(x, y, w, h, start_x, end_x, speed, store=store)
+                  for x, y, w, h, start_x, end_x, speed in moving],
+                 [Spike(*fields, store=store) for fields in spikes],
+                 [Collectible(*fields, store=store) for fields in collectibles],
+                 [DisappearingPlatform(*fields, store=store) for fields in disappearing],
+                 [Goal(*fields) for fields in goals],
+                 max_platforms)
+        return level, LEVEL_TYPE_NAMES[type_index], seed, level_num
+
+    def generate_level(self, level_num):
+        level, self.last_level_type, _, _ = self.level((level_num - 1) % self.count)
+        return level
+
+    def close(self):
+        self.data.close()
+
+
+def encode_block(task):
+    """Worker entry point: generate and encode levels for a block of seeds"""
+    start_seed, count, level_nums = task
+    records = []
+    for seed in range(start_seed, start_seed + count):
+        generator = LevelGenerator(seed)
+        for level_num in level_nums:
+            level = generator.generate_level(level_num)
+            records.append(encode_level(level, generator.last_level_type, seed, level_num))
+    return records
+
+
+def run_export(args):
+    level_nums = parse_level_range(args.levels)
+    tasks = ((seed, min(args.block_size, args.start_seed + args.count - seed), level_nums)
+             for seed in range(args.start_seed, args.start_seed + args.count, args.block_size))
+    writer = LevelPackWriter(args.path)
+    # Ordered so pack entries are seed-major, then level
+    for records in pool_imap(encode_block, tasks, args.workers, ordered=True):
+        for record in records:
+            writer.add(record)
+    writer.close()
+    print(f"{args.path}: {len(writer.offsets)} levels, {os.path.getsize(args.path)} bytes", file=sys.stderr)
+    return 0
+
+
+def run_info(args):
+    pack = LevelPack(args.path)
+    by_type = {}
+    for k in range(len(pack)):
+        _, (_, _, _, type_index, *_) = pack.header(k)
+        by_type[LEVEL_TYPE_NAMES[type_index]] = by_type.get(LEVEL_TYPE_NAMES[type_index], 0) + 1
+    print(f"{args.path}: version {VERSION}, {len(pack)} levels, {len(pack.data)} bytes")
+    for level_type in sorted(by_type):
+        print(f"  {level_type:<24}{by_type[level_type]:>9}")
+    pack.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Binary level pack tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="Generate seeded levels into a pack")
+    export.add_argument('path')
+    export.add_argument('--start-seed', type=int, default=0)
+    export.add_argument('--count', type=int, default=1000, help="Number of seeds to export")
+    export.add_argument('--levels', default='1-10', help="Level number or range per seed, e.g. 4 or 1-10")
+    export.add_argument('--workers', type=int, default=os.cpu_count())
+    export.add_argument('--block-size', type=int, default=64, help="Seeds per worker task")
+    info = commands.add_parser('info', help="Summarise a pack")
+    info.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        return run_export(args)
+    if args.command == 'info':
+        return run_info(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""Search-based solvability verifier for generated levels.
+
+Run `python level_verifier.py verify --count 100000` to check seeded levels on every core.
+"""
+import argparse
+import bisect
+import heapq
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from platformer_game import (FPS, GRAVITY, JUMP_STRENGTH, PLATFORM_FADE_TIME, PLAYER_SPEED, SCREEN_HEIGHT,
+                             SCREEN_WIDTH, LevelGenerator, Player)
+
+FRAME_MS = 1000 / FPS
+FADE_FRAMES = int(PLATFORM_FADE_TIME / FRAME_MS)  # Frames a drawn platform stays solid
+
+_probe = Player(0, 0)
+PLAYER_WIDTH = _probe.width
+PLAYER_HEIGHT = _probe.height
+del _probe
+
+
+def build_jump_arc(screen_height=SCREEN_HEIGHT):
+    """Feet offsets and vertical speeds per frame of a jump, following Player.update's integration order"""
+    arc = []
+    vel = JUMP_STRENGTH
+    dy = 0
+    while dy <= screen_height:
+        vel += GRAVITY
+        dy += vel
+        arc.append((dy, vel))
+    return arc
+
+
+def subtract_spans(lo, hi, blocked):
+    """Split the closed range [lo, hi] around a list of open (start, end) intervals"""
+    spans = [(lo, hi)]
+    for start, end in blocked:
+        next_spans = []
+        for span_lo, span_hi in spans:
+            if end <= span_lo or start >= span_hi:
+                next_spans.append((span_lo, span_hi))
+                continue
+            if start > span_lo:
+                next_spans.append((span_lo, start))
+            if end < span_hi:
+                next_spans.append((end, span_hi))
+        spans = next_spans
+    return spans
+
+
+class LevelVerifier:
+    """Best-first search over standing surfaces, drawn platforms and time
+
+    A node is a surface the player can stand on, described by the feet height and the range of
+    player x positions on it. Edges are jumps along the exact jump arc of Player.update, with the
+    player steering at up to PLAYER_SPEED. Drawing a platform is an edge to a new surface anywhere
+    along a descending jump arc and costs one platform; drawn platforms expire after
+    PLATFORM_FADE_TIME and at most max_platforms may exist at once. Jumping up through platforms
+    is allowed, as it is in the game. Moving platforms count as their whole travel range and
+    disappearing platforms as solid, since the player can wait for or outrun them.
+    """
+    def __init__(self, screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT, max_draws=10, max_expansions=20000):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.max_draws = max_draws  # Give up on levels needing more drawn platforms than this
+        self.max_expansions = max_expansions  # Search budget per level
+        self.arc = build_jump_arc(screen_height)
+        # Feet offset per frame, with frame 0 standing still
+        self.offsets = [0] + [dy for dy, vel in self.arc]
+        self.apex = next(i for i, (dy, vel) in enumerate(self.arc) if vel > 0)
+        # Feet offsets while falling, used to bisect for the landing frame at a given height
+        self.descent = [dy for dy, vel in self.arc[self.apex:]]
+
+    def verify(self, level):
+        """Search a generated level tuple, returns a result dict"""
+        platforms, moving_platforms, spikes, collectibles, disappearing_platforms, goals, max_platforms = level
+        start_time = time.perf_counter()
+        self.spikes = [spike.rect for spike in spikes]
+        self.goal = goals[0].rect if goals else None
+        self.goal_frames = {}
+
+        # Static surfaces, split around spikes so landing spots are safe
+        self.surfaces = []
+        for platform in platforms + disappearing_platforms:
+            self._add_surface(platform.rect.top, platform.rect.left, platform.rect.right)
+        for platform in moving_platforms:
+            self._add_surface(platform.rect.top, platform.start_x, platform.end_x + platform.rect.width)
+
+        solved, min_platforms, solution_frames, expansions = self._search(max_platforms)
+        return {
+            'solvable': solved,
+            'min_platforms': min_platforms,
+            'solution_ms': round(solution_frames * FRAME_MS) if solution_frames is not None else None,
+            'expansions': expansions,
+            'search_ms': (time.perf_counter() - start_time) * 1000,
+            'max_platforms': max_platforms,
+        }
+
+    def _player_range(self, left, right):
+        """Player x positions that keep the player standing on a surface spanning [left, right)"""
+        return max(0, left - PLAYER_WIDTH + 1), min(self.screen_width - PLAYER_WIDTH, right - 1)
+
+    def _safe_spans(self, top, lo, hi):
+        """Parts of a player x range where standing at feet height top does not touch a spike"""
+        blocked = [(spike.left - PLAYER_WIDTH, spike.right) for spike in self.spikes
+                   if spike.top < top and spike.bottom > top - PLAYER_HEIGHT]
+        return [(a, b) for a, b in subtract_spans(lo, hi, blocked) if a <= b]
+
+    def _add_surface(self, top, left, right):
+        lo, hi = self._player_range(left, right)
+        for span in self._safe_spans(top, lo, hi):
+            self.surfaces.append((top, span[0], span[1]))
+
+    def _start_surface(self):
+        """The surface the player lands on after spawning"""
+        spawn = Player(0, 0)
+        spawn.reset_position(self.screen_height)
+        feet = spawn.y + PLAYER_HEIGHT
+        best = None
+        for index, (top, lo, hi) in enumerate(self.surfaces):
+            if top >= feet and lo <= spawn.x <= hi and (best is None or top < self.surfaces[best][0]):
+                best = index
+        return best
+
+    def _landing_frame(self, takeoff_top, target_top):
+        """Frame count at which a jump from takeoff_top lands on a surface at target_top, or None"""
+        drop = target_top - takeoff_top
+        index = bisect.bisect_right(self.descent, drop)
+        if index == len(self.descent):
+            return None
+        frame = self.apex + index + 1
+        # The feet must cross the surface top while falling, not start out below it
+        return frame if self.offsets[frame - 1] <= drop else None
+
+    def _goal_frames(self, top):
+        """Frames of a jump from feet height top where the player overlaps the goal vertically"""
+        frames = self.goal_frames.get(top)
+        if frames is None:
+            goal = self.goal
+            frames = []
+            for frame, dy in enumerate(self.offsets):
+                head = top - PLAYER_HEIGHT + dy
+                if head < goal.bottom and head + PLAYER_HEIGHT > goal.top:
+                    frames.append((frame, head))
+            self.goal_frames[top] = frames
+        return frames
+
+    def _reaches_goal(self, top, lo, hi):
+        """Whether the player can touch the goal standing on or jumping from this surface"""
+        goal = self.goal
+        if goal is None:
+            return False
+        for frame, head in self._goal_frames(top):
+            reach = PLAYER_SPEED * frame
+            x_lo = max(lo - reach, 0, goal.left - PLAYER_WIDTH + 1)
+            x_hi = min(hi + reach, self.screen_width - PLAYER_WIDTH, goal.right - 1)
+            if x_lo > x_hi:
+                continue
+            blocked = [(spike.left - PLAYER_WIDTH, spike.right) for spike in self.spikes
+                       if head < spike.bottom and head + PLAYER_HEIGHT > spike.top]
+            if any(a <= b for a, b in subtract_spans(x_lo, x_hi, blocked)):
+                return True
+        return False
+
+    def _static_edges(self, top, lo, hi):
+        """Static surfaces reachable by one jump, as (surface index, flight frames)"""
+        edges = []
+        for index, (target_top, target_lo, target_hi) in enumerate(self.surfaces):
+            frame = self._landing_frame(top, target_top)
+            if frame is None:
+                continue
+            reach = PLAYER_SPEED * frame
+            if lo - reach <= target_hi and hi + reach >= target_lo:
+                edges.append((index, frame))
+        return edges
+
+    def _drawn_candidates(self, top, lo, hi):
+        """Surfaces a platform drawn during a jump can create, as ((top, lo, hi), flight frames)"""
+        candidates = []
+        for frame in range(self.apex + 1, len(self.offsets), 2):
+            prev_dy = self.offsets[frame - 1]
+            if prev_dy > 0:
+                break  # Drawing below the takeoff height never helps more than falling
+            drawn_top = math.ceil(top + prev_dy)
+            if drawn_top < 0 or drawn_top >= top + self.offsets[frame]:
+                continue
+            reach = PLAYER_SPEED * frame
+            for span in self._safe_spans(drawn_top, max(0, lo - reach), min(self.screen_width - PLAYER_WIDTH, hi + reach)):
+                candidates.append(((drawn_top, span[0], span[1]), frame))
+        return candidates
+
+    def _search(self, max_platforms):
+        """Returns (solvable, min platforms, solution frames, expansions); solvable is None when out of budget"""
+        start = self._start_surface()
+        if start is None:
+            return False, None, None, 0
+
+        # Heap entries: (platforms used, frame, tiebreak, surface, surface expiry, active drawn expiries)
+        counter = 0
+        heap = [(0, 0, counter, self.surfaces[start], None, ())]
+        # Expanded surfaces per feet height, as (lo, hi, used, frame) for dominance pruning
+        seen = {}
+        edge_cache = {}
+        expansions = 0
+
+        while heap:
+            used, frame, _, surface, expiry, active = heapq.heappop(heap)
+            top, lo, hi = surface
+            expanded = seen.setdefault(top, [])
+            if any(s_lo <= lo and s_hi >= hi and s_used <= used and s_frame <= frame
+                   for s_lo, s_hi, s_used, s_frame in expanded):
+                continue
+            expanded.append((lo, hi, used, frame))
+
+            expansions += 1
+            if expansions > self.max_expansions:
+                return None, None, None, expansions
+
+            if self._reaches_goal(top, lo, hi):
+                return True, used, frame, expansions
+
+            edges = edge_cache.get(surface)
+            if edges is None:
+                edges = edge_cache[surface] = self._static_edges(top, lo, hi)
+            for index, flight in edges:
+                land = frame + flight
+                counter += 1
+                heapq.heappush(heap, (used, land, counter, self.surfaces[index], None,
+                                      tuple(e for e in active if e > land)))
+
+            if used >= self.max_draws:
+                continue
+
+            # Wait for a drawn platform to expire when the budget is in use
+            active = tuple(e for e in active if e > frame)
+            draw_frame = frame
+            if len(active) >= max_platforms:
+                draw_frame = min(active)
+                if expiry is not None and draw_frame >= expiry:
+                    continue  # The platform we stand on fades before we could draw again
+                active = tuple(e for e in active if e > draw_frame)
+
+            for candidate, flight in self._drawn_candidates(top, lo, hi):
+                land = draw_frame + flight
+                drawn_expiry = draw_frame + FADE_FRAMES
+                counter += 1
+                heapq.heappush(heap, (used + 1, land, counter, candidate, drawn_expiry, active + (drawn_expiry,)))
+
+        return False, None, None, expansions
+
+
+def generate_seeded_level(seed, level_num):
+    """Generate the level a given session seed produces"""
+    generator = LevelGenerator(seed)
+    level = generator.generate_level(level_num)
+    return level, generator.last_level_type
+
+
+def verify_block(task):
+    """Worker entry point: verify levels for a block of seeds"""
+    start_seed, count, level_nums, max_draws, max_expansions = task
+    verifier = LevelVerifier(max_draws=max_draws, max_expansions=max_expansions)
+    results = []
+    for seed in range(start_seed, start_seed + count):
+        for level_num in level_nums:
+            level, level_type = generate_seeded_level(seed, level_num)
+            result = verifier.verify(level)
+            result.update(seed=seed, level=level_num, type=level_type)
+            results.append(result)
+    return results
+
+
+def parse_level_range(text):
+    """Parse '5' or '1-10' into a list of level numbers"""
+    if '-' in text:
+        first, last = text.split('-', 1)
+        return list(range(int(first), int(last) + 1))
+    return [int(text)]
+
+
+def _restore_default_sigterm():
+    # Workers inherit the SIGTERM handler SDL installs at pygame.init(), which turns the signal into a
+    # quit event instead of exiting and leaves Pool.terminate() waiting on them forever
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def pool_imap(function, tasks, workers, ordered=False):
+    """Yield function(task) for every task from a process pool, in task order if ordered
+
+    The pool is closed and joined once all results are in, or terminated if a worker or the caller raises.
+    """
+    pool = multiprocessing.Pool(workers, initializer=_restore_default_sigterm)
+    try:
+        yield from (pool.imap if ordered else pool.imap_unordered)(function, tasks)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+class VerificationSummary:
+    """Per level type pass/fail counts, search time and platform statistics"""
+    def __init__(self):
+        self.by_type = {}
+
+    def add(self, result):
+        stats = self.by_type.setdefault(result['type'], {
+            'levels': 0, 'pass': 0, 'fail': 0, 'unknown': 0,
+            'search_ms_total': 0.0, 'search_ms_max': 0.0, 'min_platforms': {}
+        })
+        stats['levels'] += 1
+        if result['solvable'] is True:
+            stats['pass'] += 1
+            count = stats['min_platforms']
+            count[result['min_platforms']] = count.get(result['min_platforms'], 0) + 1
+        elif result['solvable'] is False:
+            stats['fail'] += 1
+        else:
+            stats['unknown'] += 1
+        stats['search_ms_total'] += result['search_ms']
+        stats['search_ms_max'] = max(stats['search_ms_max'], result['search_ms'])
+
+    def format(self):
+        lines = [f"{'Level type':<24}{'levels':>9}{'pass':>9}{'fail':>7}{'unknown':>9}{'mean ms':>9}{'max ms':>9}  min platforms"]
+        for level_type in sorted(self.by_type):
+            stats = self.by_type[level_type]
+            mean_ms = stats['search_ms_total'] / stats['levels']
+            histogram = ' '.join(f"{k}:{v}" for k, v in sorted(stats['min_platforms'].items()))
+            lines.append(f"{level_type:<24}{stats['levels']:>9}{stats['pass']:>9}{stats['fail']:>7}{stats['unknown']:>9}"
+                         f"{mean_ms:>9.2f}{stats['search_ms_max']:>9.1f}  {histogram}")
+        return '\n'.join(lines)
+
+
+def run_verify(args):
+    level_nums = parse_level_range(args.levels)
+    tasks = ((seed, min(args.block_size, args.start_seed + args.count - seed), level_nums, args.max_draws, args.max_expansions)
+             for seed in range(args.start_seed, args.start_seed + args.count, args.block_size))
+    summary = VerificationSummary()
+    failures = 0
+
+    for results in pool_imap(verify_block, tasks, args.workers):
+        for result in results:
+            summary.add(result)
+            if result['solvable'] is not True:
+                failures += 1
+            if args.jsonl or (args.failures and result['solvable'] is not True):
+                result['search_ms'] = round(result['search_ms'], 3)
+                sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+
+    print(summary.format(), file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Level solvability tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    verify = commands.add_parser('verify', help="Verify seeded levels across a process pool")
+    verify.add_argument('--start-seed', type=int, default=0)
+    verify.add_argument('--count', type=int, default=1000, help="Number of seeds to verify")
+    verify.add_argument('--levels', default='1-10', help="Level number or range, e.g. 4 or 1-10")
+    verify.add_argument('--workers', type=int, default=os.cpu_count())
+    verify.add_argument('--block-size', type=int, default=64, help="Seeds per worker task")
+    verify.add_argument('--max-draws', type=int, default=10, help="Give up beyond this many drawn platforms")
+    verify.add_argument('--max-expansions', type=int, default=20000, help="Search budget per level")
+    verify.add_argument('--jsonl', action='store_true', help="Stream every result as a JSON line")
+    verify.add_argument('--failures', action='store_true', help="Stream only failed or undecided levels")
+    args = parser.parse_args(argv)
+
+    if args.command == 'verify':
+        return run_verify(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,20 @@
 import pygame
+import bisect
+import heapq
 import math
 import sys
+import json
+import time
 import random
+import struct
+import threading
+import weakref
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
 
 # Initialize Pygame
 pygame.init()
@@ -10,6 +23,7 @@ pygame.init()
 SCREEN_WIDTH = 1200
 SCREEN_HEIGHT = 800
 FPS = 60
+FRAME_MS = 1000 / FPS  # Milliseconds per frame; player and platform speeds are in pixels per frame
 
 # Colors
 WHITE = (255, 255, 255)
@@ -29,8 +43,177 @@ PLAYER_SPEED = 5
 PLATFORM_FADE_TIME = 5000  # 5 seconds in milliseconds
 MOVING_PLATFORM_SPEED = 1
 SPIKE_DAMAGE_COOLDOWN = 1000  # 1 second cooldown between spike damage
+BROADPHASE_CELL_SIZE = 80  # Grid cell size for collision broadphase
+HUD_TEXT_CACHE_SIZE = 256  # Rendered HUD strings kept between frames
+PLAYER_WALK_PHASES = 16  # Walk cycle frames in the player sprite atlas
+PLAYER_STRETCH_STEPS = 20  # Jump stretch frames, one per jump_animation decay step
+PLAYER_SPRITE_MARGIN = 8  # Transparent padding for arms, feet and walk bounce
+PLATFORM_SURFACE_POOL_SIZE = 64  # Translucent platform surfaces kept for reuse
+DIRTY_RECT_FULL_REDRAW_RATIO = 0.5  # Repaint the whole screen once this much of it is dirty
+MAX_CATCH_UP_STEPS = 5  # Simulation ticks run per rendered frame before the backlog is dropped
+INTERPOLATION_SNAP_DISTANCE = 100  # Player moves further than this in one tick are teleports
+FRAME_STATS_WINDOW = 600  # Recent frames kept for frame pacing statistics
+LEVEL_SEED_STRIDE = 1000003  # Spreads session seeds apart when deriving per-level seeds
+PROFILER_FRAMES = 300  # Frames of phase timings kept by the profiler
+PROFILER_OVERLAY_REFRESH = 15  # Frames between profiler overlay text updates
+PLAYER_SPAWN_X = 50  # Where the player starts a level, and a marathon chunk's checkpoint
+CHUNK_WIDTH = SCREEN_WIDTH  # Width of one marathon level chunk; keep it a multiple of the 200 pixel major grid
+MARATHON_CHUNKS = 20  # Default marathon level length in chunks
+CHUNKS_AHEAD = 2  # Marathon chunks generated in front of the one the player is in
+CHUNKS_BEHIND = 1  # Marathon chunks kept behind the player before being dropped
+CAMERA_DEADZONE = (0.3, 0.5)  # Screen fractions the player is kept between while the camera scrolls
+
+# Minimum free pixels kept between entity kinds when the level generator places them
+PLACEMENT_CLEARANCE = {
+    ('platform', 'platform'): 10,
+    ('platform', 'spike'): 10,
+    ('platform', 'collectible'): 5,
+    ('platform', 'goal'): 0,  # The goal stands on its platform
+    ('spike', 'spike'): 10,
+    ('spike', 'collectible'): 20,
+    ('spike', 'goal'): 40,
+    ('collectible', 'collectible'): 20,
+    ('collectible', 'goal'): 60,
+    ('goal', 'goal'): 0,
+}
+PLACEMENT_BAND_HEIGHT = 40  # Height of the horizontal bands the placement index buckets entities into
+COLLECTIBLE_SPIN_RATE = 0.2  # Collectible float animation advance per tick
+STORE_VECTORIZE_ROWS = 128  # Entity stores at least this big update with NumPy; smaller ones are quicker in a loop
+SNAPSHOT_INTERVAL = 4  # Simulation ticks between rewind snapshots; rewinding steps back one snapshot per tick
+SNAPSHOT_HISTORY = 3600  # Rewind snapshots kept, four minutes of play at one every SNAPSHOT_INTERVAL ticks
+SNAPSHOT_STATE = struct.Struct('<9dq2?')  # Time, player x, y, velocity, last spike damage, spawn x, animation, score, flags
+SPECTATOR_PORT = 7878  # Default port spectator clients watch a game on
+
+# Entity kinds; those that never change on their own come first so bulk updates skip them with one test
+STATIC_PLATFORM = 0
+SPIKE = 1
+DRAWN_PLATFORM = 2
+MOVING_PLATFORM = 3
+DISAPPEARING_PLATFORM = 4
+COLLECTIBLE = 5
+GOAL = 6
+
+# Entity flag bits
+ACTIVE = 1
+TRIGGERED = 2  # Disappearing platform timer running
+COLLECTED = 4
+REVERSED = 8  # Moving platform heading left
+
+# Timed transitions an EntityStore queues
+FADE_OUT = 0  # Drawn platform expired
+VANISH = 1  # Disappearing platform gone
+REAPPEAR = 2  # Disappearing platform back and ready to trigger again
+TIMER_SLACK = 1  # Milliseconds early a deadline is checked exactly, as float sums round either way
+
+def sweep_interval(position, size, velocity, low, high):
+    """Fractions of a move along one axis during which [position, position + size) overlaps [low, high)"""
+    if velocity > 0:
+        return (low - position - size) / velocity, (high - position) / velocity
+    if velocity < 0:
+        return (high - position) / velocity, (low - position - size) / velocity
+    if position < high and position + size > low:
+        return -math.inf, math.inf
+    return math.inf, -math.inf
+
+class SpatialGrid:
+    """Uniform grid broadphase mapping cells to the entities whose rects overlap them"""
+    def __init__(self, cell_size=BROADPHASE_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> sorted list of (order key, entity)
+        self.entries = {}  # id(entity) -> (order key, cell range)
+        self.next_order = 0
+        
+    def __len__(self):
+        return len(self.entries)
+    
+    def _cell_range(self, rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                (rect.right - 1) // size, (rect.bottom - 1) // size)
+    
+    def _add_to_cells(self, item, cell_range):
+        x0, y0, x1, y1 = cell_range
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bisect.insort(self.cells.setdefault((cx, cy), []), item)
+    
+    def _remove_from_cells(self, item, cell_range):
+        x0, y0, x1, y1 = cell_range
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells[(cx, cy)]
+                cell.remove(item)
+                if not cell:
+                    del self.cells[(cx, cy)]
+    
+    def insert(self, entity, rank=0):
+        """Add an entity; query results are sorted by rank, then insertion order"""
+        order = (rank, self.next_order)
+        self.next_order += 1
+        cell_range = self._cell_range(entity.rect)
+        self.entries[id(entity)] = (order, cell_range)
+        self._add_to_cells((order, entity), cell_range)
+        
+    def remove(self, entity):
+        entry = self.entries.pop(id(entity), None)
+        if entry:
+            self._remove_from_cells((entry[0], entity), entry[1])
+    
+    def move(self, entity):
+        """Refresh an entity's cells after its rect changed"""
+        entry = self.entries.get(id(entity))
+        if entry is None:
+            return
+        cell_range = self._cell_range(entity.rect)
+        if cell_range != entry[1]:
+            item = (entry[0], entity)
+            self._remove_from_cells(item, entry[1])
+            self._add_to_cells(item, cell_range)
+            self.entries[id(entity)] = (entry[0], cell_range)
+    
+    def query(self, rect):
+        """Entities in the cells a rect overlaps, in rank and insertion order"""
+        if not self.entries:
+            return []
+        size = self.cell_size
+        x0 = rect.left // size
+        y0 = rect.top // size
+        x1 = (rect.right - 1) // size
+        y1 = (rect.bottom - 1) // size
+        cells = self.cells
+        if x0 == x1 and y0 == y1:
+            cell = cells.get((x0, y0))
+            return [entity for order, entity in cell] if cell else []
+        
+        found = {}
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        return [found[order] for order in sorted(found)]
+
+class InputState:
+    """Player controls for a single simulation step"""
+    def __init__(self, left=False, right=False, jump=False, rewind=False):
+        self.left = left
+        self.right = right
+        self.jump = jump
+        self.rewind = rewind  # Step back through the rewind history instead of forward
+        
+    @classmethod
+    def from_keys(cls, keys):
+        """Build an input state from a pygame.key.get_pressed() result"""
+        return cls(
+            left=bool(keys[pygame.K_LEFT] or keys[pygame.K_a]),
+            right=bool(keys[pygame.K_RIGHT] or keys[pygame.K_d]),
+            jump=bool(keys[pygame.K_SPACE] or keys[pygame.K_UP] or keys[pygame.K_w]),
+            rewind=bool(keys[pygame.K_BACKSPACE])
+        )
 
 class Player:
+    sprite_atlas = {}  # Pre-rendered animation frames keyed by sprite_key()
+    
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -40,8 +223,11 @@ class Player:
         self.vel_y = 0
         self.on_ground = False
         self.color = BLUE
-        self.last_spike_damage = 0
+        self.last_spike_damage = -SPIKE_DAMAGE_COOLDOWN
         self.score = 0
+        self.collision_tests = 0  # Narrowphase candidates checked by the last update
+        self.spawn_x = PLAYER_SPAWN_X  # Where reset_position puts the player back
+        self.respawns = 0  # Spike hits and falls that sent the player back to spawn_x; not undone by rewinding
         
         # Animation properties
         self.animation_frame = 0
@@ -50,86 +236,83 @@ class Player:
         self.is_walking = False
         self.jump_animation = 0
         
-    def update(self, platforms, screen_width, screen_height, spikes=None, collectibles=None, disappearing_platforms=None):
-        # Handle input
-        keys = pygame.key.get_pressed()
+    def update(self, platforms, screen_width, screen_height, spikes=None, collectibles=None, disappearing_platforms=None,
+               controls=None, current_time=None, frames=1):
+        """Advance one step covering frames frames of FRAME_MS; the move is swept, so long steps do not tunnel"""
+        # Handle input - fall back to the live keyboard and clock when not driven by a simulation
+        if controls is None:
+            controls = InputState.from_keys(pygame.key.get_pressed())
+        if current_time is None:
+            current_time = pygame.time.get_ticks()
         self.vel_x = 0
         self.is_walking = False
         
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+        if controls.left:
             self.vel_x = -PLAYER_SPEED
             self.facing_right = False
             self.is_walking = True
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+        if controls.right:
             self.vel_x = PLAYER_SPEED
             self.facing_right = True
             self.is_walking = True
-        if (keys[pygame.K_SPACE] or keys[pygame.K_UP] or keys[pygame.K_w]) and self.on_ground:
+        if controls.jump and self.on_ground:
             self.vel_y = JUMP_STRENGTH
             self.on_ground = False
             self.jump_animation = 1.0
         
         # Update animations
         if self.is_walking and self.on_ground:
-            self.animation_frame += self.animation_speed
+            self.animation_frame += self.animation_speed * frames
         else:
             self.animation_frame = 0
             
         # Jump animation decay
         if self.jump_animation > 0:
-            self.jump_animation -= 0.05
+            self.jump_animation -= 0.05 * frames
         
         # Apply gravity
-        self.vel_y += GRAVITY
+        self.vel_y += GRAVITY * frames
         
-        # Store old position for moving platform detection
-        old_x = self.x
+        # Move along the swept path, stopping at the first platform surface crossed
+        start_x, start_y = self.x, self.y
+        dx, dy = self.vel_x * frames, self.vel_y * frames
+        self.on_ground = False
         
-        # Update position
-        self.x += self.vel_x
-        self.y += self.vel_y
+        # Everything the player's box could pass through this tick, padded by two pixels on each
+        # side since Rect truncates both the position and the size
+        query_rect = pygame.Rect(min(start_x, start_x + dx), min(start_y, start_y + dy),
+                                 self.width + abs(dx), self.height + abs(dy)).inflate(4, 4)
         
-        # Check collisions with platforms
-        self.on_ground = False
-        player_rect = pygame.Rect(self.x, self.y, self.width, self.height)
+        # Narrow broadphase grids down to what is near the player
+        if isinstance(platforms, SpatialGrid):
+            platforms = platforms.query(query_rect)
+        if isinstance(spikes, SpatialGrid):
+            spikes = spikes.query(query_rect)
+        collectible_grid = None
+        if isinstance(collectibles, SpatialGrid):
+            collectible_grid = collectibles
+            collectibles = collectibles.query(query_rect)
+        self.collision_tests = len(platforms) + len(spikes or ()) + len(collectibles or ())
         
-        for platform in platforms:
-            if platform.active and player_rect.colliderect(platform.rect):
-                # Trigger disappearing platforms
-                if isinstance(platform, DisappearingPlatform):
-                    platform.trigger()
-                
-                # Landing on top of platform
-                if self.vel_y > 0 and self.y < platform.rect.top:
-                    self.y = platform.rect.top - self.height
-                    self.vel_y = 0
-                    self.on_ground = True
-                    
-                    # Move with moving platforms
-                    if isinstance(platform, MovingPlatform):
-                        platform_movement = platform.speed * platform.direction
-                        self.x += platform_movement
-                        
-                # Hitting platform from below
-                elif self.vel_y < 0 and self.y > platform.rect.bottom:
-                    self.y = platform.rect.bottom
-                    self.vel_y = 0
-                # Hitting platform from the side
-                else:
-                    if self.vel_x > 0:  # Moving right
-                        self.x = platform.rect.left - self.width
-                    elif self.vel_x < 0:  # Moving left
-                        self.x = platform.rect.right
+        landed_on = self.sweep(platforms, current_time, dx, dy)
+        
+        # Spikes and collectibles are hit anywhere along the path actually travelled
+        player_rect = pygame.Rect(min(start_x, self.x), min(start_y, self.y),
+                                  self.width + abs(self.x - start_x), self.height + abs(self.y - start_y))
+        
+        # Move with moving platforms
+        if landed_on is not None and landed_on.kind == MOVING_PLATFORM:
+            self.x += landed_on.travel(current_time, frames * FRAME_MS)
         
         # Check spike collisions
         if spikes:
-            current_time = pygame.time.get_ticks()
             for spike in spikes:
                 if player_rect.colliderect(spike.rect):
                     if current_time - self.last_spike_damage > SPIKE_DAMAGE_COOLDOWN:
                         self.last_spike_damage = current_time
                         # Reset player position on spike hit
                         self.reset_position(screen_height)
+                        self.respawns += 1
                         break
         
         # Check collectible collisions
@@ -138,6 +321,8 @@ class Player:
                 if not collectible.collected and player_rect.colliderect(collectible.rect):
                     collectible.collected = True
                     self.score += 10
+                    if collectible_grid is not None:
+                        collectible_grid.remove(collectible)
         
         # Keep player on screen
         if self.x < 0:
@@ -148,32 +333,143 @@ class Player:
         # Reset if player falls off screen
         if self.y > screen_height:
             self.reset_position(screen_height)
+            self.respawns += 1
+    
+    def sweep(self, platforms, current_time, dx, dy):
+        """Move by (dx, dy) with swept collision, returning the platform landed on if any"""
+        # Each rect is read from the entity store once per sweep
+        platforms = [(platform, platform.rect) for platform in platforms if platform.active]
+        
+        # Platforms the player already overlaps are passed through, as when jumping up through one
+        embedded = [self.overlaps(rect) for _, rect in platforms]
+        landed_on = None
+        
+        # Each hit stops motion along one axis, so two passes resolve any move
+        for _ in range(2):
+            hit = None
+            for (platform, rect), inside in zip(platforms, embedded):
+                if not inside:
+                    impact = self.time_of_impact(rect, dx, dy)
+                    if impact is not None and (hit is None or impact[0] < hit[0]):
+                        hit = (impact[0], impact[1], platform, rect)
+            if hit is None:
+                break
+            t, axis, platform, rect = hit
+            
+            # Trigger disappearing platforms
+            if platform.kind == DISAPPEARING_PLATFORM:
+                platform.trigger(current_time)
+            
+            if axis == 'y':
+                # Landing on top of platform, sliding on with the rest of the horizontal move
+                self.x += dx * t
+                self.y = rect.top - self.height
+                self.vel_y = 0
+                self.on_ground = True
+                landed_on = platform
+                dx, dy = dx * (1 - t), 0
+            else:
+                # Hitting platform from the side, falling or rising on with the rest of the vertical move
+                self.x = rect.left - self.width if dx > 0 else rect.right
+                self.y += dy * t
+                dx, dy = 0, dy * (1 - t)
+        self.x += dx
+        self.y += dy
+        
+        # Platforms passed through are landed on once the player is falling with their head above the top
+        for (platform, rect), inside in zip(platforms, embedded):
+            if inside and self.overlaps(rect):
+                if platform.kind == DISAPPEARING_PLATFORM:
+                    platform.trigger(current_time)
+                if self.vel_y > 0 and self.y < rect.top:
+                    self.y = rect.top - self.height
+                    self.vel_y = 0
+                    self.on_ground = True
+                    landed_on = platform
+        return landed_on
+    
+    def overlaps(self, rect):
+        """Strict overlap of the player's float box with rect, like Rect.colliderect"""
+        return (self.x < rect.right and self.x + self.width > rect.left and
+                self.y < rect.bottom and self.y + self.height > rect.top)
+    
+    def time_of_impact(self, rect, dx, dy):
+        """First fraction of the move (dx, dy) at which the player overlaps rect and the axis hit, or None"""
+        x_entry, x_exit = sweep_interval(self.x, self.width, dx, rect.left, rect.right)
+        y_entry, y_exit = sweep_interval(self.y, self.height, dy, rect.top, rect.bottom)
+        entry = max(x_entry, y_entry)
+        if entry < 0 or entry >= 1 or entry >= min(x_exit, y_exit):
+            return None
+        if y_entry >= x_entry:
+            # Platforms are only solid from above
+            return (entry, 'y') if dy > 0 else None
+        return entry, 'x'
     
     def reset_position(self, screen_height=SCREEN_HEIGHT):
-        self.x = 50
+        self.x = self.spawn_x
         self.y = screen_height - 200
         self.vel_x = 0
         self.vel_y = 0
     
+    def shift(self, dx):
+        """Move horizontally by dx pixels"""
+        self.x += dx
+    
+    def sprite_key(self):
+        """Atlas key for the current animation state: color, facing, walk phase and jump stretch"""
+        phase = None
+        if self.is_walking and self.on_ground:
+            cycle = self.animation_frame * 3 / (2 * math.pi)
+            phase = int(round(cycle * PLAYER_WALK_PHASES)) % PLAYER_WALK_PHASES
+        stretch = round(max(0, self.jump_animation) * PLAYER_STRETCH_STEPS)
+        return self.color, self.facing_right, phase, stretch
+    
     def draw(self, screen):
+        # Animation frames are rendered once on first use and shared by every player
+        key = self.sprite_key()
+        sprite = Player.sprite_atlas.get(key)
+        if sprite is None:
+            sprite = self.render_sprite(*key)
+            Player.sprite_atlas[key] = sprite
+            FrameProfiler.surfaces_allocated += 1
+        screen.blit(sprite, (int(self.x) - PLAYER_SPRITE_MARGIN, int(self.y) - PLAYER_SPRITE_MARGIN))
+    
+    def bounds(self):
+        """Screen area covered by the current sprite"""
+        margin = PLAYER_SPRITE_MARGIN
+        return pygame.Rect(int(self.x) - margin, int(self.y) - margin,
+                           self.width + margin * 2, self.height + margin * 3)
+    
+    def render_key(self):
+        """Everything that changes how the player looks on screen"""
+        return (self.sprite_key(), int(self.x), int(self.y))
+    
+    def render_sprite(self, color, facing_right, phase, stretch):
+        """Render one animation frame onto a transparent surface"""
+        margin = PLAYER_SPRITE_MARGIN
+        surface = pygame.Surface((self.width + margin * 2, self.height + margin * 3), pygame.SRCALPHA)
+        swing = 0
+        if phase is not None:
+            swing = math.sin(phase * 2 * math.pi / PLAYER_WALK_PHASES)
+        self.draw_body(surface, margin, margin, color, facing_right, swing, stretch * 3 / PLAYER_STRETCH_STEPS)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        return surface
+    
+    def draw_body(self, screen, x, y, color, facing_right, swing, jump_stretch):
+        """Draw the character with its top-left at (x, y); swing is the walk cycle sine"""
         # Calculate animation offsets
-        walk_bounce = 0
-        if self.is_walking and self.on_ground:
-            walk_bounce = math.sin(self.animation_frame * 3) * 2
-        
-        jump_stretch = 0
-        if self.jump_animation > 0:
-            jump_stretch = self.jump_animation * 3
+        walk_bounce = swing * 2
         
         # Body position with animation
-        body_x = self.x
-        body_y = self.y + walk_bounce
+        body_x = x
+        body_y = y + walk_bounce
         body_width = self.width
         body_height = self.height + jump_stretch
         
         # Draw main body - rounded rectangle for friendlier look
         body_rect = pygame.Rect(body_x + 2, body_y + 5, body_width - 4, body_height - 8)
-        pygame.draw.rect(screen, self.color, body_rect)
+        pygame.draw.rect(screen, color, body_rect)
         pygame.draw.rect(screen, (60, 100, 180), body_rect, 2)
         
         # Draw head - larger and rounder
@@ -187,7 +483,7 @@ class Player:
         eye_size = 3
         eye_y = head_y - 2
         
-        if self.facing_right:
+        if facing_right:
             # Eyes looking right with happy expression
             left_eye_x = head_x - 5
             right_eye_x = head_x + 2
@@ -232,9 +528,7 @@ class Player:
         pygame.draw.circle(screen, cheek_color, (int(head_x + 8), int(head_y + 1)), 3)
         
         # Draw arms with animation - more visible and friendly
-        arm_swing = 0
-        if self.is_walking and self.on_ground:
-            arm_swing = math.sin(self.animation_frame * 3) * 4
+        arm_swing = swing * 4
         
         arm_color = (100, 140, 220)
         
@@ -251,9 +545,7 @@ class Player:
         pygame.draw.circle(screen, (80, 120, 200), (int(right_arm_x), int(right_arm_y)), 4, 1)
         
         # Draw legs with walking animation - more prominent
-        leg_offset = 0
-        if self.is_walking and self.on_ground:
-            leg_offset = math.sin(self.animation_frame * 3) * 3
+        leg_offset = swing * 3
         
         leg_color = (80, 120, 200)
         
@@ -272,68 +564,520 @@ class Player:
         pygame.draw.ellipse(screen, foot_color, (left_leg_x - 3, left_leg_y + 3, 6, 4))
         pygame.draw.ellipse(screen, foot_color, (right_leg_x - 3, right_leg_y + 3, 6, 4))
 
-class Platform:
-    def __init__(self, x, y, width, height, temporary=False):
-        self.rect = pygame.Rect(x, y, width, height)
-        self.temporary = temporary
-        self.active = True
-        self.creation_time = pygame.time.get_ticks() if temporary else 0
-        self.color = PURPLE if temporary else GRAY
-        
-    def update(self):
-        if self.temporary and self.active:
+def rect_coord(value):
+    """Round like assigning a float to a pygame.Rect attribute"""
+    return int(value + 0.5) if value >= 0 else -int(0.5 - value)
+
+def rect_coords(values):
+    """rect_coord over NumPy arrays, still as floats"""
+    return np.where(values >= 0, np.floor(values + 0.5), np.ceil(values - 0.5))
+
+def path_phase(start_x, end_x, speed, origin, time):
+    """Distance along the out-and-back loop over [start_x, end_x] at time, heading left from span on, and span
+    
+    origin is a time the platform was at start_x heading right and speed is in pixels per frame.
+    The phase is 0 for a path with no span.
+    """
+    span = end_x - start_x
+    if span <= 0:
+        return 0, span
+    return (time - origin) * speed * FPS / 1000 % (2 * span), span
+
+def path_phases(start_x, end_x, speed, origin, times):
+    """path_phase over NumPy arrays, broadcasting any mix of platforms and times"""
+    span = np.asarray(end_x - start_x, dtype=float)
+    phase = (times - origin) * speed * FPS / 1000 % np.where(span > 0, 2 * span, 1.0)
+    return phase, span
+
+def path_x(start_x, phase, span):
+    """Unrounded x at a phase of a path with a positive span, for numbers or NumPy arrays alike"""
+    return start_x + span - abs(phase - span)
+
+def path_position(start_x, end_x, speed, origin, time):
+    """Unrounded x at time of a platform going back and forth over [start_x, end_x] at speed pixels per frame
+    
+    The path is a triangle wave, so any time can be evaluated directly, ahead of or behind the simulation.
+    """
+    phase, span = path_phase(start_x, end_x, speed, origin, time)
+    return path_x(start_x, phase, span) if span > 0 else start_x
+
+def path_positions(start_x, end_x, speed, origin, times):
+    """path_position over NumPy arrays, broadcasting any mix of platforms and times"""
+    phase, span = path_phases(start_x, end_x, speed, origin, times)
+    return np.where(span > 0, path_x(start_x, phase, span), start_x)
+
+class EntityStore:
+    """Level entities as parallel typed arrays, one row each, addressed by handles that outlive row moves
+    
+    Removing an entity moves the last row into its place, so the arrays stay packed and bulk
+    updates touch only live entities. The shared columns mean different things per kind:
+    moving platforms keep start_x and end_x in a and b, their speed in speed and in time when,
+    on the level clock that starts at epoch, they were at start_x heading right, disappearing
+    platforms their trigger time in time and trigger delay and disappear time in a and b,
+    drawn platforms their creation time in time and collectibles their float animation in time.
+    
+    Drawn platform expiry and disappearing platform transitions go on a min-heap of deadlines
+    instead of being polled, so a tick only pays for the timers that are due.
+    """
+    def __init__(self):
+        self.x = array('i')
+        self.y = array('i')
+        self.w = array('i')
+        self.h = array('i')
+        self.a = array('i')
+        self.b = array('i')
+        self.kind = array('B')
+        self.flags = array('B')
+        self.time = array('d')
+        self.speed = array('d')
+        self.columns = (self.x, self.y, self.w, self.h, self.a, self.b, self.kind, self.flags, self.time, self.speed)
+        self.fixed_columns = (self.y, self.w, self.h, self.a, self.b, self.kind, self.speed)  # Set before an entity is in play
+        self.state_columns = (self.x, self.flags, self.time)  # Change as the world runs
+        self.version = 0  # Bumped whenever rows are added or removed
+        self.entities = []  # Row -> view
+        self.rows = array('i')  # Handle -> row, -1 once removed
+        self.timers = []  # Min-heap of (deadline, transition, handle, start time); stale entries are skipped
+        self.epoch = 0.0  # Simulation time the level clock started at
+        
+    def __len__(self):
+        return len(self.entities)
+    
+    def add(self, entity, kind, x, y, width, height, flags=ACTIVE, time=0, a=0, b=0, speed=0):
+        """Append a row for entity, returning its handle; positions truncate like the pygame.Rect constructor"""
+        self.x.append(int(x))
+        self.y.append(int(y))
+        self.w.append(int(width))
+        self.h.append(int(height))
+        self.a.append(a)
+        self.b.append(b)
+        self.kind.append(kind)
+        self.flags.append(flags)
+        self.time.append(time)
+        self.speed.append(speed)
+        handle = len(self.rows)
+        self.rows.append(len(self.entities))
+        self.entities.append(entity)
+        self.version += 1
+        if kind == DRAWN_PLATFORM:
+            self.schedule(handle)
+        return handle
+    
+    def remove(self, entity):
+        """Drop an entity's row, filling the hole with the last row; the view is detached"""
+        row = self.rows[entity.handle]
+        last = len(self.entities) - 1
+        if row != last:
+            for column in self.columns:
+                column[row] = column[last]
+            moved = self.entities[last]
+            self.entities[row] = moved
+            self.rows[moved.handle] = row
+        for column in self.columns:
+            column.pop()
+        self.entities.pop()
+        self.rows[entity.handle] = -1
+        self.version += 1
+        entity.store = None
+    
+    def adopt(self, entity):
+        """Move an entity's row here from the store it lives in, keeping the same view object"""
+        source = entity.store
+        if source is self:
+            return
+        row = source.rows[entity.handle]
+        for column, values in zip(self.columns, source.columns):
+            column.append(values[row])
+        handle = len(self.rows)
+        self.rows.append(len(self.entities))
+        self.entities.append(entity)
+        self.version += 1
+        source.remove(entity)
+        entity.store = self
+        entity.handle = handle
+        self.schedule(handle)
+    
+    def fixed_bytes(self):
+        """The fixed columns packed end to end, for snapshots to share while rows stay the same"""
+        return b''.join(column.tobytes() for column in self.fixed_columns)
+    
+    def state_bytes(self):
+        """The columns that change as the world runs, packed end to end"""
+        return b''.join(column.tobytes() for column in self.state_columns)
+    
+    @classmethod
+    def from_bytes(cls, entities, fixed, state, epoch=0.0):
+        """A store of entities in row order, from fixed_bytes() and state_bytes(); the views move into it"""
+        store = cls()
+        store.epoch = epoch
+        count = len(entities)
+        for data, columns in ((memoryview(fixed), store.fixed_columns), (memoryview(state), store.state_columns)):
+            position = 0
+            for column in columns:
+                size = count * column.itemsize
+                column.frombytes(data[position:position + size])
+                position += size
+        store.entities = list(entities)
+        store.rows = array('i', range(count))
+        for handle, entity in enumerate(entities):
+            entity.store = store
+            entity.handle = handle
+            store.schedule(handle)
+        return store
+    
+    def load_state(self, state):
+        """Overwrite the changing columns in place from state_bytes() of this store with the same rows"""
+        state = memoryview(state)
+        position = 0
+        for column in self.state_columns:
+            size = len(column) * column.itemsize
+            memoryview(column).cast('B')[:] = state[position:position + size]
+            position += size
+        self.timers = []
+        for entity in self.entities:
+            self.schedule(entity.handle)
+    
+    def schedule(self, handle):
+        """Queue the transitions an entity's row has pending, from its kind, flags and timer columns"""
+        row = self.rows[handle]
+        kind = self.kind[row]
+        start = self.time[row]
+        if kind == DRAWN_PLATFORM and self.flags[row] & ACTIVE:
+            heapq.heappush(self.timers, (start + PLATFORM_FADE_TIME, FADE_OUT, handle, start))
+        elif kind == DISAPPEARING_PLATFORM and self.flags[row] & TRIGGERED:
+            heapq.heappush(self.timers, (start + self.a[row], VANISH, handle, start))
+            heapq.heappush(self.timers, (start + self.a[row] + self.b[row], REAPPEAR, handle, start))
+    
+    def fire_timers(self, current_time):
+        """Apply every transition due by current_time, returning the drawn platforms that faded out"""
+        timers = self.timers
+        flags = self.flags
+        faded = []
+        early = []
+        while timers and timers[0][0] <= current_time + TIMER_SLACK:
+            entry = heapq.heappop(timers)
+            deadline, transition, handle, start = entry
+            row = self.rows[handle]
+            if row < 0 or self.time[row] != start:
+                continue  # Removed, or restarted with a later deadline of its own
+            since = current_time - start
+            flag = flags[row]
+            if transition == FADE_OUT:
+                if since <= PLATFORM_FADE_TIME:
+                    early.append(entry)
+                elif flag & ACTIVE:
+                    flags[row] = flag & ~ACTIVE
+                    faded.append(self.entities[row])
+            elif not flag & TRIGGERED:
+                continue
+            elif transition == VANISH:
+                # Gone between the delay and the end of the disappear time
+                if since <= self.a[row]:
+                    early.append(entry)
+                elif since < self.a[row] + self.b[row]:
+                    flags[row] = flag & ~ACTIVE
+            elif since < self.a[row] + self.b[row]:
+                early.append(entry)
+            else:
+                flags[row] = (flag | ACTIVE) & ~TRIGGERED
+        for entry in early:
+            heapq.heappush(timers, entry)
+        return faded
+    
+    def shift(self, handle, dx):
+        """Move an entity horizontally, along with a moving platform's bounds"""
+        row = self.rows[handle]
+        self.x[row] = rect_coord(self.x[row] + dx)
+        if self.kind[row] == MOVING_PLATFORM:
+            self.a[row] += dx
+            self.b[row] += dx
+    
+    def update(self, current_time, cell_size=BROADPHASE_CELL_SIZE):
+        """Advance every entity by one tick to current_time
+        
+        Returns the drawn platforms that faded out and the moving platforms whose cells in a
+        grid of cell_size changed. Big stores move with NumPy, small ones in a plain loop.
+        """
+        if len(self.entities) >= STORE_VECTORIZE_ROWS:
+            crossed = self.move_arrays(current_time, cell_size)
+        else:
+            crossed = self.move_rows(current_time, range(len(self.entities)), cell_size)
+        return self.fire_timers(current_time), crossed
+    
+    def move_rows(self, current_time, rows, cell_size=BROADPHASE_CELL_SIZE):
+        """Move moving platforms to current_time and spin collectibles among rows, returning platforms that changed cells"""
+        kinds, flags, xs, widths, times, a, b = self.kind, self.flags, self.x, self.w, self.time, self.a, self.b
+        level_time = current_time - self.epoch
+        crossed = []
+        for row in rows:
+            kind = kinds[row]
+            if kind < DRAWN_PLATFORM:
+                continue
+            if kind == MOVING_PLATFORM:
+                # Position on the triangle wave between the bounds, heading left on its second half
+                phase, span = path_phase(a[row], b[row], self.speed[row], times[row], level_time)
+                if span <= 0:
+                    continue
+                old = xs[row]
+                x = rect_coord(path_x(a[row], phase, span))
+                xs[row] = x
+                flags[row] = flags[row] | REVERSED if phase >= span else flags[row] & ~REVERSED
+                width = widths[row]
+                if old // cell_size != x // cell_size or (old + width - 1) // cell_size != (x + width - 1) // cell_size:
+                    crossed.append(self.entities[row])
+            elif kind == COLLECTIBLE:
+                times[row] += COLLECTIBLE_SPIN_RATE
+        return crossed
+    
+    def move_arrays(self, current_time, cell_size=BROADPHASE_CELL_SIZE):
+        """move_rows() for every row at once, through NumPy views of the columns"""
+        # Views share the arrays' memory; none may outlive this call or the arrays could not grow
+        kinds, flags, xs, widths, times, a, b, speeds = [np.frombuffer(column, column.typecode) for column in
+                                                         (self.kind, self.flags, self.x, self.w, self.time, self.a,
+                                                          self.b, self.speed)]
+        crossed = []
+        
+        # Moving platforms take their place on the triangle wave between their bounds
+        moving = np.flatnonzero((kinds == MOVING_PLATFORM) & (b > a))
+        if len(moving):
+            start = a[moving]
+            phase, span = path_phases(start, b[moving], speeds[moving], times[moving], current_time - self.epoch)
+            old = xs[moving]
+            x = rect_coords(path_x(start, phase, span)).astype(np.int32)
+            xs[moving] = x
+            flag = flags[moving]
+            flags[moving] = np.where(phase >= span, flag | REVERSED, flag & ~np.uint8(REVERSED))
+            width = widths[moving]
+            changed = (old // cell_size != x // cell_size) | ((old + width - 1) // cell_size != (x + width - 1) // cell_size)
+            crossed = [self.entities[row] for row in moving[changed].tolist()]
+        
+        times[kinds == COLLECTIBLE] += COLLECTIBLE_SPIN_RATE
+        return crossed
+    
+    def has_flag(self, handle, flag):
+        return bool(self.flags[self.rows[handle]] & flag)
+    
+    def set_flag(self, handle, flag, value):
+        row = self.rows[handle]
+        if value:
+            self.flags[row] |= flag
+        else:
+            self.flags[row] &= ~flag
+
+class EntityView:
+    """Thin handle to one entity in an EntityStore; attributes read and write the store's arrays"""
+    __slots__ = ('store', 'handle')
+    
+    def attach(self, store, kind, x, y, width, height, time=0, a=0, b=0, speed=0):
+        """Add this entity to store, or to a store of its own until a level adopts it"""
+        if store is None:
+            store = EntityStore()
+        self.store = store
+        self.handle = store.add(self, kind, x, y, width, height, ACTIVE, time, a, b, speed)
+    
+    @property
+    def kind(self):
+        store = self.store
+        return store.kind[store.rows[self.handle]]
+    
+    @property
+    def rect(self):
+        """A fresh pygame.Rect of the entity's area"""
+        store = self.store
+        row = store.rows[self.handle]
+        return pygame.Rect(store.x[row], store.y[row], store.w[row], store.h[row])
+    
+    @property
+    def x(self):
+        store = self.store
+        return store.x[store.rows[self.handle]]
+    
+    @x.setter
+    def x(self, value):
+        store = self.store
+        store.x[store.rows[self.handle]] = rect_coord(value)
+    
+    @property
+    def y(self):
+        store = self.store
+        return store.y[store.rows[self.handle]]
+    
+    @y.setter
+    def y(self, value):
+        store = self.store
+        store.y[store.rows[self.handle]] = rect_coord(value)
+    
+    @property
+    def active(self):
+        store = self.store
+        return bool(store.flags[store.rows[self.handle]] & ACTIVE)
+    
+    @active.setter
+    def active(self, value):
+        self.store.set_flag(self.handle, ACTIVE, value)
+    
+    def update(self, current_time=None):
+        """Advance this entity to current_time; any other timers due in its store fire too"""
+        if current_time is None:
             current_time = pygame.time.get_ticks()
-            if current_time - self.creation_time > PLATFORM_FADE_TIME:
-                self.active = False
+        self.store.move_rows(current_time, (self.store.rows[self.handle],))
+        self.store.fire_timers(current_time)
     
-    def draw(self, screen):
-        if self.active:
-            alpha = 255
-            if self.temporary:
-                # Fade out effect in the last second
+    def shift(self, dx):
+        """Move horizontally by dx pixels"""
+        self.store.shift(self.handle, dx)
+
+class Platform(EntityView):
+    __slots__ = ()
+    surface_pool = OrderedDict()  # ((width, height), color) -> filled surface, shared by all platforms
+    
+    def __init__(self, x, y, width, height, temporary=False, creation_time=None, store=None):
+        if creation_time is None:
+            creation_time = pygame.time.get_ticks() if temporary else 0
+        self.attach(store, DRAWN_PLATFORM if temporary else STATIC_PLATFORM, x, y, width, height, time=creation_time)
+    
+    @property
+    def temporary(self):
+        store = self.store
+        return store.kind[store.rows[self.handle]] == DRAWN_PLATFORM
+    
+    @property
+    def creation_time(self):
+        store = self.store
+        return store.time[store.rows[self.handle]]
+    
+    @property
+    def color(self):
+        return PURPLE if self.temporary else GRAY
+    
+    def alpha(self, current_time=None):
+        """Opacity at the given time, fading out in the last second"""
+        alpha = 255
+        store = self.store
+        row = store.rows[self.handle]
+        if store.kind[row] == DRAWN_PLATFORM:
+            if current_time is None:
                 current_time = pygame.time.get_ticks()
-                time_left = PLATFORM_FADE_TIME - (current_time - self.creation_time)
-                if time_left < 1000:  # Last second
-                    alpha = int(255 * (time_left / 1000))
-            
-            # Create surface with alpha for fading effect
-            surf = pygame.Surface((self.rect.width, self.rect.height))
-            surf.set_alpha(alpha)
+            time_left = PLATFORM_FADE_TIME - (current_time - store.time[row])
+            if time_left < 1000:  # Last second
+                alpha = int(255 * (time_left / 1000))
+        return alpha
+    
+    def bounds(self):
+        """Screen area covered when drawn"""
+        return self.rect
+    
+    def render_key(self, current_time=None):
+        """Everything that changes how the platform looks on screen"""
+        store = self.store
+        row = store.rows[self.handle]
+        return (store.x[row], store.y[row], self.alpha(current_time))
+    
+    def fill(self, screen, rect, alpha):
+        """Fill the platform area, blending a pooled surface only when translucent"""
+        if alpha >= 255:
+            pygame.draw.rect(screen, self.color, rect)
+            return
+        pool = Platform.surface_pool
+        key = (rect.size, self.color)
+        surf = pool.get(key)
+        if surf is None:
+            surf = pygame.Surface(rect.size)
             surf.fill(self.color)
-            screen.blit(surf, self.rect)
+            pool[key] = surf
+            FrameProfiler.surfaces_allocated += 1
+            if len(pool) > PLATFORM_SURFACE_POOL_SIZE:
+                pool.popitem(last=False)
+        else:
+            pool.move_to_end(key)
+        surf.set_alpha(alpha)
+        screen.blit(surf, rect)
+    
+    def draw(self, screen, current_time=None):
+        if self.active:
+            # Fade out effect in the last second
+            alpha = self.alpha(current_time)
+            rect = self.rect
+            
+            self.fill(screen, rect, alpha)
             
             # Draw sketch-like border with slightly rough edges
-            pygame.draw.rect(screen, BLACK, self.rect, 2)
+            pygame.draw.rect(screen, BLACK, rect, 2)
             # Add inner highlight for depth
-            if self.rect.width > 4 and self.rect.height > 4:
-                inner_rect = pygame.Rect(self.rect.x + 1, self.rect.y + 1, 
-                                       self.rect.width - 2, self.rect.height - 2)
+            if rect.width > 4 and rect.height > 4:
+                inner_rect = pygame.Rect(rect.x + 1, rect.y + 1, 
+                                       rect.width - 2, rect.height - 2)
                 pygame.draw.rect(screen, (255, 255, 255, 100), inner_rect, 1)
 
 class MovingPlatform(Platform):
-    def __init__(self, x, y, width, height, start_x, end_x, speed=MOVING_PLATFORM_SPEED):
-        super().__init__(x, y, width, height)
-        self.start_x = start_x
-        self.end_x = end_x
-        self.speed = speed
-        self.direction = 1
-        self.color = (150, 150, 255)  # Light blue for moving platforms
-        
-    def update(self):
-        # Move platform back and forth
-        self.rect.x += self.speed * self.direction
-        
-        # Reverse direction at boundaries
-        if self.rect.x <= self.start_x or self.rect.x >= self.end_x:
-            self.direction *= -1
-            
-    def draw(self, screen):
+    __slots__ = ()
+    color = (150, 150, 255)  # Light blue for moving platforms
+    
+    def __init__(self, x, y, width, height, start_x, end_x, speed=MOVING_PLATFORM_SPEED, store=None):
+        # Start the path at x heading right when the level clock starts
+        travelled = min(max(x - start_x, 0), end_x - start_x)
+        origin = -travelled * 1000 / (speed * FPS) if speed > 0 else 0
+        self.attach(store, MOVING_PLATFORM, x, y, width, height, time=origin, a=start_x, b=end_x, speed=speed)
+    
+    @property
+    def start_x(self):
+        store = self.store
+        return store.a[store.rows[self.handle]]
+    
+    @property
+    def end_x(self):
+        store = self.store
+        return store.b[store.rows[self.handle]]
+    
+    @property
+    def speed(self):
+        store = self.store
+        return store.speed[store.rows[self.handle]]
+    
+    @property
+    def direction(self):
+        return -1 if self.store.has_flag(self.handle, REVERSED) else 1
+    
+    @property
+    def origin(self):
+        """Time on the level clock, which starts at the store's epoch, the platform was at start_x heading right"""
+        store = self.store
+        return store.time[store.rows[self.handle]]
+    
+    def position_at(self, time):
+        """x the platform has at a simulation time, without stepping there"""
+        store = self.store
+        row = store.rows[self.handle]
+        return rect_coord(path_position(store.a[row], store.b[row], store.speed[row], store.time[row], time - store.epoch))
+    
+    def travel(self, time, dt):
+        """Unrounded distance moved over the dt milliseconds up to simulation time, turnarounds included"""
+        store = self.store
+        row = store.rows[self.handle]
+        path = (store.a[row], store.b[row], store.speed[row], store.time[row])
+        level_time = time - store.epoch
+        return path_position(*path, level_time) - path_position(*path, level_time - dt)
+    
+    def positions_at(self, times):
+        """position_at for an array of simulation times at once"""
+        store = self.store
+        row = store.rows[self.handle]
+        x = path_positions(store.a[row], store.b[row], store.speed[row], store.time[row], np.asarray(times) - store.epoch)
+        return rect_coords(x).astype(np.int32)
+    
+    def render_key(self, current_time=None):
+        """Everything that changes how the platform looks on screen"""
+        store = self.store
+        row = store.rows[self.handle]
+        return (store.x[row], store.y[row], -1 if store.flags[row] & REVERSED else 1)
+    
+    def draw(self, screen, current_time=None):
         if self.active:
-            pygame.draw.rect(screen, self.color, self.rect)
-            pygame.draw.rect(screen, BLACK, self.rect, 2)
+            rect = self.rect
+            pygame.draw.rect(screen, self.color, rect)
+            pygame.draw.rect(screen, BLACK, rect, 2)
             # Add arrows to show movement direction
-            center_x = self.rect.centerx
-            center_y = self.rect.centery
+            center_x = rect.centerx
+            center_y = rect.centery
             if self.direction > 0:
                 # Right arrow
                 pygame.draw.polygon(screen, BLACK, [
@@ -349,43 +1093,67 @@ class MovingPlatform(Platform):
                     (center_x + 5, center_y + 5)
                 ])
 
-class Spike:
-    def __init__(self, x, y, width=30, height=20):
-        self.rect = pygame.Rect(x, y, width, height)
-        self.color = (255, 50, 50)  # Red spikes
-        
+class Spike(EntityView):
+    __slots__ = ()
+    color = (255, 50, 50)  # Red spikes
+    
+    def __init__(self, x, y, width=30, height=20, store=None):
+        self.attach(store, SPIKE, x, y, width, height)
+    
     def draw(self, screen):
         # Draw spikes as triangles
-        num_spikes = self.rect.width // 10
-        spike_width = self.rect.width // num_spikes
+        rect = self.rect
+        num_spikes = rect.width // 10
+        spike_width = rect.width // num_spikes
         
         for i in range(num_spikes):
-            spike_x = self.rect.x + i * spike_width
+            spike_x = rect.x + i * spike_width
             points = [
-                (spike_x, self.rect.bottom),
-                (spike_x + spike_width, self.rect.bottom),
-                (spike_x + spike_width // 2, self.rect.top)
+                (spike_x, rect.bottom),
+                (spike_x + spike_width, rect.bottom),
+                (spike_x + spike_width // 2, rect.top)
             ]
             pygame.draw.polygon(screen, self.color, points)
             pygame.draw.polygon(screen, BLACK, points, 2)
 
-class Collectible:
-    def __init__(self, x, y):
-        self.rect = pygame.Rect(x, y, 20, 20)
-        self.collected = False
-        self.animation_offset = 0
-        self.color = (255, 215, 0)  # Gold
-        
-    def update(self):
-        self.animation_offset += 0.2
-        
+class Collectible(EntityView):
+    __slots__ = ()
+    color = (255, 215, 0)  # Gold
+    
+    def __init__(self, x, y, store=None):
+        self.attach(store, COLLECTIBLE, x, y, 20, 20)
+    
+    @property
+    def collected(self):
+        """Also True once the collectible has been dropped from its store"""
+        store = self.store
+        return store is None or bool(store.flags[store.rows[self.handle]] & COLLECTED)
+    
+    @collected.setter
+    def collected(self, value):
+        self.store.set_flag(self.handle, COLLECTED, value)
+    
+    @property
+    def animation_offset(self):
+        store = self.store
+        return store.time[store.rows[self.handle]]
+    
+    def bounds(self):
+        """Screen area covered by the floating diamond and its outline"""
+        return self.rect.inflate(4, 14)
+    
+    def render_key(self):
+        """The gem floats, so it changes every frame"""
+        return self.animation_offset
+    
     def draw(self, screen):
         if not self.collected:
             # Floating animation
-            float_y = self.rect.y + math.sin(self.animation_offset) * 3
+            rect = self.rect
+            float_y = rect.y + math.sin(self.animation_offset) * 3
             # Draw as a diamond
-            center_x = self.rect.centerx
-            center_y = float_y + self.rect.height // 2
+            center_x = rect.centerx
+            center_y = float_y + rect.height // 2
             points = [
                 (center_x, center_y - 10),
                 (center_x + 8, center_y),
@@ -396,52 +1164,68 @@ class Collectible:
             pygame.draw.polygon(screen, BLACK, points, 2)
 
 class DisappearingPlatform(Platform):
-    def __init__(self, x, y, width, height, trigger_delay=2000, disappear_time=3000):
-        super().__init__(x, y, width, height)
-        self.triggered = False
-        self.trigger_time = 0
-        self.trigger_delay = trigger_delay  # Time before disappearing
-        self.disappear_time = disappear_time  # How long it stays gone
-        self.original_active = True
-        self.color = (255, 200, 100)  # Orange
-        
-    def trigger(self):
-        if not self.triggered:
-            self.triggered = True
-            self.trigger_time = pygame.time.get_ticks()
-            
-    def update(self):
-        if self.triggered:
-            current_time = pygame.time.get_ticks()
-            time_since_trigger = current_time - self.trigger_time
-            
-            if time_since_trigger > self.trigger_delay and time_since_trigger < self.trigger_delay + self.disappear_time:
-                self.active = False
-            else:
-                self.active = True
-                # Reset trigger state when platform reappears so it can be triggered again
-                if time_since_trigger >= self.trigger_delay + self.disappear_time:
-                    self.triggered = False
+    __slots__ = ()
+    color = (255, 200, 100)  # Orange
+    
+    def __init__(self, x, y, width, height, trigger_delay=2000, disappear_time=3000, store=None):
+        # trigger_delay is the time before disappearing, disappear_time how long it stays gone
+        self.attach(store, DISAPPEARING_PLATFORM, x, y, width, height, a=trigger_delay, b=disappear_time)
+    
+    @property
+    def triggered(self):
+        return self.store.has_flag(self.handle, TRIGGERED)
+    
+    @property
+    def trigger_time(self):
+        store = self.store
+        return store.time[store.rows[self.handle]]
+    
+    @property
+    def trigger_delay(self):
+        store = self.store
+        return store.a[store.rows[self.handle]]
+    
+    @property
+    def disappear_time(self):
+        store = self.store
+        return store.b[store.rows[self.handle]]
+    
+    def trigger(self, current_time=None):
+        store = self.store
+        row = store.rows[self.handle]
+        if not store.flags[row] & TRIGGERED:
+            store.flags[row] |= TRIGGERED
+            store.time[row] = pygame.time.get_ticks() if current_time is None else current_time
+            store.schedule(self.handle)
                 
-    def draw(self, screen):
+    def alpha(self, current_time=None):
+        """Opacity at the given time, flashing once triggered"""
+        alpha = 255
+        store = self.store
+        row = store.rows[self.handle]
+        if store.flags[row] & TRIGGERED:
+            if current_time is None:
+                current_time = pygame.time.get_ticks()
+            time_since_trigger = current_time - store.time[row]
+            trigger_delay = store.a[row]
+            if time_since_trigger < trigger_delay:
+                # Flash faster as disappear time approaches
+                flash_speed = max(1, trigger_delay - time_since_trigger) / 200
+                alpha = int(128 + 127 * math.sin(current_time * flash_speed / 100))
+        return alpha
+    
+    def draw(self, screen, current_time=None):
         if self.active:
             # Flash warning when about to disappear
-            alpha = 255
-            if self.triggered:
-                current_time = pygame.time.get_ticks()
-                time_since_trigger = current_time - self.trigger_time
-                if time_since_trigger < self.trigger_delay:
-                    # Flash faster as disappear time approaches
-                    flash_speed = max(1, self.trigger_delay - time_since_trigger) / 200
-                    alpha = int(128 + 127 * math.sin(current_time * flash_speed / 100))
+            alpha = self.alpha(current_time)
+            rect = self.rect
             
-            surf = pygame.Surface((self.rect.width, self.rect.height))
-            surf.set_alpha(alpha)
-            surf.fill(self.color)
-            screen.blit(surf, self.rect)
-            pygame.draw.rect(screen, BLACK, self.rect, 2)
+            self.fill(screen, rect, alpha)
+            pygame.draw.rect(screen, BLACK, rect, 2)
 
 class Goal:
+    kind = GOAL
+    
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -453,6 +1237,18 @@ class Goal:
     def update(self):
         self.animation_offset += 0.1
         
+    def bounds(self):
+        """Screen area covered by the floating goal and its outline"""
+        return self.rect.inflate(4, 14)
+    
+    def render_key(self):
+        """The goal floats, so it changes every frame"""
+        return self.animation_offset
+    
+    def shift(self, dx):
+        self.x += dx
+        self.rect.x += dx
+    
     def draw(self, screen):
         # Animated goal with floating effect
         float_y = self.y + math.sin(self.animation_offset) * 5
@@ -491,30 +1287,43 @@ class DrawingSystem:
         if self.drawing:
             self.current_pos = pos
             
-    def finish_drawing(self):
+    def finish_drawing(self, current_time=None):
+        platform = None
         if self.drawing and self.start_pos and self.current_pos:
-            # Calculate platform dimensions
-            x1, y1 = self.start_pos
-            x2, y2 = self.current_pos
-            
-            # Make sure platform is horizontal-ish and long enough
-            distance = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-            if distance >= self.min_platform_length:
-                # Create platform from start to end position
-                left = min(x1, x2)
-                right = max(x1, x2)
-                top = min(y1, y2)
-                
-                platform = Platform(left, top, right - left, 10, temporary=True)
-                self.drawing = False
-                self.start_pos = None
-                self.current_pos = None
-                return platform
+            platform = self.make_platform(self.start_pos, self.current_pos, current_time)
         
         self.drawing = False
         self.start_pos = None
         self.current_pos = None
-        return None
+        return platform
+    
+    def make_platform(self, start_pos, end_pos, current_time=None):
+        """Build a temporary platform from a drag, or None if the drag is too short"""
+        # Calculate platform dimensions
+        x1, y1 = start_pos
+        x2, y2 = end_pos
+        
+        # Make sure platform is horizontal-ish and long enough
+        distance = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+        if distance < self.min_platform_length:
+            return None
+        
+        # Create platform from start to end position
+        left = min(x1, x2)
+        right = max(x1, x2)
+        top = min(y1, y2)
+        
+        return Platform(left, top, right - left, 10, temporary=True, creation_time=current_time)
+    
+    def preview_bounds(self):
+        """Screen area covered by the preview line and its endpoint circles"""
+        if not (self.drawing and self.start_pos and self.current_pos):
+            return pygame.Rect(0, 0, 0, 0)
+        left = min(self.start_pos[0], self.current_pos[0])
+        top = min(self.start_pos[1], self.current_pos[1])
+        width = abs(self.current_pos[0] - self.start_pos[0])
+        height = abs(self.current_pos[1] - self.start_pos[1])
+        return pygame.Rect(left, top, width, height).inflate(16, 16)
         
     def draw_preview(self, screen):
         if self.drawing and self.start_pos and self.current_pos:
@@ -546,8 +1355,114 @@ class DrawingSystem:
             pygame.draw.circle(screen, color, self.start_pos, 5)
             pygame.draw.circle(screen, color, self.current_pos, 5)
 
+def subtract_intervals(lo, hi, blocked):
+    """Integer ranges left of [lo, hi] after removing inclusive (start, end) intervals"""
+    free = []
+    for start, end in sorted(blocked):
+        if end < lo:
+            continue
+        if start > hi:
+            break
+        if start > lo:
+            free.append((lo, start - 1))
+        lo = max(lo, end + 1)
+        if lo > hi:
+            return free
+    free.append((lo, hi))
+    return free
+
+def clearance_table(clearances):
+    """Symmetric kind -> other kind -> margin lookup from a table of (kind, other) pairs"""
+    table = {}
+    for (kind, other), margin in clearances.items():
+        table.setdefault(kind, {})[other] = margin
+        table.setdefault(other, {})[kind] = margin
+    return table
+
+class EntityPlacer:
+    """Places level entities with clearances between all kinds, sampling positions from free space
+    
+    Placed footprints are bucketed into horizontal bands. A row's free positions are found by
+    subtracting the clearance-inflated footprints of its neighbours, then one is drawn uniformly,
+    so crowded levels never fall back to rejection sampling.
+    """
+    margins = clearance_table(PLACEMENT_CLEARANCE)
+    reach = max(PLACEMENT_CLEARANCE.values())
+    kinds = {SPIKE: 'spike', COLLECTIBLE: 'collectible', GOAL: 'goal'}  # Entity kind -> clearance kind, else platform
+    
+    def __init__(self, rng):
+        self.rng = rng
+        self.bands = defaultdict(list)  # band index -> [(left, top, right, bottom, kind)]
+        self.placed = set()  # ids of entities already indexed
+    
+    @staticmethod
+    def footprint(entity):
+        """(left, top, right, bottom, kind) of the area an entity claims"""
+        left, top, width, height = entity.rect
+        kind = entity.kind
+        if kind == MOVING_PLATFORM:
+            # A moving platform claims its whole path
+            return entity.start_x, top, entity.end_x + width, top + height, 'platform'
+        return left, top, left + width, top + height, EntityPlacer.kinds.get(kind, 'platform')
+    
+    def add(self, entity):
+        self.placed.add(id(entity))
+        item = self.footprint(entity)
+        for band in range(item[1] // PLACEMENT_BAND_HEIGHT, (item[3] - 1) // PLACEMENT_BAND_HEIGHT + 1):
+            self.bands[band].append(item)
+    
+    def add_all(self, entities):
+        placed = self.placed
+        for entity in entities:
+            if id(entity) not in placed:
+                self.add(entity)
+    
+    def nearby(self, top, bottom):
+        """Footprints in the bands covering [top, bottom), possibly repeated"""
+        found = []
+        for band in range(top // PLACEMENT_BAND_HEIGHT, (bottom - 1) // PLACEMENT_BAND_HEIGHT + 1):
+            found.extend(self.bands.get(band, ()))
+        return found
+    
+    def fits(self, kind, rect):
+        """Whether rect keeps its clearance from everything placed so far"""
+        margins = self.margins[kind]
+        for left, top, right, bottom, other in self.nearby(rect.top - self.reach, rect.bottom + self.reach):
+            margin = margins[other]
+            if (rect.left - margin < right and rect.right + margin > left and
+                    rect.top - margin < bottom and rect.bottom + margin > top):
+                return False
+        return True
+    
+    def free_spans(self, kind, y, width, height, lo, hi):
+        """Left edges in [lo, hi] where a width x height rect at y keeps every clearance"""
+        if hi < lo:
+            return []
+        margins = self.margins[kind]
+        bottom_edge = y + height
+        blocked = []
+        for left, top, right, bottom, other in self.nearby(y - self.reach, bottom_edge + self.reach):
+            margin = margins[other]
+            if y - margin < bottom and bottom_edge + margin > top:
+                blocked.append((left - width - margin + 1, right + margin - 1))
+        if not blocked:
+            return [(lo, hi)]
+        return subtract_intervals(lo, hi, blocked)
+    
+    def sample(self, kind, width, height, y, lo, hi):
+        """A left edge in [lo, hi] drawn uniformly from the free ones at y, or None if the row is full"""
+        spans = self.free_spans(kind, y, width, height, lo, hi)
+        if not spans:
+            return None
+        pick = self.rng.randrange(sum(b - a + 1 for a, b in spans))
+        for a, b in spans:
+            if pick <= b - a:
+                return a + pick
+            pick -= b - a + 1
+
 class LevelGenerator:
-    def __init__(self):
+    """Builds levels from a session seed; each level has its own seed so it can be regenerated alone"""
+    def __init__(self, session_seed=None):
         self.level_types = ['horizontal_gaps', 'vertical_climb', 'mixed_challenge', 'maze_like', 'timing_challenge', 'moving_platforms', 'spike_gauntlet', 'disappearing_challenge']
         self.level_type_names = {
             'horizontal_gaps': 'Horizontal Gaps',
@@ -561,8 +1476,46 @@ class LevelGenerator:
         }
         self.last_level_type = 'Horizontal Gaps'
         
+        # Isolated RNG, reseeded per level so generation never depends on the global random state
+        if session_seed is None:
+            session_seed = random.randrange(2 ** 32)
+        self.session_seed = session_seed
+        self.rng = random.Random()
+        self.placer = EntityPlacer(self.rng)
+        self.store = EntityStore()  # Holds the entities of the level or chunk being generated
+        
+    def __str__(self):
+        return f"seed {self.session_seed}"
+        
+    def level_seed(self, level_num):
+        """Seed for one level of this session"""
+        return (self.session_seed * LEVEL_SEED_STRIDE + level_num) % 2 ** 64
+        
+    def chunk_seed(self, level_num, index):
+        """Seed for one chunk of a marathon level"""
+        return (self.level_seed(level_num) * LEVEL_SEED_STRIDE + index) % 2 ** 64
+        
     def generate_level(self, level_num):
         """Generate a random level based on the level number for progressive difficulty"""
+        self.rng.seed(self.level_seed(level_num))
+        return self._generate_section(level_num, with_goal=True)
+    
+    def generate_chunk(self, level_num, index, count):
+        """Chunk index of a marathon level count chunks long, placed at its position in the world
+        
+        Chunks are generated like screen-sized levels of the same difficulty, each starting on its
+        own ground platform; only the last one has a goal.
+        """
+        self.rng.seed(self.chunk_seed(level_num, index))
+        level = self._generate_section(level_num, with_goal=index == count - 1)
+        offset = index * CHUNK_WIDTH
+        for group in level[:6]:
+            for entity in group:
+                entity.shift(offset)
+        return level
+    
+    def _generate_section(self, level_num, with_goal):
+        """One screen of level, from the RNG's current seed"""
         platforms = []
         moving_platforms = []
         spikes = []
@@ -570,8 +1523,15 @@ class LevelGenerator:
         disappearing_platforms = []
         goals = []
         
+        # One packed store per section; a Simulation moves the entities into its own when loading
+        self.store = EntityStore()
+        
         # Always add ground platform
-        platforms.append(Platform(0, SCREEN_HEIGHT - 50, 200, 50))
+        platforms.append(Platform(0, SCREEN_HEIGHT - 50, 200, 50, store=self.store))
+        
+        # Everything placed so far, so new entities keep their distance
+        self.placer = EntityPlacer(self.rng)
+        self.placer.add(platforms[0])
         
         # Determine difficulty based on level number
         difficulty = min(level_num, 10)  # Cap difficulty at level 10
@@ -583,7 +1543,7 @@ class LevelGenerator:
             level_type = ['horizontal_gaps', 'vertical_climb', 'mixed_challenge'][level_num - 1]
         else:
             # Random level types for higher levels, including new types
-            level_type = random.choice(self.level_types)
+            level_type = self.rng.choice(self.level_types)
         
         # Store for UI display
         self.last_level_type = self.level_type_names[level_type]
@@ -603,18 +1563,24 @@ class LevelGenerator:
             moving_platforms.extend(self._generate_moving_platforms(difficulty))
         elif level_type == 'spike_gauntlet':
             platforms.extend(self._generate_spike_level(difficulty))
+            self.placer.add_all(platforms)
             spikes.extend(self._generate_spikes(difficulty))
         elif level_type == 'disappearing_challenge':
             platforms.extend(self._generate_basic_platforms(difficulty))
+            self.placer.add_all(platforms)
             disappearing_platforms.extend(self._generate_disappearing_platforms(difficulty))
+        # Spikes and disappearing platforms index themselves as they are placed
+        self.placer.add_all(platforms + moving_platforms)
         
         # Add goal at a challenging but reachable position
-        goal_x, goal_y = self._find_goal_position(platforms + moving_platforms + disappearing_platforms, difficulty)
-        goals.append(Goal(goal_x, goal_y))
+        if with_goal:
+            goal_x, goal_y = self._find_goal_position(platforms + moving_platforms + disappearing_platforms, difficulty)
+            goals.append(Goal(goal_x, goal_y))
+            self.placer.add(goals[-1])
         
         # Add some collectibles randomly, avoiding goal position
-        if random.random() < 0.6:  # 60% chance of collectibles
-            collectibles.extend(self._generate_collectibles(platforms + moving_platforms, difficulty, (goal_x, goal_y)))
+        if self.rng.random() < 0.6:  # 60% chance of collectibles
+            collectibles.extend(self._generate_collectibles(platforms + moving_platforms, difficulty))
         
         return platforms, moving_platforms, spikes, collectibles, disappearing_platforms, goals, max_platforms
     
@@ -624,24 +1590,25 @@ class LevelGenerator:
         
         # Create gaps of varying sizes
         num_gaps = 2 + difficulty // 2
-        gap_size = 150 + random.randint(0, 100 + difficulty * 10)
+        gap_size = 150 + self.rng.randint(0, 100 + difficulty * 10)
         
         current_x = 250
         for i in range(num_gaps):
             # Add platform before gap
-            platform_width = 80 + random.randint(0, 40)
-            platform_height = SCREEN_HEIGHT - 150 - random.randint(0, 100)
-            platforms.append(Platform(current_x, platform_height, platform_width, 20))
+            platform_width = 80 + self.rng.randint(0, 40)
+            platform_height = SCREEN_HEIGHT - 150 - self.rng.randint(0, 100)
+            platforms.append(Platform(current_x, platform_height, platform_width, 20, store=self.store))
             
             current_x += platform_width + gap_size
-            gap_size = 120 + random.randint(0, 80 + difficulty * 15)
+            gap_size = 120 + self.rng.randint(0, 80 + difficulty * 15)
             
             if current_x > SCREEN_WIDTH - 200:
                 break
         
         # Add final platform near the end
         if current_x < SCREEN_WIDTH - 150:
-            platforms.append(Platform(SCREEN_WIDTH - 150, SCREEN_HEIGHT - 200 - random.randint(0, 100), 100, 20))
+            platforms.append(Platform(SCREEN_WIDTH - 150, SCREEN_HEIGHT - 200 - self.rng.randint(0, 100), 100, 20,
+                                      store=self.store))
         
         return platforms
     
@@ -655,14 +1622,14 @@ class LevelGenerator:
         for i in range(num_levels):
             # Alternate sides for zigzag climbing
             if i % 2 == 0:
-                x = 100 + random.randint(0, 200)
+                x = 100 + self.rng.randint(0, 200)
             else:
-                x = SCREEN_WIDTH - 300 + random.randint(0, 200)
+                x = SCREEN_WIDTH - 300 + self.rng.randint(0, 200)
             
-            width = 80 + random.randint(0, 60)
-            platforms.append(Platform(x, current_y, width, 20))
+            width = 80 + self.rng.randint(0, 60)
+            platforms.append(Platform(x, current_y, width, 20, store=self.store))
             
-            current_y -= 120 + random.randint(20, 60)
+            current_y -= 120 + self.rng.randint(20, 60)
             
             if current_y < 100:
                 break
@@ -677,14 +1644,14 @@ class LevelGenerator:
         platforms.extend(self._generate_horizontal_gaps(difficulty // 2 + 1)[:2])
         
         # Add vertical section
-        start_x = SCREEN_WIDTH // 2 + random.randint(-100, 100)
+        start_x = SCREEN_WIDTH // 2 + self.rng.randint(-100, 100)
         current_y = SCREEN_HEIGHT - 200
         
         for i in range(2 + difficulty // 3):
-            x = start_x + random.randint(-80, 80)
-            width = 60 + random.randint(0, 40)
-            platforms.append(Platform(x, current_y, width, 20))
-            current_y -= 100 + random.randint(20, 40)
+            x = start_x + self.rng.randint(-80, 80)
+            width = 60 + self.rng.randint(0, 40)
+            platforms.append(Platform(x, current_y, width, 20, store=self.store))
+            current_y -= 100 + self.rng.randint(20, 40)
         
         return platforms
     
@@ -698,14 +1665,18 @@ class LevelGenerator:
         cell_width = SCREEN_WIDTH // grid_width
         cell_height = (SCREEN_HEIGHT - 100) // grid_height
         
-        # Randomly place platforms in grid
+        # Randomly place platforms in grid, anywhere in their cell that is clear of the rest
         for row in range(1, grid_height):
             for col in range(1, grid_width - 1):
-                if random.random() < 0.4 + (difficulty * 0.05):  # More platforms with higher difficulty
-                    x = col * cell_width + random.randint(10, cell_width - 90)
+                if self.rng.random() < 0.4 + (difficulty * 0.05):  # More platforms with higher difficulty
                     y = SCREEN_HEIGHT - 100 - (row * cell_height)
-                    width = 60 + random.randint(0, 30)
-                    platforms.append(Platform(x, y, width, 20))
+                    width = 60 + self.rng.randint(0, 30)
+                    lo = col * cell_width + 10
+                    x = self.placer.sample('platform', width, 20, y, lo, lo + cell_width - 100)
+                    if x is not None:
+                        platform = Platform(x, y, width, 20, store=self.store)
+                        self.placer.add(platform)
+                        platforms.append(platform)
         
         return platforms
     
@@ -721,11 +1692,11 @@ class LevelGenerator:
             section_start = i * section_width + 50
             
             # Add one or two platforms per section at different heights
-            for j in range(1 + random.randint(0, 1)):
-                x = section_start + random.randint(0, section_width - 100)
-                y = SCREEN_HEIGHT - 150 - random.randint(0, 200)
-                width = 60 + random.randint(0, 40)
-                platforms.append(Platform(x, y, width, 20))
+            for j in range(1 + self.rng.randint(0, 1)):
+                x = section_start + self.rng.randint(0, section_width - 100)
+                y = SCREEN_HEIGHT - 150 - self.rng.randint(0, 200)
+                width = 60 + self.rng.randint(0, 40)
+                platforms.append(Platform(x, y, width, 20, store=self.store))
         
         return platforms
     
@@ -735,23 +1706,31 @@ class LevelGenerator:
         if not platforms:
             return SCREEN_WIDTH - 100, SCREEN_HEIGHT - 200
         
-        # Find the platform that's furthest right and reasonably high
-        best_platform = None
-        best_score = 0
-        
-        for platform in platforms[1:]:  # Skip ground platform
+        # Rank platforms by how far right and how high they are, skipping the ground
+        ranked = []
+        for index, platform in enumerate(platforms[1:]):
             # Score based on distance from start and height
-            distance_score = platform.rect.x / SCREEN_WIDTH
-            height_score = (SCREEN_HEIGHT - platform.rect.y) / SCREEN_HEIGHT
+            rect = platform.rect
+            distance_score = rect.x / SCREEN_WIDTH
+            height_score = (SCREEN_HEIGHT - rect.y) / SCREEN_HEIGHT
             total_score = distance_score + height_score
-            
-            if total_score > best_score:
-                best_score = total_score
-                best_platform = platform
+            if total_score > 0:
+                ranked.append((-total_score, index, rect))
+        ranked.sort()
+        
+        # Stand the goal on the best platform with room for it
+        best_rect = None
+        for _, _, rect in ranked:
+            goal_rect = pygame.Rect(rect.x + rect.width // 2 - 20, rect.y - 60, 40, 60)
+            if self.placer.fits('goal', goal_rect):
+                best_rect = rect
+                break
+        if best_rect is None and ranked:
+            best_rect = ranked[0][2]
         
-        if best_platform:
-            goal_x = best_platform.rect.x + best_platform.rect.width // 2 - 20
-            goal_y = best_platform.rect.y - 60
+        if best_rect:
+            goal_x = best_rect.x + best_rect.width // 2 - 20
+            goal_y = best_rect.y - 60
         else:
             goal_x = SCREEN_WIDTH - 100
             goal_y = SCREEN_HEIGHT - 200
@@ -766,10 +1745,10 @@ class LevelGenerator:
         section_width = SCREEN_WIDTH // (num_platforms + 1)
         
         for i in range(num_platforms):
-            x = (i + 1) * section_width + random.randint(-50, 50)
-            y = SCREEN_HEIGHT - 150 - random.randint(0, 100)
-            width = 80 + random.randint(0, 40)
-            platforms.append(Platform(x, y, width, 20))
+            x = (i + 1) * section_width + self.rng.randint(-50, 50)
+            y = SCREEN_HEIGHT - 150 - self.rng.randint(0, 100)
+            width = 80 + self.rng.randint(0, 40)
+            platforms.append(Platform(x, y, width, 20, store=self.store))
             
         return platforms
     
@@ -781,16 +1760,16 @@ class LevelGenerator:
         
         for i in range(num_moving):
             # Random position and movement range
-            center_x = 200 + random.randint(0, SCREEN_WIDTH - 400)
-            y = SCREEN_HEIGHT - 200 - random.randint(0, 200)
-            movement_range = 100 + random.randint(0, 150)
+            center_x = 200 + self.rng.randint(0, SCREEN_WIDTH - 400)
+            y = SCREEN_HEIGHT - 200 - self.rng.randint(0, 200)
+            movement_range = 100 + self.rng.randint(0, 150)
             
             start_x = max(50, center_x - movement_range // 2)
             end_x = min(SCREEN_WIDTH - 150, center_x + movement_range // 2)
             
-            speed = MOVING_PLATFORM_SPEED + random.uniform(0, 1)
+            speed = MOVING_PLATFORM_SPEED + self.rng.uniform(0, 1)
             
-            moving_platforms.append(MovingPlatform(start_x, y, 100, 20, start_x, end_x, speed))
+            moving_platforms.append(MovingPlatform(start_x, y, 100, 20, start_x, end_x, speed, store=self.store))
             
         return moving_platforms
     
@@ -803,10 +1782,10 @@ class LevelGenerator:
         section_width = SCREEN_WIDTH // num_safe_zones
         
         for i in range(num_safe_zones):
-            x = i * section_width + random.randint(20, section_width - 120)
-            y = SCREEN_HEIGHT - 200 - random.randint(0, 100)
-            width = 80 + random.randint(0, 40)
-            platforms.append(Platform(x, y, width, 20))
+            x = i * section_width + self.rng.randint(20, section_width - 120)
+            y = SCREEN_HEIGHT - 200 - self.rng.randint(0, 100)
+            width = 80 + self.rng.randint(0, 40)
+            platforms.append(Platform(x, y, width, 20, store=self.store))
             
         return platforms
     
@@ -814,21 +1793,26 @@ class LevelGenerator:
         """Generate spike traps"""
         spikes = []
         
-        # Add spikes on ground level
+        # Add spikes on ground level, each somewhere clear within its stretch
         num_spike_areas = 2 + difficulty // 2
-        spike_width = 60 + random.randint(0, 40)
+        spike_width = 60 + self.rng.randint(0, 40)
         
         for i in range(num_spike_areas):
-            x = 250 + i * 200 + random.randint(-50, 50)
-            if x + spike_width < SCREEN_WIDTH - 100:
-                spikes.append(Spike(x, SCREEN_HEIGHT - 70, spike_width))
+            lo = 250 + i * 200 - 50
+            hi = min(lo + 100, SCREEN_WIDTH - 101 - spike_width)
+            x = self.placer.sample('spike', spike_width, 20, SCREEN_HEIGHT - 70, lo, hi)
+            if x is not None:
+                spikes.append(Spike(x, SCREEN_HEIGHT - 70, spike_width, store=self.store))
+                self.placer.add(spikes[-1])
                 
-        # Add some elevated spikes
+        # Add some elevated spikes where there is room at their height
         if difficulty > 3:
             for i in range(difficulty // 3):
-                x = random.randint(100, SCREEN_WIDTH - 150)
-                y = SCREEN_HEIGHT - 150 - random.randint(0, 100)
-                spikes.append(Spike(x, y, 40))
+                y = SCREEN_HEIGHT - 150 - self.rng.randint(0, 100)
+                x = self.placer.sample('spike', 40, 20, y, 100, SCREEN_WIDTH - 150)
+                if x is not None:
+                    spikes.append(Spike(x, y, 40, store=self.store))
+                    self.placer.add(spikes[-1])
                 
         return spikes
     
@@ -839,67 +1823,170 @@ class LevelGenerator:
         num_disappearing = 2 + difficulty // 3
         
         for i in range(num_disappearing):
-            x = 300 + i * 200 + random.randint(-50, 50)
-            y = SCREEN_HEIGHT - 200 - random.randint(0, 150)
-            width = 80 + random.randint(0, 40)
+            y = SCREEN_HEIGHT - 200 - self.rng.randint(0, 150)
+            width = 80 + self.rng.randint(0, 40)
             
             # Vary timing based on difficulty
             trigger_delay = max(1000, 3000 - difficulty * 200)
-            disappear_time = 2000 + random.randint(0, 1000)
+            disappear_time = 2000 + self.rng.randint(0, 1000)
             
-            disappearing_platforms.append(DisappearingPlatform(x, y, width, 20, trigger_delay, disappear_time))
+            # Clear of the other platforms, near its slot or failing that anywhere at its height
+            lo = 300 + i * 200 - 50
+            x = self.placer.sample('platform', width, 20, y, lo, min(lo + 100, SCREEN_WIDTH - width))
+            if x is None:
+                x = self.placer.sample('platform', width, 20, y, 50, SCREEN_WIDTH - 50 - width)
+            if x is not None:
+                disappearing_platforms.append(DisappearingPlatform(x, y, width, 20, trigger_delay, disappear_time,
+                                                                   store=self.store))
+                self.placer.add(disappearing_platforms[-1])
             
         return disappearing_platforms
     
-    def _generate_collectibles(self, platforms, difficulty, goal_position=None):
-        """Generate collectible items, avoiding goal position"""
+    def _generate_collectibles(self, platforms, difficulty):
+        """Generate collectible items, keeping clear of the goal and everything else placed"""
         collectibles = []
         
         num_collectibles = 1 + difficulty // 3
         
-        for i in range(num_collectibles):
-            # Place collectibles near platforms
-            if platforms:
-                attempts = 0
-                max_attempts = 10
-                
-                while attempts < max_attempts:
-                    platform = random.choice(platforms[1:])  # Skip ground platform
-                    x = platform.rect.x + random.randint(10, platform.rect.width - 30)
-                    y = platform.rect.y - 30
-                    
-                    # Check if collectible would be too close to goal
-                    if goal_position:
-                        goal_x, goal_y = goal_position
-                        distance = math.sqrt((x - goal_x) ** 2 + (y - goal_y) ** 2)
-                        if distance > 80:  # Minimum distance from goal
-                            collectibles.append(Collectible(x, y))
-                            break
-                    else:
-                        collectibles.append(Collectible(x, y))
-                        break
-                    
-                    attempts += 1
+        # Collectibles float above platforms (skipping the ground), anywhere that keeps clear
+        # of the goal, spikes and each other
+        rects = [platform.rect for platform in platforms[1:]]
+        rows = [(rect.y - 30, rect.x + 10, rect.right - 30) for rect in rects]
+        while rows and len(collectibles) < num_collectibles:
+            # Above a random platform; one with no room left is not picked again
+            row = self.rng.choice(rows)
+            x = self.placer.sample('collectible', 20, 20, *row)
+            if x is None:
+                rows.remove(row)
+                continue
+            collectibles.append(Collectible(x, row[0], store=self.store))
+            self.placer.add(collectibles[-1])
                 
         return collectibles
 
-class Game:
-    def __init__(self):
-        # Use original resolution for proper game scaling
-        self.screen_width = SCREEN_WIDTH
-        self.screen_height = SCREEN_HEIGHT
-        self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
-        self.fullscreen = False
-            
-        pygame.display.set_caption("Draw Platform Puzzler - Infinite Levels")
-        self.clock = pygame.time.Clock()
+class LevelPrefetcher:
+    """Generates the next level on a worker thread so a level transition only swaps in a finished level"""
+    def __init__(self, level_generator):
+        self.level_generator = level_generator
+        self.lock = threading.Lock()  # The generator's RNG and last_level_type are shared with the worker
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='level-prefetch')
+        self.pending_level = None
+        self.pending = None  # Future for pending_level
+        
+    def generate(self, level_num):
+        """Generate a level now, returning it with its type name"""
+        with self.lock:
+            level = self.level_generator.generate_level(level_num)
+            return level, self.level_generator.last_level_type
+    
+    def prefetch(self, level_num):
+        """Start generating a level in the background"""
+        if self.pending_level != level_num:
+            self.pending_level = level_num
+            self.pending = self.executor.submit(self.generate, level_num)
+    
+    def take(self, level_num):
+        """A freshly generated level, from the worker if it was prefetched"""
+        if self.pending is not None and self.pending_level == level_num:
+            pending = self.pending
+            self.pending_level = None
+            self.pending = None
+            return pending.result()
+        return self.generate(level_num)
+    
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class LevelStream:
+    """A marathon level generated a chunk at a time around the player; chunks left behind are dropped for good"""
+    def __init__(self, level_generator, level_num, chunk_count):
+        self.level_generator = level_generator
+        self.level_num = level_num
+        self.chunk_count = chunk_count
+        self.width = chunk_count * CHUNK_WIDTH
+        self.chunks = {}  # chunk index -> generate_chunk tuple, for the chunks in play
+        self.first = 0  # Lowest chunk index still in play; the level is walled off to its left
+        
+    def left(self):
+        return self.first * CHUNK_WIDTH
+    
+    def chunk_at(self, x):
+        return min(max(int(x // CHUNK_WIDTH), 0), self.chunk_count - 1)
+    
+    def update(self, x):
+        """Generate the chunks around x and drop those too far behind it, returning True if any changed"""
+        current = self.chunk_at(x)
+        self.first = max(self.first, current - CHUNKS_BEHIND)
+        changed = False
+        for index in [index for index in self.chunks if index < self.first]:
+            del self.chunks[index]
+            changed = True
+        for index in range(self.first, min(current + CHUNKS_AHEAD + 1, self.chunk_count)):
+            if index not in self.chunks:
+                self.chunks[index] = self.level_generator.generate_chunk(self.level_num, index, self.chunk_count)
+                changed = True
+        return changed
+    
+    def entity_lists(self):
+        """Entities of the chunks in play, merged into one list per kind in generate_level order"""
+        groups = ([], [], [], [], [], [])
+        for index in sorted(self.chunks):
+            for group, entities in zip(groups, self.chunks[index]):
+                group.extend(entities)
+        return groups
+
+class SnapshotLayout:
+    """What snapshots of a world share until an entity is added or removed: the entities, their lists and fixed columns"""
+    def __init__(self, world):
+        store = world.store
+        self.store = weakref.ref(store)
+        self.version = store.version
+        self.entities = tuple(store.entities)
+        self.fixed = store.fixed_bytes()
+        self.groups = tuple(tuple(group) for group in (world.platforms, world.moving_platforms, world.spikes,
+                                                       world.collectibles, world.disappearing_platforms,
+                                                       world.drawn_platforms, world.goals))
+        self.level = (world.current_level, world.current_level_type, world.max_platforms, world.level_serial,
+                      world.level_start)
+        self.level_start_snapshot = world.level_start_snapshot
+        stream = world.stream
+        self.stream = (stream, dict(stream.chunks), stream.first) if stream is not None else None
+    
+    def current(self, store):
+        """Whether this layout still describes store"""
+        return self.store() is store and self.version == store.version
+
+class WorldSnapshot:
+    """One moment of a world: packed player and entity state over a shared layout"""
+    __slots__ = ('layout', 'state')
+    
+    def __init__(self, layout, state):
+        self.layout = layout
+        self.state = state
+
+class Simulation:
+    """Headless game world stepped by an explicit input state and a simulated clock"""
+    def __init__(self, screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT, level_generator=None, start_level=1,
+                 seed=None, prefetch=False, marathon_chunks=0, history=SNAPSHOT_HISTORY):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.time = 0  # Simulated milliseconds since the world was created
+        self.level_serial = 0  # New on every level load so views can rebuild cached level data
+        self.last_serial = 0  # Highest serial handed out; restoring a snapshot can take level_serial back
+        self.frame_time = FRAME_MS  # Default step length in milliseconds
         
         # Game objects
-        self.player = Player(50, self.screen_height - 200)
+        self.player = Player(PLAYER_SPAWN_X, self.screen_height - 200)
         self.drawing_system = DrawingSystem()
-        self.level_generator = LevelGenerator()
-        self.current_level = 1
+        self.level_generator = level_generator if level_generator is not None else LevelGenerator(seed)
+        self.prefetcher = LevelPrefetcher(self.level_generator) if prefetch else None
+        self.current_level = start_level
         self.max_platforms = 3
+        self.current_level_type = 'Horizontal Gaps'
+        
+        # Marathon levels are marathon_chunks screens wide and streamed in around the player
+        self.marathon_chunks = marathon_chunks
+        self.stream = None
         
         # Initialize all lists
         self.platforms = []
@@ -910,41 +1997,770 @@ class Game:
         self.drawn_platforms = []
         self.goals = []
         
+        # Every entity in play packed into one store, and the collision broadphase over them,
+        # rebuilt per level and updated as entities move or expire
+        self.store = EntityStore()
+        self.platform_grid = SpatialGrid()
+        self.spike_grid = SpatialGrid()
+        self.collectible_grid = SpatialGrid()
+        
+        # Rewind history: a snapshot every SNAPSHOT_INTERVAL ticks in a ring buffer of history snapshots, plus
+        # one per level start; with history=0 no periodic snapshots are taken and rewinding goes to the level start
+        self.history = deque(maxlen=history)
+        self.ticks_since_snapshot = 0
+        self.layout = None
+        self.level_start_snapshot = None
+        
         # Initialize level
         self.load_level(self.current_level)
         
     def load_level(self, level_num):
         """Load a randomly generated level"""
-        self.platforms = []
-        self.moving_platforms = []
-        self.spikes = []
-        self.collectibles = []
-        self.disappearing_platforms = []
-        self.drawn_platforms = []
-        self.goals = []
-        
-        # Generate random level
-        platforms, moving_platforms, spikes, collectibles, disappearing_platforms, goals, max_platforms = self.level_generator.generate_level(level_num)
+        self.current_level = level_num
+        self.last_serial = self.level_serial = max(self.level_serial, self.last_serial) + 1
+        self.level_start = self.time  # Moving platforms follow their paths from here
+        
+        # Generate random level, or swap in the one prefetched while the previous level was played
+        if self.marathon_chunks:
+            self.stream = LevelStream(self.level_generator, level_num, self.marathon_chunks)
+            self.stream.update(0)
+            level = self.stream.entity_lists() + (self.stream.chunks[0][6],)
+            level_type = 'Marathon'
+        elif self.prefetcher is not None:
+            level, level_type = self.prefetcher.take(level_num)
+            self.prefetcher.prefetch(level_num + 1)
+        else:
+            level = self.level_generator.generate_level(level_num)
+            level_type = self.level_generator.last_level_type
+        platforms, moving_platforms, spikes, collectibles, disappearing_platforms, goals, max_platforms = level
         
         self.platforms = platforms
         self.moving_platforms = moving_platforms
         self.spikes = spikes
         self.collectibles = collectibles
         self.disappearing_platforms = disappearing_platforms
+        self.drawn_platforms = []
         self.goals = goals
         self.max_platforms = max_platforms
+        self.build_broadphase()
         
         # Store level type for UI display
-        if level_num <= 3:
-            level_types = ['Horizontal Gaps', 'Vertical Climb', 'Mixed Challenge']
-            self.current_level_type = level_types[level_num - 1]
-        else:
-            # Get the last generated level type
-            self.current_level_type = self.level_generator.last_level_type
+        self.current_level_type = level_type
         
         # Reset player position
+        self.player.spawn_x = PLAYER_SPAWN_X
         self.player.reset_position()
         
+        # Rewinding never crosses into the previous level; restarting goes back to this snapshot
+        # instead of generating the level again
+        self.history.clear()
+        self.level_start_snapshot = None
+        self.level_start_snapshot = self.snapshot()
+        self.layout.level_start_snapshot = self.level_start_snapshot
+        self.ticks_since_snapshot = 0
+    
+    def snapshot(self):
+        """Capture the world; snapshots taken while no entity was added or removed share one layout"""
+        if self.layout is None or not self.layout.current(self.store):
+            self.layout = SnapshotLayout(self)
+        player = self.player
+        state = SNAPSHOT_STATE.pack(self.time, player.x, player.y, player.vel_x, player.vel_y, player.last_spike_damage,
+                                    player.spawn_x, player.animation_frame, player.jump_animation, player.score,
+                                    player.on_ground, player.facing_right)
+        return WorldSnapshot(self.layout, state + self.store.state_bytes())
+    
+    def restore(self, snapshot):
+        """Put the world back the way it was when snapshot was taken"""
+        layout = snapshot.layout
+        player = self.player
+        (self.time, player.x, player.y, player.vel_x, player.vel_y, player.last_spike_damage, player.spawn_x,
+         player.animation_frame, player.jump_animation, player.score, player.on_ground,
+         player.facing_right) = SNAPSHOT_STATE.unpack_from(snapshot.state)
+        (self.current_level, self.current_level_type, self.max_platforms, self.level_serial,
+         self.level_start) = layout.level
+        self.level_start_snapshot = layout.level_start_snapshot
+        self.stream = None
+        if layout.stream is not None:
+            self.stream, chunks, first = layout.stream
+            self.stream.chunks = dict(chunks)
+            self.stream.first = first
+        
+        state = memoryview(snapshot.state)[SNAPSHOT_STATE.size:]
+        if layout.current(self.store):
+            # Same entities as now: only their changing columns and the moving platforms' cells differ
+            self.store.load_state(state)
+            for platform in self.moving_platforms:
+                self.platform_grid.move(platform)
+        else:
+            (self.platforms, self.moving_platforms, self.spikes, self.collectibles, self.disappearing_platforms,
+             self.drawn_platforms, self.goals) = [list(group) for group in layout.groups]
+            self.store = EntityStore.from_bytes(layout.entities, layout.fixed, state, self.level_start)
+            self.build_grids()
+            layout.store = weakref.ref(self.store)
+            layout.version = self.store.version
+            self.layout = layout
+        self.ticks_since_snapshot = 0
+    
+    def rewind(self):
+        """Step back to the latest snapshot and drop it, or to the level start once the history runs out"""
+        self.restore(self.history.pop() if self.history else self.level_start_snapshot)
+    
+    def restart_level(self):
+        """Put the current level back the way it was loaded, without generating it again"""
+        self.history.clear()
+        self.restore(self.level_start_snapshot)
+    
+    def build_broadphase(self):
+        """Pack the level's entities into a fresh store and index them; ranks keep collisions in all_platforms() order"""
+        self.collectibles = [collectible for collectible in self.collectibles if not collectible.collected]
+        self.store = EntityStore()
+        self.store.epoch = self.level_start
+        for group in (self.platforms, self.drawn_platforms, self.moving_platforms, self.disappearing_platforms,
+                      self.spikes, self.collectibles):
+            for entity in group:
+                self.store.adopt(entity)
+        self.build_grids()
+    
+    def build_grids(self):
+        """Index the entities in play for collisions"""
+        self.platform_grid = SpatialGrid()
+        for rank, group in enumerate((self.platforms, self.drawn_platforms, self.moving_platforms, self.disappearing_platforms)):
+            for platform in group:
+                self.platform_grid.insert(platform, rank)
+        self.spike_grid = SpatialGrid()
+        for spike in self.spikes:
+            self.spike_grid.insert(spike)
+        self.collectible_grid = SpatialGrid()
+        for collectible in self.collectibles:
+            self.collectible_grid.insert(collectible)
+    
+    def update_stream(self):
+        """Follow the player through a marathon level, moving the checkpoint and loading the chunks near them"""
+        stream = self.stream
+        player = self.player
+        player.x = max(player.x, stream.left())
+        player.spawn_x = max(player.spawn_x, stream.chunk_at(player.x) * CHUNK_WIDTH + PLAYER_SPAWN_X)
+        if stream.update(player.x):
+            (self.platforms, self.moving_platforms, self.spikes, self.collectibles, self.disappearing_platforms,
+             self.goals) = stream.entity_lists()
+            self.build_broadphase()
+    
+    def level_width(self):
+        """Width of the playable area: the screen, or the whole of a marathon level"""
+        return self.screen_width if self.stream is None else self.stream.width
+    
+    def visible(self, view):
+        """Drawn, moving and disappearing platforms, collectibles and goals to draw for a view of the world"""
+        groups = (self.drawn_platforms, self.moving_platforms, self.disappearing_platforms, self.collectibles, self.goals)
+        if self.stream is None:
+            return groups
+        return tuple([entity for entity in group if view.colliderect(entity.bounds())] for group in groups)
+    
+    def all_platforms(self):
+        """Every platform the player can collide with"""
+        return self.platforms + self.drawn_platforms + self.moving_platforms + self.disappearing_platforms
+    
+    def can_draw_platform(self):
+        return len(self.drawn_platforms) < self.max_platforms
+    
+    def add_drawn_platform(self, platform):
+        """Add a finished drawn platform if the level's platform budget allows it"""
+        if platform and self.can_draw_platform():
+            self.store.adopt(platform)
+            self.drawn_platforms.append(platform)
+            self.platform_grid.insert(platform, 1)
+            return True
+        return False
+    
+    def draw_platform(self, start_pos, end_pos):
+        """Draw a platform between two points at the current simulated time"""
+        if not self.can_draw_platform():
+            return None
+        platform = self.drawing_system.make_platform(start_pos, end_pos, self.time)
+        if self.add_drawn_platform(platform):
+            return platform
+        return None
+    
+    def clear_drawn_platforms(self):
+        for platform in self.drawn_platforms:
+            self.platform_grid.remove(platform)
+            self.store.remove(platform)
+        self.drawn_platforms.clear()
+    
+    def step(self, controls, dt=None):
+        """Advance the world by dt milliseconds, one frame_time by default, returns True if the goal was reached
+        
+        The player moves dt / FRAME_MS frames' worth in one swept step, so long steps fast-forward
+        without tunnelling through platforms.
+        """
+        if controls.rewind:
+            self.rewind()
+            return False
+        if dt is None:
+            dt = self.frame_time
+        self.time += dt
+        
+        # Move platforms and collectibles in one pass over the store and fire the timers that are due
+        faded, crossed = self.store.update(self.time, self.platform_grid.cell_size)
+        for platform in crossed:
+            self.platform_grid.move(platform)
+        
+        # Remove drawn platforms that faded out
+        if faded:
+            for platform in faded:
+                self.platform_grid.remove(platform)
+                self.store.remove(platform)
+            self.drawn_platforms = [p for p in self.drawn_platforms if p.store is not None]
+        
+        # Update player against the broadphase grids
+        self.player.update(self.platform_grid, self.level_width(), self.screen_height, self.spike_grid, self.collectible_grid,
+                           self.disappearing_platforms, controls=controls, current_time=self.time, frames=dt / FRAME_MS)
+        
+        # Collected collectibles leave the level, and the store, for good
+        if len(self.collectible_grid) != len(self.collectibles):
+            for collectible in self.collectibles:
+                if collectible.collected:
+                    self.store.remove(collectible)
+            self.collectibles = [c for c in self.collectibles if c.store is not None]
+        if self.stream is not None:
+            self.update_stream()
+        
+        # Update goals
+        for goal in self.goals:
+            goal.update()
+            
+        # Check goal collision
+        player_rect = pygame.Rect(self.player.x, self.player.y, self.player.width, self.player.height)
+        for goal in self.goals:
+            if player_rect.colliderect(goal.rect):
+                self.load_level(self.current_level + 1)
+                return True
+        
+        if self.history.maxlen:
+            self.ticks_since_snapshot += 1
+            if self.ticks_since_snapshot >= SNAPSHOT_INTERVAL:
+                self.ticks_since_snapshot = 0
+                self.history.append(self.snapshot())
+        return False
+
+class HUD:
+    """Heads-up display with fonts loaded once and an LRU cache of rendered text"""
+    CONTROLS = [
+        "CONTROLS:",
+        "WASD/Arrows = Move",
+        "Space = Jump",
+        "Click+Drag = Platform",
+        "R = Restart  N = Clear",
+        "Backspace = Rewind (hold)",
+        "ESC = Exit  F11 = Fullscreen",
+        "F3 = Profiler"
+    ]
+    
+    def __init__(self, cache_size=HUD_TEXT_CACHE_SIZE):
+        self.fonts = {
+            'large': pygame.font.Font(None, 36),
+            'small': pygame.font.Font(None, 20),  # Smaller font for more compact UI
+            'tiny': pygame.font.Font(None, 18)    # Even smaller for instructions
+        }
+        self.cache_size = cache_size
+        self.text_cache = OrderedDict()  # (font, text, color) -> rendered surface
+        
+    def text(self, font_name, text, color):
+        """Rendered text surface, only re-rendered when not already cached"""
+        key = (font_name, text, color)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            surface = self.fonts[font_name].render(text, True, color)
+            self.text_cache[key] = surface
+            FrameProfiler.surfaces_allocated += 1
+            if len(self.text_cache) > self.cache_size:
+                self.text_cache.popitem(last=False)
+        else:
+            self.text_cache.move_to_end(key)
+        return surface
+    
+    def timer_lines(self, world):
+        """Fade timer text for each live drawn platform, in 0.1s steps to keep the cache small"""
+        lines = []
+        for i, platform in enumerate(world.drawn_platforms):
+            if platform.temporary and platform.active:
+                time_left = PLATFORM_FADE_TIME - (world.time - platform.creation_time)
+                seconds_left = max(0, time_left / 1000)
+                lines.append(f"P{i+1}: {seconds_left:.1f}s")
+        return lines
+    
+    def legend_items(self, world):
+        """Legend entries for the element types present in the level"""
+        legend_items = []
+        if world.moving_platforms:
+            legend_items.append(("Light Blue = Moving", (150, 150, 255)))
+        if world.spikes:
+            legend_items.append(("Red = Spikes!", (255, 50, 50)))
+        if world.disappearing_platforms:
+            legend_items.append(("Orange = Disappears", (255, 200, 100)))
+        if world.collectibles:
+            legend_items.append(("Gold = +10pts", (255, 215, 0)))
+        return legend_items
+    
+    def panels(self, world):
+        """Screen area of each HUD panel with a key that changes whenever its text does"""
+        ui_x = SCREEN_WIDTH - 220
+        timers = self.timer_lines(world)
+        platforms_left = world.max_platforms - len(world.drawn_platforms)
+        status_key = (world.current_level, world.current_level_type, platforms_left,
+                      world.player.score, tuple(timers))
+        status_rect = pygame.Rect(ui_x, 0, 220, 110 + len(timers) * 18 + 10)
+        
+        legend = self.legend_items(world)
+        legend_start_y = 10 + len(self.CONTROLS) * 18 + 10
+        help_rect = pygame.Rect(0, 0, 240, legend_start_y + len(legend) * 18 + 10)
+        return [('hud-status', status_rect, status_key, self.draw_status),
+                ('hud-help', help_rect, tuple(legend), self.draw_help)]
+    
+    def draw(self, screen, world):
+        self.draw_status(screen, world)
+        self.draw_help(screen, world)
+    
+    def draw_status(self, screen, world):
+        # Compact UI positioning - much smaller area
+        ui_x = SCREEN_WIDTH - 220  # Narrower panel
+        
+        # Level indicator
+        screen.blit(self.text('large', f"Level {world.current_level}", BLACK), (ui_x, 10))
+        
+        # Level type indicator
+        screen.blit(self.text('small', f"Type: {world.current_level_type}", DARK_GRAY), (ui_x, 45))
+        
+        # Platform counter
+        platforms_left = world.max_platforms - len(world.drawn_platforms)
+        screen.blit(self.text('small', f"Platforms: {platforms_left}", BLACK), (ui_x, 65))
+        
+        # Score
+        screen.blit(self.text('small', f"Score: {world.player.score}", BLACK), (ui_x, 85))
+        
+        # Platform timer indicators - compact
+        y_offset = 110
+        for i, line in enumerate(self.timer_lines(world)):
+            screen.blit(self.text('tiny', line, PURPLE), (ui_x, y_offset + i * 18))
+    
+    def draw_help(self, screen, world):
+        # Controls moved to top left
+        for i, control in enumerate(self.CONTROLS):
+            color = BLACK if i == 0 else DARK_GRAY
+            font_name = 'small' if i == 0 else 'tiny'
+            screen.blit(self.text(font_name, control, color), (10, 10 + i * 18))
+        
+        # Legend for new elements - top left, below controls
+        legend_start_y = 10 + len(self.CONTROLS) * 18 + 10  # Start after controls with some spacing
+        for i, (text, color) in enumerate(self.legend_items(world)):
+            screen.blit(self.text('tiny', text, color), (10, legend_start_y + i * 18))
+
+def draw_grid(surface):
+    """Draw the sketch pad grid over the whole of surface"""
+    width, height = surface.get_size()
+    grid_size = 40
+    grid_color = (220, 220, 220)  # Darker gray for better visibility
+    
+    # Draw vertical lines
+    for x in range(0, width, grid_size):
+        pygame.draw.line(surface, grid_color, (x, 0), (x, height), 1)
+    
+    # Draw horizontal lines
+    for y in range(0, height, grid_size):
+        pygame.draw.line(surface, grid_color, (0, y), (width, y), 1)
+        
+    # Add thicker lines every 5 grid squares for better structure
+    major_grid_color = (200, 200, 200)
+    major_grid_size = grid_size * 5
+    
+    # Major vertical lines
+    for x in range(0, width, major_grid_size):
+        pygame.draw.line(surface, major_grid_color, (x, 0), (x, height), 2)
+    
+    # Major horizontal lines
+    for y in range(0, height, major_grid_size):
+        pygame.draw.line(surface, major_grid_color, (0, y), (width, y), 2)
+
+def merge_rects(rects):
+    """Union overlapping rects so no screen area is repainted twice in a frame"""
+    merged = []
+    for rect in rects:
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect = rect.union(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+class DirtyRectRenderer:
+    """Repaints only the screen regions that changed since the last frame and presents them with display.update"""
+    def __init__(self, game):
+        self.game = game
+        self.previous = {}  # item id -> (rect, render key) from the last frame
+        self.needs_full_redraw = True
+        self.last_dirty_rects = []
+        
+    def invalidate(self):
+        """Repaint and flip the whole screen on the next frame"""
+        self.needs_full_redraw = True
+        
+    def collect_items(self, visible):
+        """Everything drawn over the static layer, in draw order, as (id, rect, render key, draw)"""
+        game = self.game
+        world = game.world
+        screen = game.screen
+        drawn_platforms, moving_platforms, disappearing_platforms, collectibles, goals = visible
+        items = []
+        
+        for group in (drawn_platforms, moving_platforms, disappearing_platforms):
+            for platform in group:
+                if platform.active:
+                    items.append((id(platform), platform.bounds(), platform.render_key(world.time),
+                                  partial(platform.draw, screen, world.time)))
+        for collectible in collectibles:
+            if not collectible.collected:
+                items.append((id(collectible), collectible.bounds(), collectible.render_key(),
+                              partial(collectible.draw, screen)))
+        for goal in goals:
+            items.append((id(goal), goal.bounds(), goal.render_key(), partial(goal.draw, screen)))
+        
+        player = world.player
+        items.append(('player', player.bounds(), player.render_key(), partial(player.draw, screen)))
+        
+        drawing = game.drawing_system
+        if drawing.drawing:
+            preview_key = (drawing.start_pos, drawing.current_pos)
+            items.append(('preview', drawing.preview_bounds(), preview_key, partial(drawing.draw_preview, screen)))
+        
+        for panel_id, rect, key, draw in game.hud.panels(world):
+            items.append((panel_id, rect, key, partial(draw, screen, world)))
+        if game.profiler.overlay:
+            items.append(game.profiler.overlay_panel(screen, game.hud.fonts['tiny']))
+        return items
+    
+    def dirty_rects(self, items):
+        """Old and new areas of every item that moved, changed or went away"""
+        dirty = []
+        current = set()
+        for item_id, rect, key, _ in items:
+            current.add(item_id)
+            previous = self.previous.get(item_id)
+            if previous is None:
+                dirty.append(rect)
+            elif previous[0] != rect or previous[1] != key:
+                dirty.append(previous[0])
+                dirty.append(rect)
+        for item_id, (rect, _) in self.previous.items():
+            if item_id not in current:
+                dirty.append(rect)
+        
+        screen_rect = self.game.screen.get_rect()
+        clipped = [rect.clip(screen_rect) for rect in dirty]
+        dirty = merge_rects([rect for rect in clipped if rect.width and rect.height])
+        
+        # Grow regions to cover every item they touch, since thick lines and outlines
+        # lose pixels when their shape is cut by a clip edge
+        bounds = [rect.clip(screen_rect) for _, rect, _, _ in items]
+        grown = True
+        while grown:
+            grown = False
+            for rect in bounds:
+                if rect.width and rect.height and rect.collidelist(dirty) != -1:
+                    if not any(region.contains(rect) for region in dirty):
+                        dirty = merge_rects(dirty + [rect])
+                        grown = True
+        return dirty
+    
+    def draw(self, visible):
+        game = self.game
+        screen = game.screen
+        profiler = game.profiler
+        rebuilt = game.ensure_static_layer()
+        items = self.collect_items(visible)
+        
+        dirty = None
+        if not (self.needs_full_redraw or rebuilt):
+            dirty = self.dirty_rects(items)
+            screen_area = screen.get_width() * screen.get_height()
+            if sum(rect.width * rect.height for rect in dirty) > screen_area * DIRTY_RECT_FULL_REDRAW_RATIO:
+                dirty = None
+        profiler.mark('dirty_rects')
+        
+        if dirty is None:
+            game.blit_background()
+            for _, _, _, draw in items:
+                draw()
+            profiler.count('draw_calls', len(items))
+            profiler.mark('repaint')
+            pygame.display.flip()
+            self.last_dirty_rects = [screen.get_rect()]
+        else:
+            # Restore the background under each region, then redraw whatever overlaps it
+            draw_calls = 0
+            for rect in dirty:
+                screen.set_clip(rect)
+                game.blit_background(rect)
+                for _, item_rect, _, draw in items:
+                    if item_rect.colliderect(rect):
+                        draw()
+                        draw_calls += 1
+            screen.set_clip(None)
+            profiler.count('draw_calls', draw_calls)
+            profiler.mark('repaint')
+            pygame.display.update(dirty)
+            self.last_dirty_rects = dirty
+        profiler.mark('present')
+        
+        self.previous = {item_id: (rect, key) for item_id, rect, key, _ in items}
+        self.needs_full_redraw = False
+
+class FrameStats:
+    """Rolling record of frame times and simulation ticks for frame pacing reports"""
+    def __init__(self, window=FRAME_STATS_WINDOW):
+        self.frame_times = deque(maxlen=window)  # Milliseconds between rendered frames
+        self.frames = 0
+        self.ticks = 0
+        self.catch_up_frames = 0  # Frames that had to run more than one tick
+        self.dropped_ms = 0.0  # Simulation time discarded when the catch-up cap was hit
+        
+    def record(self, frame_ms, ticks, dropped_ms=0.0):
+        self.frame_times.append(frame_ms)
+        self.frames += 1
+        self.ticks += ticks
+        if ticks > 1:
+            self.catch_up_frames += 1
+        self.dropped_ms += dropped_ms
+        
+    def summary(self):
+        """Frame time percentiles and jitter over the recent window"""
+        times = list(self.frame_times)
+        if not times:
+            return {}
+        ordered = sorted(times)
+        mean = sum(times) / len(times)
+        variance = sum((t - mean) ** 2 for t in times) / len(times)
+        # Jitter is the mean change in frame time from one frame to the next
+        deltas = [abs(b - a) for a, b in zip(times, times[1:])]
+        
+        def percentile(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        
+        return {
+            'frames': self.frames,
+            'ticks': self.ticks,
+            'fps': 1000 / mean if mean else 0.0,
+            'mean_ms': mean,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': ordered[-1],
+            'stddev_ms': math.sqrt(variance),
+            'jitter_ms': sum(deltas) / len(deltas) if deltas else 0.0,
+            'catch_up_frames': self.catch_up_frames,
+            'dropped_ms': self.dropped_ms
+        }
+
+class FrameProfiler:
+    """Per-phase frame timings and counters kept in a ring buffer, off unless enabled
+    
+    Phases are contiguous: mark(name) ends the phase that ran since the previous mark, so a
+    disabled profiler costs one attribute check per mark.
+    """
+    surfaces_allocated = 0  # Bumped wherever a surface is created, shared by all profilers
+    
+    def __init__(self, capacity=PROFILER_FRAMES):
+        self.enabled = False
+        self.overlay = False
+        self.tracing = False  # Keeps recording on for --trace whatever the overlay does
+        self.recording = False  # Whether the current frame is being profiled
+        self.frames = deque(maxlen=capacity)  # (start, [(phase, start, end)], counters) per frame
+        self.spans = []
+        self.counters = {}
+        self.frame_start = 0.0
+        self.last_mark = 0.0
+        self.surface_mark = 0
+        self.overlay_surfaces = []
+        self.overlay_age = 0
+        self.overlay_version = 0  # Bumped whenever the overlay text is re-rendered
+        
+    def toggle(self):
+        """Show or hide the overlay, profiling while it is shown or a trace is being written, from the next frame"""
+        self.overlay = not self.overlay
+        self.enabled = self.overlay or self.tracing
+        self.overlay_age = PROFILER_OVERLAY_REFRESH
+        
+    def begin_frame(self):
+        self.recording = self.enabled
+        if self.recording:
+            self.frame_start = self.last_mark = time.perf_counter()
+            self.spans = []
+            self.counters = {}
+            self.surface_mark = FrameProfiler.surfaces_allocated
+    
+    def mark(self, phase):
+        """End the phase that ran since the previous mark or the start of the frame"""
+        if self.recording:
+            now = time.perf_counter()
+            self.spans.append((phase, self.last_mark, now))
+            self.last_mark = now
+    
+    def count(self, name, amount=1):
+        if self.recording:
+            self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def end_frame(self):
+        if self.recording:
+            self.counters['surfaces_allocated'] = FrameProfiler.surfaces_allocated - self.surface_mark
+            self.frames.append((self.frame_start, self.spans, self.counters))
+            self.recording = False
+    
+    def summary(self, last=None):
+        """Mean and worst milliseconds per phase and mean counters per frame over buffered frames"""
+        frames = list(self.frames)[-last:] if last else list(self.frames)
+        if not frames:
+            return {}, {}, 0.0
+        phases = {}
+        counters = {}
+        for _, spans, frame_counters in frames:
+            totals = {}
+            for phase, start, end in spans:
+                totals[phase] = totals.get(phase, 0.0) + (end - start) * 1000
+            for phase, ms in totals.items():
+                total, worst = phases.get(phase, (0.0, 0.0))
+                phases[phase] = (total + ms, max(worst, ms))
+            for name, value in frame_counters.items():
+                counters[name] = counters.get(name, 0) + value
+        count = len(frames)
+        frame_ms = sum(spans[-1][2] - start for start, spans, _ in frames if spans) * 1000 / count
+        return ({phase: (total / count, worst) for phase, (total, worst) in phases.items()},
+                {name: value / count for name, value in counters.items()}, frame_ms)
+    
+    def overlay_lines(self):
+        phases, counters, frame_ms = self.summary(last=FPS)
+        lines = [f"frame {frame_ms:5.2f} ms  ({len(self.frames)} frames)"]
+        lines.extend(f"{phase:<22}{mean:6.2f} {worst:6.2f}" for phase, (mean, worst) in phases.items())
+        lines.extend(f"{name:<22}{value:8.1f}" for name, value in sorted(counters.items()))
+        return lines
+    
+    def overlay_rect(self, screen):
+        height = 10 + max(1, len(self.overlay_surfaces)) * 14
+        return pygame.Rect(10, screen.get_height() - height - 10, 240, height)
+    
+    def refresh_overlay(self, font):
+        """Re-render the overlay text every few frames so it stays readable and cheap"""
+        self.overlay_age += 1
+        if self.overlay_age >= PROFILER_OVERLAY_REFRESH:
+            self.overlay_age = 0
+            self.overlay_surfaces = [font.render(line, True, BLACK) for line in self.overlay_lines()]
+            self.overlay_version += 1
+    
+    def overlay_panel(self, screen, font):
+        """The overlay as a dirty-rect renderer item: (id, rect, key, draw)"""
+        self.refresh_overlay(font)
+        return ('profiler', self.overlay_rect(screen), self.overlay_version, partial(self.draw_overlay, screen))
+    
+    def draw_overlay(self, screen):
+        rect = self.overlay_rect(screen)
+        pygame.draw.rect(screen, WHITE, rect)
+        pygame.draw.rect(screen, DARK_GRAY, rect, 1)
+        for i, surface in enumerate(self.overlay_surfaces):
+            screen.blit(surface, (rect.x + 5, rect.y + 5 + i * 14))
+    
+    def trace_events(self):
+        """Buffered frames as Chrome trace events, in microseconds from the first frame"""
+        if not self.frames:
+            return []
+        origin = self.frames[0][0]
+        events = []
+        for frame_number, (start, spans, counters) in enumerate(self.frames):
+            end = spans[-1][2] if spans else start
+            events.append({'name': 'frame', 'cat': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1,
+                           'ts': (start - origin) * 1e6, 'dur': (end - start) * 1e6,
+                           'args': {'frame': frame_number}})
+            for phase, span_start, span_end in spans:
+                events.append({'name': phase, 'cat': 'phase', 'ph': 'X', 'pid': 1, 'tid': 1,
+                               'ts': (span_start - origin) * 1e6, 'dur': (span_end - span_start) * 1e6})
+            events.append({'name': 'counters', 'ph': 'C', 'pid': 1, 'ts': (start - origin) * 1e6,
+                           'args': dict(counters)})
+        return events
+    
+    def write_trace(self, path):
+        """Save the buffered frames as Chrome trace JSON, for chrome://tracing or Perfetto"""
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, file)
+
+class Camera:
+    """Horizontal scroll position of the view into a level wider than the screen"""
+    def __init__(self):
+        self.x = 0
+        self.moved = False  # Whether the last follow() scrolled the view
+        
+    def follow(self, world, screen_width):
+        """Scroll just enough to keep the player inside the dead zone, without leaving the level"""
+        x = 0
+        if world.stream is not None:
+            low, high = CAMERA_DEADZONE
+            player_x = world.player.x
+            x = min(max(self.x, int(player_x - screen_width * high)), int(player_x - screen_width * low))
+            x = max(world.stream.left(), min(x, world.stream.width - screen_width))
+        self.moved = x != self.x
+        self.x = x
+        
+    def view(self, screen_width, screen_height):
+        """The part of the world on screen"""
+        return pygame.Rect(self.x, 0, screen_width, screen_height)
+
+class Game:
+    def __init__(self, dirty_rects=False, render_fps=FPS, seed=None, level_generator=None, marathon_chunks=0):
+        # Use original resolution for proper game scaling
+        self.screen_width = SCREEN_WIDTH
+        self.screen_height = SCREEN_HEIGHT
+        self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
+        self.fullscreen = False
+            
+        self.clock = pygame.time.Clock()
+        
+        # The world owns the player, the level and the simulated clock; the next level
+        # is generated in the background while the current one is played, unless levels
+        # are streamed in chunks
+        self.world = Simulation(self.screen_width, self.screen_height, level_generator, seed=seed,
+                                prefetch=not marathon_chunks, marathon_chunks=marathon_chunks)
+        self.camera = Camera()
+        # Show the session seed or level pack so a reported level can be loaded again
+        pygame.display.set_caption(f"Draw Platform Puzzler - Infinite Levels ({self.world.level_generator})")
+        self.drawing_system = self.world.drawing_system
+        
+        # HUD keeps its fonts and rendered text between frames
+        self.hud = HUD()
+        
+        # Grid background and static level geometry, baked once per level and screen size,
+        # or once per chunk of a marathon level
+        self.static_layer = None
+        self.static_layer_serial = None
+        self.chunk_layers = {}  # chunk index -> baked layer, for the chunks in play
+        self.chunk_layers_serial = None
+        
+        # Optional renderer that only pushes the changed parts of the screen
+        self.renderer = DirtyRectRenderer(self) if dirty_rects else None
+        
+        # Rendering runs at its own rate; the simulation always ticks at FPS
+        self.render_fps = render_fps
+        self.frame_stats = FrameStats()
+        self.previous_positions = None
+        
+        # Optional input recorder, told about every tick and player action
+        self.recorder = None
+        
+        # Optional spectator server, handed the world after every tick
+        self.spectator = None
+        
+        # Phase timings and counters, toggled with F3; marks cost almost nothing while it is off
+        self.profiler = FrameProfiler()
+        
+    def load_level(self, level_num):
+        """Load a randomly generated level"""
+        self.world.load_level(level_num)
+        
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -957,15 +2773,22 @@ class Game:
                 elif event.key == pygame.K_F11:
                     # Toggle fullscreen
                     self.toggle_fullscreen()
+                elif event.key == pygame.K_F3:
+                    # Toggle the frame profiler and its overlay
+                    self.profiler.toggle()
                 elif event.key == pygame.K_r:
-                    # Reset level
-                    self.load_level(self.current_level)
-                elif event.key == pygame.K_n and len(self.drawn_platforms) < self.max_platforms:
+                    # Restart the level from the snapshot taken when it loaded
+                    self.world.restart_level()
+                    if self.recorder is not None:
+                        self.recorder.restart()
+                elif event.key == pygame.K_n and self.world.can_draw_platform():
                     # Clear all drawn platforms (for testing)
-                    self.drawn_platforms.clear()
+                    self.world.clear_drawn_platforms()
+                    if self.recorder is not None:
+                        self.recorder.clear()
                     
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1 and len(self.drawn_platforms) < self.max_platforms:  # Left click
+                if event.button == 1 and self.world.can_draw_platform():  # Left click
                     self.drawing_system.start_drawing(event.pos)
                     
             elif event.type == pygame.MOUSEMOTION:
@@ -973,9 +2796,13 @@ class Game:
                 
             elif event.type == pygame.MOUSEBUTTONUP:
                 if event.button == 1:  # Left click release
-                    new_platform = self.drawing_system.finish_drawing()
-                    if new_platform and len(self.drawn_platforms) < self.max_platforms:
-                        self.drawn_platforms.append(new_platform)
+                    start_pos, end_pos = self.drawing_system.start_pos, self.drawing_system.current_pos
+                    new_platform = self.drawing_system.finish_drawing(self.world.time)
+                    if new_platform is not None:
+                        # Drawn on screen, placed in the world
+                        new_platform.shift(self.camera.x)
+                    if self.world.add_drawn_platform(new_platform) and self.recorder is not None:
+                        self.recorder.draw(start_pos, end_pos)
         
         return True
     
@@ -995,175 +2822,321 @@ class Game:
             self.screen = pygame.display.set_mode((self.screen_width, self.screen_height), pygame.FULLSCREEN)
             self.fullscreen = True
         
-    def update(self):
-        # Update all platforms
-        all_platforms = self.platforms + self.drawn_platforms + self.moving_platforms + self.disappearing_platforms
-        for platform in all_platforms:
-            platform.update()
-        
-        # Update collectibles
-        for collectible in self.collectibles:
-            collectible.update()
-        
-        # Remove inactive drawn platforms
-        self.drawn_platforms = [p for p in self.drawn_platforms if p.active]
-        
-        # Update player
-        self.player.update(all_platforms, self.screen_width, self.screen_height, self.spikes, self.collectibles, self.disappearing_platforms)
-        
-        # Update goals
-        for goal in self.goals:
-            goal.update()
-            
-        # Check goal collision
-        player_rect = pygame.Rect(self.player.x, self.player.y, self.player.width, self.player.height)
-        for goal in self.goals:
-            if player_rect.colliderect(goal.rect):
-                self.current_level += 1
-                self.load_level(self.current_level)
-                break
+        # Keep the world's play area in sync with the display
+        self.world.screen_width = self.screen_width
+        self.world.screen_height = self.screen_height
+        self.static_layer = None
+        self.chunk_layers_serial = None
+        if self.recorder is not None:
+            self.recorder.resize(self.screen_width, self.screen_height)
+        if self.renderer is not None:
+            self.renderer.invalidate()
         
-    def draw_grid_background(self):
+    def update(self):
+        # Advance the world by one fixed simulation tick
+        controls = InputState.from_keys(pygame.key.get_pressed())
+        if self.recorder is not None:
+            self.recorder.tick(controls)
+        self.world.step(controls)
+        if self.spectator is not None:
+            self.spectator.publish(self.world)
+        self.profiler.count('collision_tests', self.world.player.collision_tests)
+        
+    def capture_positions(self):
+        """Positions of the moving entities, to interpolate from after the next tick"""
+        world = self.world
+        return world.level_serial, world.time, world.player.x, world.player.y
+    
+    def interpolate_positions(self, alpha):
+        """Move entities part way from the previous tick towards the current one, returning what to restore"""
+        world = self.world
+        previous = self.previous_positions
+        if previous is None or previous[0] != world.level_serial:
+            return None
+        _, prev_time, prev_x, prev_y = previous
+        player = world.player
+        restore = (player.x, player.y, [(platform, platform.x) for platform in world.moving_platforms])
+        
+        if abs(player.x - prev_x) + abs(player.y - prev_y) < INTERPOLATION_SNAP_DISTANCE:
+            player.x = prev_x + (player.x - prev_x) * alpha
+            player.y = prev_y + (player.y - prev_y) * alpha
+        # Moving platforms are placed exactly where their paths have them between the two ticks
+        render_time = prev_time + (world.time - prev_time) * alpha
+        for platform in world.moving_platforms:
+            platform.x = platform.position_at(render_time)
+        return restore
+    
+    def restore_positions(self, restore):
+        if restore is None:
+            return
+        player = self.world.player
+        player.x, player.y, platforms = restore
+        for platform, x in platforms:
+            platform.x = x
+        
+    def draw_grid_background(self, surface=None):
         """Draw a sketch pad grid background with better visibility"""
-        grid_size = 40
-        grid_color = (220, 220, 220)  # Darker gray for better visibility
-        
-        # Draw vertical lines
-        for x in range(0, self.screen_width, grid_size):
-            pygame.draw.line(self.screen, grid_color, (x, 0), (x, self.screen_height), 1)
-        
-        # Draw horizontal lines
-        for y in range(0, self.screen_height, grid_size):
-            pygame.draw.line(self.screen, grid_color, (0, y), (self.screen_width, y), 1)
-            
-        # Add thicker lines every 5 grid squares for better structure
-        major_grid_color = (200, 200, 200)
-        major_grid_size = grid_size * 5
-        
-        # Major vertical lines
-        for x in range(0, self.screen_width, major_grid_size):
-            pygame.draw.line(self.screen, major_grid_color, (x, 0), (x, self.screen_height), 2)
-        
-        # Major horizontal lines
-        for y in range(0, self.screen_height, major_grid_size):
-            pygame.draw.line(self.screen, major_grid_color, (0, y), (self.screen_width, y), 2)
+        draw_grid(self.screen if surface is None else surface)
+    
+    def paint_static_layer(self, width, platforms, spikes):
+        """A new layer with the background, static platforms and spikes"""
+        profiler = self.profiler
+        layer = pygame.Surface((width, self.screen_height)).convert()
+        FrameProfiler.surfaces_allocated += 1
+        layer.fill(WHITE)
+        self.draw_grid_background(layer)
+        profiler.mark('draw_grid_background')
+        for platform in platforms:
+            platform.draw(layer, self.world.time)
+        for spike in spikes:
+            spike.draw(layer)
+        profiler.count('draw_calls', len(platforms) + len(spikes))
+        profiler.mark('static_layer')
+        return layer
+    
+    def build_static_layer(self):
+        """Render the background, static platforms and spikes once for the current level"""
+        world = self.world
+        self.static_layer = self.paint_static_layer(self.screen_width, world.platforms, world.spikes)
+        self.static_layer_serial = world.level_serial
+    
+    def build_chunk_layer(self, index, chunk):
+        """Render the background, static platforms and spikes of one marathon chunk"""
+        platforms, _, spikes = chunk[:3]
+        offset = index * CHUNK_WIDTH
+        
+        # The chunk's entities are placed in the world, so paint them moved to the layer's origin
+        for entity in platforms + spikes:
+            entity.shift(-offset)
+        layer = self.paint_static_layer(CHUNK_WIDTH, platforms, spikes)
+        for entity in platforms + spikes:
+            entity.shift(offset)
+        return layer
+    
+    def ensure_static_layer(self):
+        """Rebuild the static layer if the level or screen changed, returning True if it did"""
+        if self.world.stream is not None:
+            return self.ensure_chunk_layers()
+        if self.static_layer is None or self.static_layer_serial != self.world.level_serial:
+            self.build_static_layer()
+            return True
+        return False
+    
+    def ensure_chunk_layers(self):
+        """Bake layers for marathon chunks as they stream in and drop those of dropped chunks
+        
+        Returns True only when the level or screen changed; new chunks come in off screen.
+        """
+        reset = self.chunk_layers_serial != self.world.level_serial
+        if reset:
+            self.chunk_layers = {}
+            self.chunk_layers_serial = self.world.level_serial
+        chunks = self.world.stream.chunks
+        for index in [index for index in self.chunk_layers if index not in chunks]:
+            del self.chunk_layers[index]
+        for index, chunk in chunks.items():
+            if index not in self.chunk_layers:
+                self.chunk_layers[index] = self.build_chunk_layer(index, chunk)
+        return reset
+    
+    def blit_background(self, area=None):
+        """Copy the static layer under area, or the whole screen, from the level or marathon chunk layers"""
+        screen = self.screen
+        if self.world.stream is None:
+            if area is None:
+                screen.blit(self.static_layer, (0, 0))
+            else:
+                screen.blit(self.static_layer, area, area)
+            return
+        if area is None:
+            area = screen.get_rect()
+        for index, layer in self.chunk_layers.items():
+            left = index * CHUNK_WIDTH - self.camera.x
+            part = area.clip(pygame.Rect(left, 0, CHUNK_WIDTH, self.screen_height))
+            if part.width and part.height:
+                screen.blit(layer, part, part.move(-left, 0))
+        
+        # Past the end of a level narrower than the screen
+        end = self.world.stream.width - self.camera.x
+        if area.right > end:
+            screen.fill(WHITE, area.clip(pygame.Rect(end, 0, area.right - end, self.screen_height)))
+    
+    def shift_visible(self, visible, dx):
+        """Move the player and the entities being drawn horizontally by dx"""
+        self.world.player.shift(dx)
+        for group in visible:
+            for entity in group:
+                entity.shift(dx)
     
     def draw(self):
-        # Fill with white background
-        self.screen.fill(WHITE)
-        
-        # Draw grid background
-        self.draw_grid_background()
-        
-        # Draw platforms
-        for platform in self.platforms + self.drawn_platforms + self.moving_platforms + self.disappearing_platforms:
-            platform.draw(self.screen)
+        world = self.world
+        camera = self.camera
+        
+        # Cull to what is on screen and, when scrolled, move it into view for this frame
+        # since entities draw at their world positions
+        camera.follow(world, self.screen_width)
+        visible = world.visible(camera.view(self.screen_width, self.screen_height))
+        if camera.x:
+            self.shift_visible(visible, -camera.x)
+        self.profiler.mark('cull')
+        
+        if self.renderer is not None:
+            if camera.moved:
+                self.renderer.invalidate()
+            self.renderer.draw(visible)
+        else:
+            self.draw_frame(visible)
         
-        # Draw spikes
-        for spike in self.spikes:
-            spike.draw(self.screen)
+        if camera.x:
+            self.shift_visible(visible, camera.x)
+    
+    def draw_frame(self, visible):
+        """Repaint the whole screen with the visible entities"""
+        world = self.world
+        profiler = self.profiler
+        drawn_platforms, moving_platforms, disappearing_platforms, collectibles, goals = visible
+        
+        # Background, grid, static platforms and spikes come from the baked layer
+        self.ensure_static_layer()
+        self.blit_background()
+        profiler.mark('background')
+        
+        # Draw dynamic platforms
+        for group in (drawn_platforms, moving_platforms, disappearing_platforms):
+            for platform in group:
+                platform.draw(self.screen, world.time)
+            profiler.count('draw_calls', len(group))
+        profiler.mark('platforms')
         
         # Draw collectibles
-        for collectible in self.collectibles:
+        for collectible in collectibles:
             collectible.draw(self.screen)
+        profiler.count('draw_calls', len(collectibles))
+        profiler.mark('collectibles')
         
         # Draw goals
-        for goal in self.goals:
+        for goal in goals:
             goal.draw(self.screen)
+        profiler.count('draw_calls', len(goals))
+        profiler.mark('goals')
         
         # Draw player
-        self.player.draw(self.screen)
+        world.player.draw(self.screen)
+        profiler.count('draw_calls')
+        profiler.mark('player')
         
         # Draw drawing preview
         self.drawing_system.draw_preview(self.screen)
+        profiler.mark('preview')
         
         # Draw UI
         self.draw_ui()
+        profiler.mark('draw_ui')
         
         pygame.display.flip()
+        profiler.mark('present')
         
     def draw_ui(self):
-        font = pygame.font.Font(None, 36)
-        small_font = pygame.font.Font(None, 20)  # Smaller font for more compact UI
-        tiny_font = pygame.font.Font(None, 18)   # Even smaller for instructions
-        
-        # Compact UI positioning - much smaller area
-        ui_x = SCREEN_WIDTH - 220  # Narrower panel
-        
-        # Level indicator
-        level_text = font.render(f"Level {self.current_level}", True, BLACK)
-        self.screen.blit(level_text, (ui_x, 10))
-        
-        # Level type indicator
-        if hasattr(self, 'current_level_type'):
-            type_text = small_font.render(f"Type: {self.current_level_type}", True, DARK_GRAY)
-            self.screen.blit(type_text, (ui_x, 45))
-        
-        # Platform counter
-        platforms_left = self.max_platforms - len(self.drawn_platforms)
-        platform_text = small_font.render(f"Platforms: {platforms_left}", True, BLACK)
-        self.screen.blit(platform_text, (ui_x, 65))
-        
-        # Score
-        score_text = small_font.render(f"Score: {self.player.score}", True, BLACK)
-        self.screen.blit(score_text, (ui_x, 85))
-        
-        # Platform timer indicators - compact
-        y_offset = 110
-        active_timers = 0
-        for i, platform in enumerate(self.drawn_platforms):
-            if platform.temporary and platform.active:
-                current_time = pygame.time.get_ticks()
-                time_left = PLATFORM_FADE_TIME - (current_time - platform.creation_time)
-                seconds_left = max(0, time_left / 1000)
-                
-                timer_text = tiny_font.render(f"P{i+1}: {seconds_left:.1f}s", True, PURPLE)
-                self.screen.blit(timer_text, (ui_x, y_offset + active_timers * 18))
-                active_timers += 1
-        
-        # Controls moved to top left
-        controls = [
-            "CONTROLS:",
-            "WASD/Arrows = Move",
-            "Space = Jump", 
-            "Click+Drag = Platform",
-            "R = Reset  N = Clear",
-            "ESC = Exit  F11 = Fullscreen"
-        ]
-        
-        for i, control in enumerate(controls):
-            color = BLACK if i == 0 else DARK_GRAY
-            font_to_use = small_font if i == 0 else tiny_font
-            text = font_to_use.render(control, True, color)
-            self.screen.blit(text, (10, 10 + i * 18))
-        
-        # Legend for new elements - top left, below controls
-        legend_start_y = 10 + len(controls) * 18 + 10  # Start after controls with some spacing
-        legend_items = []
-        if self.moving_platforms:
-            legend_items.append(("Light Blue = Moving", (150, 150, 255)))
-        if self.spikes:
-            legend_items.append(("Red = Spikes!", (255, 50, 50)))
-        if self.disappearing_platforms:
-            legend_items.append(("Orange = Disappears", (255, 200, 100)))
-        if self.collectibles:
-            legend_items.append(("Gold = +10pts", (255, 215, 0)))
-            
-        for i, (text, color) in enumerate(legend_items):
-            legend_text = tiny_font.render(text, True, color)
-            self.screen.blit(legend_text, (10, legend_start_y + i * 18))
-        
-    def run(self):
+        self.hud.draw(self.screen, self.world)
+        if self.profiler.overlay:
+            self.profiler.refresh_overlay(self.hud.fonts['tiny'])
+            self.profiler.draw_overlay(self.screen)
+        
+    def run(self, report_stats=False, trace_path=None):
+        # Fixed timestep: the simulation advances in whole ticks of world.frame_time
+        # and rendering blends between the last two ticks, so the game plays the
+        # same at any frame rate
+        tick_ms = self.world.frame_time
+        accumulator = 0.0
+        last_time = time.perf_counter()
+        profiler = self.profiler
         running = True
         while running:
+            now = time.perf_counter()
+            frame_ms = (now - last_time) * 1000
+            last_time = now
+            accumulator += frame_ms
+            
+            profiler.begin_frame()
             running = self.handle_events()
-            self.update()
+            profiler.mark('handle_events')
+            
+            ticks = 0
+            while accumulator >= tick_ms and ticks < MAX_CATCH_UP_STEPS:
+                self.previous_positions = self.capture_positions()
+                self.update()
+                accumulator -= tick_ms
+                ticks += 1
+            profiler.count('ticks', ticks)
+            profiler.mark('update')
+            
+            # Too far behind to catch up - drop the backlog instead of spiralling
+            dropped_ms = 0.0
+            if accumulator >= tick_ms:
+                dropped_ms = accumulator - accumulator % tick_ms
+                accumulator %= tick_ms
+            self.frame_stats.record(frame_ms, ticks, dropped_ms)
+            
+            restore = self.interpolate_positions(accumulator / tick_ms)
+            profiler.mark('interpolate')
             self.draw()
-            self.clock.tick(FPS)
-        
+            self.restore_positions(restore)
+            self.clock.tick(self.render_fps)
+            profiler.mark('frame_wait')
+            profiler.end_frame()
+        
+        if report_stats:
+            for name, value in self.frame_stats.summary().items():
+                print(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}")
+        if trace_path:
+            self.profiler.write_trace(trace_path)
+        if self.recorder is not None:
+            self.recorder.finish(self.world)
+        if self.spectator is not None:
+            self.spectator.close()
+        if self.world.prefetcher is not None:
+            self.world.prefetcher.close()
         pygame.quit()
         sys.exit()
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    import argparse
+    parser = argparse.ArgumentParser(description="Draw Platform Puzzler")
+    parser.add_argument("--dirty-rects", action="store_true", help="only repaint changed screen regions")
+    parser.add_argument("--fps", type=int, default=FPS, help="render frame rate cap, 0 for uncapped")
+    parser.add_argument("--frame-stats", action="store_true", help="print frame pacing statistics on exit")
+    parser.add_argument("--seed", type=int, help="session seed, to replay the same sequence of levels")
+    parser.add_argument("--pack", help="play the levels of a binary level pack instead of generating them")
+    parser.add_argument("--record", help="record the session's input to this file for input_replay.py")
+    parser.add_argument("--profile", action="store_true", help="start with the frame profiler overlay on (F3 toggles it)")
+    parser.add_argument("--trace", help="profile every frame and write the last ones to this Chrome trace JSON file on exit")
+    parser.add_argument("--marathon", type=int, nargs="?", const=MARATHON_CHUNKS, default=0, metavar="CHUNKS",
+                        help=f"play scrolling levels CHUNKS screens long, streamed in as you go (default {MARATHON_CHUNKS})")
+    parser.add_argument("--spectate", type=int, nargs="?", const=SPECTATOR_PORT, metavar="PORT",
+                        help=f"stream the game to spectator.py watch clients on this port (default {SPECTATOR_PORT})")
+    parser.add_argument("--spectate-host", default="127.0.0.1", help="address to accept spectators on, 0.0.0.0 for any")
+    args = parser.parse_args()
+    if args.record and args.pack:
+        parser.error("--record needs generated levels, not a level pack")
+    if args.marathon and (args.pack or args.record):
+        parser.error("--marathon levels are generated as they are played and cannot come from a pack or be recorded")
+    
+    level_generator = None
+    if args.pack:
+        from level_pack import LevelPack
+        level_generator = LevelPack(args.pack)
+    
+    game = Game(dirty_rects=args.dirty_rects, render_fps=args.fps, seed=args.seed, level_generator=level_generator,
+                marathon_chunks=args.marathon)
+    if args.record:
+        from input_replay import InputRecorder
+        game.recorder = InputRecorder(args.record, game.world)
+    if args.spectate is not None:
+        from spectator import SpectatorServer
+        game.spectator = SpectatorServer(args.spectate_host, args.spectate)
+        game.spectator.start()
+    if args.trace:
+        game.profiler.tracing = game.profiler.enabled = True
+    if args.profile:
+        game.profiler.toggle()
+    game.run(report_stats=args.frame_stats, trace_path=args.trace)
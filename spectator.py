@@ -0,0 +1,568 @@
+"""Live spectating: a game broadcasts its world, tick by tick, to any number of headless spectator clients.
+
+Start a game with `python platformer_game.py --spectate`, or play a recording to spectators with
+`python spectator.py serve session.dpr`, then watch it with `python spectator.py watch`.
+
+The server runs an asyncio loop on a thread of its own. All the frame loop does is take a
+snapshot per tick and queue it; the server picks queued ticks up every FLUSH_INTERVAL, so its
+work lands while the game waits for its next frame instead of in the middle of a tick.
+
+Each tick is encoded once and the same bytes go to every client: a keyframe with the level and
+its entities whenever they change and every KEYFRAME_INTERVAL ticks, and otherwise a delta, the
+XOR of the tick's packed state with the previous one, zlib compressed. A client whose socket
+backs up is skipped until the next keyframe, so a slow spectator never holds up the game or the
+other spectators.
+"""
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import deque
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+
+from input_replay import InputRecording, replay
+from platformer_game import (CAMERA_DEADZONE, COLLECTIBLE, DISAPPEARING_PLATFORM, DRAWN_PLATFORM, FPS, HUD,
+                             MOVING_PLATFORM, SCREEN_HEIGHT, SCREEN_WIDTH, SNAPSHOT_STATE, SPECTATOR_PORT, SPIKE,
+                             STATIC_PLATFORM, WHITE, Collectible, DisappearingPlatform, EntityStore, EntityView, Goal,
+                             MovingPlatform, Platform, Player, Spike, draw_grid)
+
+MAGIC = b'DPSS'
+VERSION = 1
+
+GREETING = struct.Struct('<4sH')  # magic, version; sent once as a client connects
+FRAME = struct.Struct('<BxxxII')  # kind, tick, payload size
+KEYFRAME = struct.Struct('<IIIdiiIHH')  # level, max platforms, level serial, level start, left edge, level width, entities, goals, level type size
+
+# Frame kinds
+KEY = 1  # Level, goals, fixed entity columns and the full state
+DELTA = 2  # State XOR the previous tick's
+
+FLUSH_INTERVAL = 1 / FPS  # Seconds between the server sending what the game queued
+KEYFRAME_INTERVAL = 60  # Ticks between keyframes, the longest a new or lagging client waits to catch up
+CLIENT_BUFFER_LIMIT = 256 * 1024  # Bytes queued for a client before it is skipped until the next keyframe
+COMPRESSION_LEVEL = 1  # Deltas are mostly zeros, so zlib's fastest level already shrinks them well
+GRID_PERIOD = 200  # The background grid repeats every major line, so a background this much wider can scroll
+
+# View class for each entity kind a keyframe carries
+VIEW_CLASSES = {STATIC_PLATFORM: Platform, SPIKE: Spike, DRAWN_PLATFORM: Platform, MOVING_PLATFORM: MovingPlatform,
+                DISAPPEARING_PLATFORM: DisappearingPlatform, COLLECTIBLE: Collectible}
+
+
+def scene(world):
+    """What a keyframe needs besides a snapshot: the scrollable extent and the goal positions"""
+    left = world.stream.left() if world.stream is not None else 0
+    goals = array('i', [int(value) for goal in world.goals for value in (goal.x, goal.y)])
+    return left, world.level_width(), goals
+
+
+def frame(kind, tick, payload):
+    return FRAME.pack(kind, tick, len(payload)) + payload
+
+
+class StreamEncoder:
+    """Turns a world's snapshots into stream frames, remembering what clients that keep up already have"""
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.tick = 0
+        self.layout = None
+        self.state = None
+        self.keyframe_tick = 0
+        self.keyframe = None  # Latest keyframe frame
+        self.backlog = []  # Delta frames since it, for clients joining now
+
+    def reset(self):
+        """Start again from a keyframe, for when nobody was watching"""
+        self.layout = None
+        self.state = None
+        self.keyframe = None
+        self.backlog = []
+
+    def encode(self, layout, state, scene):
+        """The frame for the next tick of a snapshot's layout and state, and whether it is a keyframe"""
+        self.tick += 1
+        keyframe = layout is not self.layout or self.tick - self.keyframe_tick >= self.keyframe_interval
+        if keyframe:
+            level, level_type, max_platforms, level_serial, level_start = layout.level
+            left, width, goals = scene
+            name = level_type.encode()
+            header = KEYFRAME.pack(level, max_platforms, level_serial, level_start, left, width, len(layout.entities),
+                                   len(goals) // 2, len(name))
+            payload = zlib.compress(header + name + goals.tobytes() + layout.fixed + state, COMPRESSION_LEVEL)
+            message = frame(KEY, self.tick, payload)
+            self.keyframe = message
+            self.keyframe_tick = self.tick
+            self.backlog = []
+        else:
+            # Same entities as last tick, so the packed states line up byte for byte
+            delta = np.bitwise_xor(np.frombuffer(state, np.uint8), np.frombuffer(self.state, np.uint8))
+            message = frame(DELTA, self.tick, zlib.compress(delta.tobytes(), COMPRESSION_LEVEL))
+            self.backlog.append(message)
+        self.layout = layout
+        self.state = state
+        return message, keyframe
+
+
+class SpectatorServer:
+    """Broadcasts a world to spectator clients from an asyncio loop on its own thread"""
+    def __init__(self, host='127.0.0.1', port=SPECTATOR_PORT):
+        self.host = host
+        self.port = port  # 0 picks a free port, filled in by start()
+        self.encoder = StreamEncoder()
+        self.clients = {}  # Writer -> whether it is getting deltas; False until its next keyframe
+        self.watching = False  # Read by the game thread to skip snapshots while nobody watches
+        self.pending = deque()  # (layout, state, scene) per tick, appended by the game thread
+        self.flusher = None  # Timer for the next flush while anyone watches
+        self.layout = None  # Layout scene was captured for, on the game thread
+        self.scene = None
+        self.encode_time = 0.0  # Seconds spent encoding and sending, for loopback reports
+        self.send_time = 0.0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.serve, name='spectator-server', daemon=True)
+        self.ready = threading.Event()
+        self.error = None
+
+    def start(self):
+        """Start accepting spectators, returning the port they connect to"""
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self.port
+
+    def serve(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            server = self.loop.run_until_complete(asyncio.start_server(self.handle, self.host, self.port))
+        except OSError as error:
+            self.error = error
+            self.ready.set()
+            return
+        self.port = server.sockets[0].getsockname()[1]
+        self.ready.set()
+        self.loop.run_forever()
+
+        # Send what the game queued last, then hang up on everyone
+        self.flush()
+        if self.flusher is not None:
+            self.flusher.cancel()
+        server.close()
+        for writer in self.clients:
+            writer.close()
+        self.loop.run_until_complete(asyncio.gather(server.wait_closed(), *asyncio.all_tasks(self.loop)))
+        self.loop.close()
+
+    def close(self):
+        """Disconnect every spectator and stop the server thread"""
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    def publish(self, world):
+        """Queue the world's latest tick for the server thread; called on the game thread, it never waits"""
+        if not self.watching:
+            return
+        snapshot = world.snapshot()
+        if snapshot.layout is not self.layout:
+            # Goals and chunk bounds only change along with the entities, and can only be read safely here
+            self.layout = snapshot.layout
+            self.scene = scene(world)
+        self.pending.append((snapshot.layout, snapshot.state, self.scene))
+
+    def flush(self):
+        """Broadcast the ticks the game queued since the last flush"""
+        pending = self.pending
+        while pending:
+            self.broadcast(*pending.popleft())
+        self.flusher = self.loop.call_later(FLUSH_INTERVAL, self.flush) if self.clients else None
+
+    def broadcast(self, layout, state, scene):
+        """Encode a tick once and queue the same bytes for every client that can take them"""
+        start = time.perf_counter()
+        message, keyframe = self.encoder.encode(layout, state, scene)
+        encoded = time.perf_counter()
+        for writer, synced in self.clients.items():
+            if writer.is_closing() or not (synced or keyframe):
+                continue
+            if writer.transport.get_write_buffer_size() > CLIENT_BUFFER_LIMIT:
+                # Falling behind: drop its deltas and let it catch up from the next keyframe
+                self.clients[writer] = False
+                continue
+            self.clients[writer] = True
+            writer.write(message)
+        self.encode_time += encoded - start
+        self.send_time += time.perf_counter() - encoded
+
+    async def handle(self, reader, writer):
+        writer.write(GREETING.pack(MAGIC, VERSION))
+        encoder = self.encoder
+        if encoder.keyframe is not None:
+            # Join mid-stream from the latest keyframe and the deltas since
+            writer.write(encoder.keyframe)
+            writer.writelines(encoder.backlog)
+        self.clients[writer] = encoder.keyframe is not None
+        self.watching = True
+        if self.flusher is None:
+            self.flusher = self.loop.call_soon(self.flush)
+        try:
+            while await reader.read(4096):
+                pass  # Clients never send anything; reading only notices them leave
+        except ConnectionError:
+            pass
+        finally:
+            del self.clients[writer]
+            if not self.clients:
+                self.watching = False
+                self.pending.clear()
+                encoder.reset()
+            writer.close()
+
+
+class SpectatorWorld:
+    """A world rebuilt from stream frames, with the attributes HUD and the entity draw calls read"""
+    def __init__(self):
+        self.tick = 0
+        self.time = 0
+        self.state = None  # Packed state of the last frame applied, None until a keyframe arrives
+        self.player = Player(0, 0)
+        self.current_level = 0
+        self.current_level_type = ''
+        self.max_platforms = 0
+        self.level_serial = 0
+        self.left = 0
+        self.width = SCREEN_WIDTH
+        self.store = EntityStore()
+        self.platforms = []
+        self.moving_platforms = []
+        self.spikes = []
+        self.collectibles = []
+        self.disappearing_platforms = []
+        self.drawn_platforms = []
+        self.goals = []
+
+    def apply(self, kind, tick, payload):
+        """Apply one frame, returning False for a delta that does not follow on from the last frame"""
+        if kind == KEY:
+            self.load_keyframe(zlib.decompress(payload))
+        elif self.state is None or tick != self.tick + 1:
+            self.state = None  # Out of step; wait for a keyframe
+            return False
+        else:
+            delta = np.frombuffer(zlib.decompress(payload), np.uint8)
+            state = np.bitwise_xor(np.frombuffer(self.state, np.uint8), delta).tobytes()
+            self.store.load_state(memoryview(state)[SNAPSHOT_STATE.size:])
+            self.load_player(state)
+        self.tick = tick
+        for goal in self.goals:
+            goal.update()
+        return True
+
+    def load_keyframe(self, data):
+        (self.current_level, self.max_platforms, self.level_serial, level_start, self.left, self.width, count,
+         goal_count, name_size) = KEYFRAME.unpack_from(data)
+        position = KEYFRAME.size
+        self.current_level_type = data[position:position + name_size].decode()
+        position += name_size
+        goals = array('i', data[position:position + goal_count * 2 * array('i').itemsize])
+        position += len(goals) * goals.itemsize
+        self.goals = [Goal(goals[i], goals[i + 1]) for i in range(0, len(goals), 2)]
+
+        fixed_size = count * sum(column.itemsize for column in self.store.fixed_columns)
+        fixed = data[position:position + fixed_size]
+        state = data[position + fixed_size:]
+        store = EntityStore.from_bytes([EntityView() for _ in range(count)], fixed,
+                                       memoryview(state)[SNAPSHOT_STATE.size:], level_start)
+
+        # Swap in views of each entity's own class now its kind is known
+        groups = {kind: [] for kind in VIEW_CLASSES}
+        for row, kind in enumerate(store.kind):
+            view_class = VIEW_CLASSES[kind]
+            view = view_class.__new__(view_class)
+            view.store = store
+            view.handle = row
+            store.entities[row] = view
+            groups[kind].append(view)
+        self.store = store
+        self.platforms = groups[STATIC_PLATFORM]
+        self.moving_platforms = groups[MOVING_PLATFORM]
+        self.spikes = groups[SPIKE]
+        self.collectibles = groups[COLLECTIBLE]
+        self.disappearing_platforms = groups[DISAPPEARING_PLATFORM]
+        self.drawn_platforms = sorted(groups[DRAWN_PLATFORM], key=lambda platform: platform.creation_time)
+        self.load_player(state)
+
+    def load_player(self, state):
+        player = self.player
+        (self.time, player.x, player.y, player.vel_x, player.vel_y, player.last_spike_damage, player.spawn_x,
+         player.animation_frame, player.jump_animation, player.score, player.on_ground,
+         player.facing_right) = SNAPSHOT_STATE.unpack_from(state)
+        player.is_walking = player.vel_x != 0
+        self.state = state
+
+
+class SpectatorClient:
+    """Headless spectator: follows a stream into a SpectatorWorld and renders it offscreen"""
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+        self.world = SpectatorWorld()
+        self.screen = pygame.Surface((width, height))
+        self.background = None  # The grid, GRID_PERIOD wider than the screen to scroll under the camera
+        self.hud = HUD()
+        self.camera_x = 0
+        self.frames = 0
+        self.keyframes = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.renders = 0
+        self.decode_time = 0.0
+        self.render_time = 0.0
+        self.on_frame = None  # Called with the world after each frame is applied, for checking a stream
+
+    async def watch(self, host, port, max_frames=None, render_interval=1 / FPS):
+        """Follow a server's stream until it closes or max_frames arrive, rendering at most once per render_interval seconds
+
+        A render_interval of None only decodes.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            magic, version = GREETING.unpack(await reader.readexactly(GREETING.size))
+            if magic != MAGIC:
+                raise ValueError(f"{host}:{port} is not a spectator server")
+            if version != VERSION:
+                raise ValueError(f"{host}:{port} streams unsupported version {version}")
+            last_render = -float('inf')
+            while max_frames is None or self.frames < max_frames:
+                try:
+                    kind, tick, size = FRAME.unpack(await reader.readexactly(FRAME.size))
+                    payload = await reader.readexactly(size)
+                except asyncio.IncompleteReadError:
+                    break  # The game ended
+                self.receive(kind, tick, payload)
+                now = time.perf_counter()
+                if render_interval is not None and now - last_render >= render_interval:
+                    last_render = now
+                    self.render()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    def receive(self, kind, tick, payload):
+        start = time.perf_counter()
+        applied = self.world.apply(kind, tick, payload)
+        if applied:
+            self.frames += 1
+            self.keyframes += kind == KEY
+        else:
+            self.dropped += 1
+        self.bytes += FRAME.size + len(payload)
+        self.decode_time += time.perf_counter() - start
+        if applied and self.on_frame is not None:
+            self.on_frame(self.world)
+
+    def follow(self):
+        """Scroll to keep the player inside the dead zone like the game's camera, without leaving the level"""
+        world = self.world
+        width = self.screen.get_width()
+        low, high = CAMERA_DEADZONE
+        player_x = world.player.x
+        x = min(max(self.camera_x, int(player_x - width * high)), int(player_x - width * low))
+        self.camera_x = max(world.left, min(x, world.width - width))
+
+    def render(self):
+        """Paint the latest frame: grid, entities, player and HUD, scrolled like the game's camera"""
+        world = self.world
+        if world.state is None:
+            return
+        start = time.perf_counter()
+        screen = self.screen
+        if self.background is None:
+            self.background = pygame.Surface((screen.get_width() + GRID_PERIOD, screen.get_height()))
+            self.background.fill(WHITE)
+            draw_grid(self.background)
+        self.follow()
+        dx = self.camera_x
+        screen.blit(self.background, (-(dx % GRID_PERIOD), 0))
+
+        # Entities draw at their world positions, so move them into view for the frame
+        groups = (world.platforms, world.drawn_platforms, world.moving_platforms, world.disappearing_platforms,
+                  world.spikes, world.collectibles, world.goals)
+        entities = [entity for group in groups for entity in group] + [world.player]
+        if dx:
+            for entity in entities:
+                entity.shift(-dx)
+        for group in groups[:4]:
+            for platform in group:
+                platform.draw(screen, world.time)
+        for group in groups[4:]:
+            for entity in group:
+                entity.draw(screen)
+        world.player.draw(screen)
+        if dx:
+            for entity in entities:
+                entity.shift(dx)
+        self.hud.draw(screen, world)
+        self.renders += 1
+        self.render_time += time.perf_counter() - start
+
+    def summary(self):
+        ticks = max(self.frames, 1)
+        return {'frames': self.frames, 'keyframes': self.keyframes, 'dropped': self.dropped, 'bytes': self.bytes,
+                'bytes_per_frame': self.bytes / ticks, 'decode_us': self.decode_time / ticks * 1e6,
+                'renders': self.renders, 'render_ms': self.render_time / max(self.renders, 1) * 1000}
+
+
+def run_serve(args):
+    recording = InputRecording.load(args.recording)
+    server = SpectatorServer(args.host, args.port)
+    print(f"Spectators can watch on {args.host}:{server.start()}", file=sys.stderr)
+    tick_seconds = 1 / (FPS * args.speed)
+    next_tick = time.perf_counter()
+
+    def on_tick(world):
+        # Play back in real time, or at args.speed times it
+        nonlocal next_tick
+        server.publish(world)
+        next_tick += tick_seconds
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_tick -= delay
+
+    try:
+        while True:
+            replay(recording, on_tick)
+            if not args.loop:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+def run_watch(args):
+    client = SpectatorClient(args.width, args.height)
+    render_interval = 1 / args.fps if args.fps else None
+    try:
+        asyncio.run(client.watch(args.host, args.port, args.frames, render_interval))
+    except (OSError, ValueError) as error:
+        print(f"spectator: {error}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    if args.screenshot:
+        client.render()
+        pygame.image.save(client.screen, args.screenshot)
+    for name, value in client.summary().items():
+        print(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}")
+    return 0
+
+
+def run_loopback(args):
+    """Stream a recording at real time to many local clients at once, checking every tick each one decodes"""
+    recording = InputRecording.load(args.recording)
+    server = SpectatorServer('127.0.0.1', 0)
+    port = server.start()
+    clients = [SpectatorClient() for _ in range(args.clients)]
+    expected = []  # Server state and fixed entity columns per stream tick, in tick order
+    mismatches = [0] * len(clients)
+    publish_time = 0.0
+    ticks = 0
+
+    def play():
+        nonlocal publish_time, ticks
+        next_tick = time.perf_counter()
+
+        def on_tick(world):
+            nonlocal publish_time, ticks, next_tick
+            # Recorded before publishing, so it is there by the time any client decodes this tick
+            fixed = world.store.fixed_bytes()
+            if expected and expected[-1][1] == fixed:
+                fixed = expected[-1][1]  # Share unchanged columns between ticks
+            expected.append((world.snapshot().state, fixed))
+            start = time.perf_counter()
+            server.publish(world)
+            publish_time += time.perf_counter() - start
+            ticks += 1
+            next_tick += 1 / FPS
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+        replay(recording, on_tick)
+        server.close()
+
+    def checker(index):
+        def on_frame(world):
+            state, fixed = expected[world.tick - 1]
+            if world.state != state or world.store.fixed_bytes() != fixed:
+                mismatches[index] += 1
+        return on_frame
+
+    async def watch_all():
+        for index, client in enumerate(clients):
+            client.on_frame = checker(index)
+        watchers = [asyncio.ensure_future(client.watch('127.0.0.1', port, render_interval=None)) for client in clients]
+        # Everyone is connected before the first tick, so they all see the whole stream from tick 1
+        while len(server.clients) < len(clients):
+            await asyncio.sleep(0.01)
+        player = threading.Thread(target=play)
+        player.start()
+        await asyncio.gather(*watchers)
+        player.join()
+
+    asyncio.run(watch_all())
+    summaries = [client.summary() for client in clients]
+    dropped = sum(s['dropped'] for s in summaries)
+    missing = sum(ticks - s['frames'] for s in summaries)
+    ticks = max(ticks, 1)
+    print(f"{ticks} ticks to {len(clients)} clients")
+    print(f"game thread publish: {publish_time / ticks * 1e6:.1f} us/tick")
+    print(f"server encode: {server.encode_time / ticks * 1e6:.1f} us/tick, "
+          f"send: {server.send_time / ticks / len(clients) * 1e6:.2f} us/tick per client")
+    print(f"per client: {min(s['bytes_per_frame'] for s in summaries):.1f}-"
+          f"{max(s['bytes_per_frame'] for s in summaries):.1f} bytes/frame, "
+          f"{sum(s['decode_us'] for s in summaries) / len(summaries):.1f} us/frame to decode, "
+          f"{min(s['frames'] for s in summaries)}-{max(s['frames'] for s in summaries)} frames")
+    print(f"{sum(mismatches)} ticks differed from the server, {dropped} dropped, {missing} missing")
+    return 1 if sum(mismatches) or dropped or missing else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spectator streaming tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="Play an input recording to spectators in real time")
+    serve.add_argument('recording')
+    serve.add_argument('--host', default='127.0.0.1', help="Address to accept spectators on, 0.0.0.0 for any")
+    serve.add_argument('--port', type=int, default=SPECTATOR_PORT)
+    serve.add_argument('--speed', type=float, default=1.0, help="Playback speed relative to real time")
+    serve.add_argument('--loop', action='store_true', help="Start the recording over when it ends")
+    watch = commands.add_parser('watch', help="Follow a game's stream headless and render it offscreen")
+    watch.add_argument('--host', default='127.0.0.1')
+    watch.add_argument('--port', type=int, default=SPECTATOR_PORT)
+    watch.add_argument('--frames', type=int, help="Stop after this many frames instead of when the game ends")
+    watch.add_argument('--fps', type=float, default=FPS, help="Render at most this often, 0 to only decode")
+    watch.add_argument('--width', type=int, default=SCREEN_WIDTH)
+    watch.add_argument('--height', type=int, default=SCREEN_HEIGHT)
+    watch.add_argument('--screenshot', help="Save the last frame to this image file")
+    loopback = commands.add_parser('loopback', help="Stream a recording to many local clients, check what they decode and report per-client costs")
+    loopback.add_argument('recording')
+    loopback.add_argument('--clients', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        return run_serve(args)
+    if args.command == 'watch':
+        return run_watch(args)
+    if args.command == 'loopback':
+        return run_loopback(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
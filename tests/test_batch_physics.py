@@ -0,0 +1,37 @@
+import random
+
+import numpy as np
+import pytest
+
+from batch_physics import BatchSimulation, LevelBatch
+from platformer_game import InputState, Simulation
+
+
+@pytest.mark.parametrize('dt', [None, 50])
+def test_batch_rows_match_simulations(dt):
+    worlds = [Simulation(seed=seed, start_level=1 + seed % 10) for seed in range(40)]
+    levels = [world.current_level for world in worlds]
+    batch = BatchSimulation(LevelBatch.from_worlds(worlds))
+    rng = random.Random(3)
+    compared = drawn_count = 0
+    for tick in range(900):
+        if tick % 40 == 0:
+            keys = [(rng.random() < 0.3, rng.random() < 0.6, rng.random() < 0.4) for _ in worlds]
+        if tick % 150 == 10:
+            start = (rng.randint(0, 600), rng.randint(300, 550))
+            end = (start[0] + 150, start[1])
+            for row, world in enumerate(worlds):
+                if world.current_level == levels[row]:
+                    drawn = world.draw_platform(start, end) is not None
+                    assert batch.levels.draw_platform(row, start, end, world.time) == drawn
+                    drawn_count += drawn
+        batch.step(*[np.array(column) for column in zip(*keys)], dt=dt)
+        for row, world in enumerate(worlds):
+            # Rows stop being comparable once their world moves on to the next level
+            if world.current_level != levels[row] or world.step(InputState(*keys[row]), dt=dt):
+                continue
+            players = batch.players
+            assert (players.x[row], players.y[row], players.score[row]) == (world.player.x, world.player.y,
+                                                                           world.player.score), (row, tick)
+            compared += 1
+    assert compared > 5000 and drawn_count
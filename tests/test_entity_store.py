@@ -0,0 +1,34 @@
+import itertools
+
+import numpy as np
+
+import platformer_game
+from benchmarks import CONTROL_PATTERN, populate
+from platformer_game import MovingPlatform, Simulation
+
+
+def test_row_and_array_updates_agree(monkeypatch):
+    worlds = []
+    for _ in range(2):
+        world = Simulation(seed=3)
+        populate(world, 600, seed=4)
+        worlds.append((world, itertools.cycle(CONTROL_PATTERN)))
+    for tick in range(400):
+        for (world, controls), rows in zip(worlds, (10 ** 9, 0)):
+            monkeypatch.setattr(platformer_game, 'STORE_VECTORIZE_ROWS', rows)
+            if tick % 150 == 10:
+                world.draw_platform((100, 300), (300, 300))
+            world.step(next(controls))
+        (looped, _), (vectorized, _) = worlds
+        assert [list(column) for column in looped.store.columns] == [list(column) for column in vectorized.store.columns]
+        assert (looped.player.x, looped.player.y) == (vectorized.player.x, vectorized.player.y)
+
+
+def test_positions_at_rounds_like_position_at():
+    world = Simulation(seed=1)
+    world.moving_platforms = [MovingPlatform(start, 200, 100, 20, start, start + span, speed)
+                              for start, span, speed in [(-75, 31, 1), (0, 7, 1.5), (13, 250, 2)]]
+    world.build_broadphase()
+    times = np.arange(0, 20000, 8.3)
+    for platform in world.moving_platforms:
+        assert platform.positions_at(times).tolist() == [platform.position_at(time) for time in times]
@@ -0,0 +1,63 @@
+import pytest
+
+from platformer_game import PLATFORM_FADE_TIME, InputState, MovingPlatform, Simulation
+
+
+def empty_world():
+    """A world with the generated level cleared away, so only platforms a test adds are in play"""
+    world = Simulation(seed=1)
+    world.platforms, world.moving_platforms, world.spikes, world.collectibles = [], [], [], []
+    world.disappearing_platforms, world.goals = [], []
+    world.build_broadphase()
+    return world
+
+
+def test_fast_fall_lands_on_thin_drawn_platform():
+    world = empty_world()
+    platform = world.draw_platform((0, 500), (200, 500))
+    assert platform.rect.height == 10
+    player = world.player
+    player.x, player.y, player.vel_y = 60, 380, 80  # Moves well past the platform in one tick
+    world.step(InputState())
+    assert player.on_ground
+    assert player.y == platform.rect.top - player.height
+
+
+def test_long_steps_move_the_player_as_far_as_the_clock():
+    world = empty_world()
+    platform = world.draw_platform((0, 500), (200, 500))
+    player = world.player
+    player.x, player.y, player.vel_y = 60, -400, 0
+    for _ in range(4):
+        world.step(InputState(), dt=250)
+        if player.on_ground:
+            break
+    assert player.on_ground and world.time < PLATFORM_FADE_TIME
+    assert player.y == platform.rect.top - player.height
+
+
+def test_long_steps_walk_as_far_as_short_ones():
+    short, long = empty_world(), empty_world()
+    for world in (short, long):
+        world.draw_platform((0, 500), (700, 500))
+        world.player.x, world.player.y = 60, 460
+    for _ in range(15):
+        short.step(InputState(right=True))
+    long.step(InputState(right=True), dt=250)
+    assert long.time == pytest.approx(short.time)
+    assert long.player.x == pytest.approx(short.player.x)
+
+
+@pytest.mark.parametrize('dt', [None, 50, 250])
+def test_player_rides_moving_platform(dt):
+    world = empty_world()
+    world.moving_platforms = [MovingPlatform(200, 500, 100, 20, 150, 400, speed=2)]
+    world.build_broadphase()
+    platform = world.moving_platforms[0]
+    player = world.player
+    player.x, player.y = 230, platform.rect.top - player.height
+    offset = player.x - platform.rect.x
+    for _ in range(300):  # Several trips each way
+        world.step(InputState(), dt=dt)
+        assert player.on_ground
+        assert abs(player.x - platform.rect.x - offset) <= 1
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from platformer_game import InputState, Simulation
+
+SEEDS = range(3)
+
+
+def fingerprint(world):
+    """Everything restore() has to put back: clock, player, level and every entity's changing state"""
+    player = world.player
+    entities = tuple((entity.x, entity.y, entity.active, getattr(entity, 'triggered', None))
+                     for group in (world.platforms, world.moving_platforms, world.spikes, world.collectibles,
+                                   world.disappearing_platforms, world.drawn_platforms)
+                     for entity in group)
+    return (world.time, player.x, player.y, player.vel_x, player.vel_y, player.score, player.on_ground,
+            world.current_level, entities, len(world.platform_grid), len(world.collectible_grid))
+
+
+def random_inputs(count, seed):
+    rng = random.Random(seed)
+    controls = InputState()
+    inputs = []
+    for tick in range(count):
+        if tick % 20 == 0:
+            controls = InputState(rng.random() < 0.3, rng.random() < 0.6, rng.random() < 0.4)
+        inputs.append(controls)
+    return inputs
+
+
+def play(world, inputs):
+    for tick, controls in enumerate(inputs):
+        if tick % 97 == 5:
+            world.draw_platform((100 + tick % 300, 500), (260 + tick % 300, 500))
+        world.step(controls)
+
+
+@pytest.mark.parametrize('marathon_chunks', [0, 4])
+@pytest.mark.parametrize('seed', SEEDS)
+def test_replay_after_restore_matches(seed, marathon_chunks):
+    world = Simulation(seed=seed, start_level=1 + seed * 2, marathon_chunks=marathon_chunks)
+    play(world, random_inputs(1500, seed))
+    snapshot = world.snapshot()
+    before = fingerprint(world)
+    tail = random_inputs(900, seed + 100)
+    play(world, tail)
+    after = fingerprint(world)
+
+    world.restore(snapshot)
+    assert fingerprint(world) == before
+    play(world, tail)
+    assert fingerprint(world) == after
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_rewind_returns_to_recorded_states(seed):
+    world = Simulation(seed=seed, start_level=1 + seed * 2)
+    recorded = {}
+    for controls in random_inputs(1200, seed):
+        world.step(controls)
+        if world.ticks_since_snapshot == 0 and world.history:
+            recorded[world.history[-1].state] = fingerprint(world)
+
+    level = world.current_level
+    checked = 0
+    while world.history:
+        state = world.history[-1].state
+        world.step(InputState(rewind=True))
+        if state in recorded:
+            assert fingerprint(world) == recorded[state]
+            checked += 1
+    assert checked
+    world.step(InputState(rewind=True))
+    assert world.current_level == level
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_restart_matches_fresh_level(seed):
+    world = Simulation(seed=seed, start_level=3 + seed)
+    fresh = fingerprint(Simulation(seed=seed, start_level=3 + seed))
+    play(world, random_inputs(600, seed))
+    world.restart_level()
+    assert fingerprint(world) == fresh
+    assert not world.history
+
+
+def test_rewind_stays_in_current_level():
+    world = Simulation(seed=1, start_level=2)
+    play(world, random_inputs(400, 1))
+    assert world.history
+    world.load_level(world.current_level + 1)
+    assert not world.history
+    start = fingerprint(world)
+    world.step(InputState(rewind=True))
+    assert fingerprint(world) == start
@@ -0,0 +1,27 @@
+import random
+
+from input_replay import InputRecorder
+from platformer_game import InputState, Simulation
+from spectator import main
+
+
+def record_session(path, ticks, seed):
+    world = Simulation(seed=seed)
+    recorder = InputRecorder(str(path), world)
+    rng = random.Random(seed)
+    controls = InputState()
+    for tick in range(ticks):
+        if tick % 30 == 0:
+            controls = InputState(rng.random() < 0.3, rng.random() < 0.6, rng.random() < 0.4)
+        if tick % 60 == 5 and world.draw_platform((100 + tick, 500), (250 + tick, 500)):
+            recorder.draw((100 + tick, 500), (250 + tick, 500))
+        recorder.tick(controls)
+        world.step(controls)
+    recorder.finish(world)
+
+
+def test_loopback_clients_match_server(tmp_path, capsys):
+    path = tmp_path / 'session.dpr'
+    record_session(path, 180, seed=4)
+    assert main(['loopback', str(path), '--clients', '3']) == 0
+    assert "0 ticks differed from the server, 0 dropped, 0 missing" in capsys.readouterr().out